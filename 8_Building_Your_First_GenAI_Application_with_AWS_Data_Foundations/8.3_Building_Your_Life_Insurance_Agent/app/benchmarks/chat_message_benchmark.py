@@ -0,0 +1,101 @@
+# app/benchmarks/chat_message_benchmark.py
+
+"""
+Micro-benchmark of the per-turn message handling cost for a long chat session.
+
+Compares re-normalizing plain message dicts on every rerun (display loop, agent
+history formatting and serialization) with ChatMessage and ConversationContext,
+which normalize and serialize each message once.
+
+Usage:
+    python benchmarks/chat_message_benchmark.py [--messages 1000] [--turns 50]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'streamlit'))
+
+from utils.chat_message import ChatMessage
+from utils.conversation_context import ConversationContext
+
+def make_dict_messages(count: int):
+    """Messages in the three content shapes found in session state and chat history"""
+    messages = []
+    for i in range(count):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        text = f"Message {i}: your premium of $150.00 is due on 2024-05-01. " * 3
+        shape = i % 3
+        if shape == 0:
+            content = text
+        elif shape == 1:
+            content = [{'text': text}]
+        else:
+            content = {'text': text}
+        messages.append({'role': role, 'content': content})
+    return messages
+
+def legacy_turn(messages, prompt):
+    """One rerun with the dict-based code path"""
+    for message in messages:
+        content = message['content']
+        if isinstance(content, list) and len(content) > 0:
+            text = content[0].get('text', '')
+        elif isinstance(content, dict) and 'text' in content:
+            text = content['text']
+        elif isinstance(content, str):
+            text = content
+        else:
+            text = str(content)
+        re.sub(r'(?<!\\)\$', r'\$', text)
+
+    formatted_history = []
+    for msg in messages:
+        content = msg['content']
+        if isinstance(content, str):
+            content = [{'text': content}]
+        elif isinstance(content, dict):
+            content = [content]
+        formatted_history.append({'role': msg['role'], 'content': content})
+    formatted_history.append({'role': 'user', 'content': [{'text': prompt}]})
+    return json.dumps({'messages': formatted_history})
+
+def chat_message_turn(messages, context, prompt):
+    """One rerun with ChatMessage and ConversationContext"""
+    for message in messages:
+        message.markdown
+    return context.build(messages, prompt)
+
+def measure(label, run, turns):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for turn in range(turns):
+        payload = run(turn)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed / turns * 1000:8.3f} ms/turn  "
+          f"{peak / 1024:9.1f} KiB peak  {len(payload) / 1024:8.1f} KiB payload")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--turns', type=int, default=50)
+    args = parser.parse_args()
+
+    dict_messages = make_dict_messages(args.messages)
+    normalized = [ChatMessage.from_dict(message) for message in dict_messages]
+    context = ConversationContext(session_id='benchmark')
+    prompt = "What is my next premium due date?"
+
+    print(f"{args.messages} messages, {args.turns} turns")
+    measure("dict messages (legacy)", lambda turn: legacy_turn(dict_messages, prompt), args.turns)
+    measure("ChatMessage + context", lambda turn: chat_message_turn(normalized, context, prompt), args.turns)
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,19 @@
 # app/streamlit/streamlit_app.py
 
 import os
-import re
-import json
-import boto3
 import logging
 import streamlit as st
 from typing import Optional
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from datetime import datetime, UTC
+from datetime import datetime
 from utils.auth import Auth
 from utils.bedrock import BedrockService
 from utils.chat_history import ChatHistory
-from botocore.exceptions import ClientError
+from utils.session_bootstrap import SessionBootstrap
+from utils.conversation_context import ConversationContext
+from utils.aws_cache import get_secret, invalidate_secret
+from utils.chat_message import ChatMessage, format_dollar_signs
 
 # Configure page
 st.set_page_config(
@@ -31,35 +32,87 @@ logger = logging.getLogger('life_insurance_assistant')
 # Load environment variables
 load_dotenv()
 
+# Seconds to wait for the login-time session bootstrap before falling back to the agent
+BOOTSTRAP_TIMEOUT = float(os.getenv('SESSION_BOOTSTRAP_TIMEOUT', '10'))
+
+# Token budgets for the conversationHistory session attribute
+CONTEXT_MAX_TOKENS = int(os.getenv('CONVERSATION_CONTEXT_MAX_TOKENS', '2000'))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_MAX_TOKENS', '500'))
+
+# Number of most recent messages rendered before "Load older messages" is needed
+RENDER_WINDOW = int(os.getenv('CHAT_RENDER_WINDOW', '50'))
+
+@st.cache_resource(show_spinner=False)
+def get_bedrock_service(agent_id: str, guardrail_id: str, guardrail_version: str) -> BedrockService:
+    """Build the Bedrock agent client once per process."""
+    logger.info(f"Initializing BedrockService with: agent_id={agent_id}, "
+               f"guardrail_id={guardrail_id}, guardrail_version={guardrail_version}")
+    return BedrockService(
+        agent_id=agent_id,
+        guardrail_id=guardrail_id,
+        guardrail_version=guardrail_version
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_session_bootstrap(function_name: Optional[str]) -> SessionBootstrap:
+    """Build the session bootstrap service once per process."""
+    return SessionBootstrap(function_name=function_name)
+
+@st.cache_resource(show_spinner=False)
+def warm_up_services():
+    """Build shared resources and load the Cognito secret on the first run in the process."""
+    get_bedrock_service(
+        os.getenv('BEDROCK_AGENT_ID'),
+        os.getenv('BEDROCK_GUARDRAIL_ID'),
+        os.getenv('BEDROCK_GUARDRAIL_VERSION')
+    )
+    get_session_bootstrap(os.getenv('GET_POLICY_DETAILS_FUNCTION'))
+    get_secret(os.getenv('SECRETS_MANAGER_ID'))
+    logger.info("Shared services warmed up")
+    return True
+
+def invalidate_services():
+    """Drop cached resources so the next rerun rebuilds them."""
+    get_bedrock_service.clear()
+    get_session_bootstrap.clear()
+    warm_up_services.clear()
+    invalidate_secret(os.getenv('SECRETS_MANAGER_ID'))
+    st.session_state.pop('chat_history_service', None)
+
 def initialize_services():
     try:
-        auth = Auth()
-        auth.initialize_auth(os.getenv('SECRETS_MANAGER_ID'))
-        
-        # Add logging to debug environment variables
         agent_id = os.getenv('BEDROCK_AGENT_ID')
-        guardrail_id = os.getenv('BEDROCK_GUARDRAIL_ID')
-        guardrail_version = os.getenv('BEDROCK_GUARDRAIL_VERSION')
-        
-        logger.info(f"Initializing BedrockService with: agent_id={agent_id}, "
-                   f"guardrail_id={guardrail_id}, guardrail_version={guardrail_version}")
-        
         if not agent_id:
             raise ValueError("BEDROCK_AGENT_ID environment variable is not set")
-            
-        bedrock = BedrockService(
-            agent_id=agent_id,
-            guardrail_id=guardrail_id,
-            guardrail_version=guardrail_version
+        
+        warm_up_services()
+        
+        # Auth state lives in session state; the authenticator is built once per user session
+        auth = Auth()
+        if st.session_state.authenticator is None:
+            auth.initialize_auth(os.getenv('SECRETS_MANAGER_ID'))
+        
+        bedrock = get_bedrock_service(
+            agent_id,
+            os.getenv('BEDROCK_GUARDRAIL_ID'),
+            os.getenv('BEDROCK_GUARDRAIL_VERSION')
         )
         
-        chat_history = ChatHistory(table_name=os.getenv('DYNAMODB_CHAT_HISTORY_TABLE'))
+        # boto3 resources are not thread-safe, so chat history is kept per user session
+        if 'chat_history_service' not in st.session_state:
+            st.session_state.chat_history_service = ChatHistory(
+                table_name=os.getenv('DYNAMODB_CHAT_HISTORY_TABLE')
+            )
+        chat_history = st.session_state.chat_history_service
+        
+        session_bootstrap = get_session_bootstrap(os.getenv('GET_POLICY_DETAILS_FUNCTION'))
         
-        return auth, bedrock, chat_history
+        return auth, bedrock, chat_history, session_bootstrap
         
     except Exception as e:
+        invalidate_services()
         st.error(f"Error initializing services: {str(e)}")
-        return None, None, None
+        return None, None, None, None
 
 def init_session_state():
     """Initialize session state with policy details message if needed."""
@@ -75,6 +128,21 @@ def init_session_state():
         st.session_state.authenticator = None
     if 'initial_message_sent' not in st.session_state:
         st.session_state.initial_message_sent = False
+    if 'render_limit' not in st.session_state:
+        st.session_state.render_limit = RENDER_WINDOW
+
+def get_conversation_context(bedrock: BedrockService) -> ConversationContext:
+    """Get the conversation context of the current chat session, creating it if needed."""
+    context = st.session_state.get('conversation_context')
+    if context is None or context.session_id != st.session_state.current_session:
+        context = ConversationContext(
+            session_id=st.session_state.current_session,
+            max_tokens=CONTEXT_MAX_TOKENS,
+            summary_max_tokens=CONTEXT_SUMMARY_MAX_TOKENS,
+            summarizer=bedrock.summarize_conversation if bedrock.summary_model_id else None
+        )
+        st.session_state.conversation_context = context
+    return context
 
 def display_chat_history(chat_history: ChatHistory):
     with st.sidebar:
@@ -84,6 +152,7 @@ def display_chat_history(chat_history: ChatHistory):
             session_id = chat_history.create_session(st.session_state.user_id)
             st.session_state.current_session = session_id
             st.session_state.messages = []
+            st.session_state.render_limit = RENDER_WINDOW
             st.rerun()
         
         st.divider()
@@ -93,25 +162,20 @@ def display_chat_history(chat_history: ChatHistory):
             created_at = datetime.fromisoformat(chat['created_at']).strftime("%Y-%m-%d %H:%M")
             if st.button(f"Chat from {created_at}", key=chat['session_id']):
                 st.session_state.current_session = chat['session_id']
-                chat_data = chat_history.get_session(
+                st.session_state.messages = chat_history.get_messages(
                     st.session_state.user_id,
                     chat['session_id']
                 )
-                st.session_state.messages = chat_data.get('messages', [])
+                st.session_state.render_limit = RENDER_WINDOW
                 st.rerun()
 
-def format_dollar_signs(text):
-    """Format dollar signs in text to prevent unintended Markdown formatting."""
-    return re.sub(r'(?<!\\)\$', r'\$', text)
-
 def format_message_for_agent(message):
     """Format a message for the Bedrock Agent API."""
-    return {
-        'role': message['role'],
-        'content': [{'text': message['content'] if isinstance(message['content'], str) else message['content'][0]['text']}]
-    }
+    if not isinstance(message, ChatMessage):
+        message = ChatMessage.from_dict(message)
+    return message.to_dict()
 
-def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory):
+def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory, session_bootstrap: SessionBootstrap):
     st.title("Product Search Assistant")
 
     if 'policy_number' not in st.session_state:
@@ -122,80 +186,72 @@ def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory):
             username = st.session_state.authenticator.get_username()
             
             if st.session_state.policy_number:
-                logger.info(f"Fetching initial policy details for policy: {st.session_state.policy_number}")
+                logger.info(f"Bootstrapping session for policy: {st.session_state.policy_number}")
                 
-                get_details_prompt = f"get policy details for {st.session_state.policy_number}"
-                initial_response = bedrock.invoke_agent(
-                    prompt=get_details_prompt,
-                    session_attributes={
-                        'user_id': username,
-                        'policy_number': st.session_state.policy_number
-                    }
-                )
+                # Use the bootstrap prefetched at login, or start one now
+                bootstrap_future = st.session_state.pop('policy_bootstrap', None)
+                if bootstrap_future is None:
+                    bootstrap_future = session_bootstrap.prefetch(st.session_state.policy_number)
+                try:
+                    bootstrap_result = bootstrap_future.result(timeout=BOOTSTRAP_TIMEOUT)
+                except FutureTimeoutError:
+                    bootstrap_result = {'status': 'error',
+                                        'message': f"Bootstrap did not finish within {BOOTSTRAP_TIMEOUT:g}s"}
+                except Exception as e:
+                    # e.g. a Lambda or credentials error raised inside the bootstrap
+                    bootstrap_result = {'status': 'error', 'message': str(e)}
                 
-                if initial_response['status'] == 'success':
-                    st.session_state.policy_details = initial_response['response']
-                    logger.info(f"Received policy details: {st.session_state.policy_details}")
-                    
+                if bootstrap_result['status'] == 'success':
+                    st.session_state.policy_details = bootstrap_result['policy_details']
+                    welcome_message = bootstrap_result['welcome_message']
+                else:
+                    # Fall back to a single agent turn that looks up the policy itself
+                    logger.warning(f"Session bootstrap failed: {bootstrap_result['message']}")
                     welcome_prompt = (
-                        f"Generate initial welcome message for policy {st.session_state.policy_number} "
-                        f"using these policy details: {st.session_state.policy_details}"
+                        f"Get policy details for {st.session_state.policy_number} and "
+                        f"generate an initial welcome message for the policy"
                     )
-
                     welcome_response = bedrock.invoke_agent(
                         prompt=welcome_prompt,
                         session_attributes={
                             'user_id': username,
                             'policy_number': st.session_state.policy_number
-                        }
+                        },
+                        session_id=st.session_state.current_session,
+                        idempotent=True
                     )
                     
                     if welcome_response['status'] == 'success':
-                        logger.info(f"Raw welcome message from agent: {welcome_response['response']}")
-                        formatted_welcome_message = format_dollar_signs(welcome_response['response'])
-                        logger.info(f"Formatted welcome message: {formatted_welcome_message}")
-                        
-                        st.session_state.messages = [
-                            {
-                                "role": "assistant",
-                                "content": formatted_welcome_message
-                            }
-                        ]
-                        logger.info("Initial message added to session state")
+                        st.session_state.policy_details = welcome_response['response']
+                        welcome_message = welcome_response['response']
                     else:
+                        welcome_message = None
                         logger.error(f"Error getting welcome message: {welcome_response['message']}")
-
-                else:
-                    logger.error(f"Error getting initial policy details: {initial_response['message']}")
+                
+                if welcome_message:
+                    st.session_state.messages = [
+                        ChatMessage("assistant", format_dollar_signs(welcome_message))
+                    ]
+                    logger.info("Initial message added to session state")
         except Exception as e:
             logger.error(f"Error in initial policy details fetch: {str(e)}")
 
     # Display chat messages from history on app rerun
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            # Extract text from content
-            if isinstance(message["content"], list) and len(message["content"]) > 0:
-                # If content is a list of dictionaries with 'text' key
-                text = message["content"][0].get("text", "")
-            elif isinstance(message["content"], dict) and "text" in message["content"]:
-                # If content is a single dictionary with 'text' key
-                text = message["content"]["text"]
-            elif isinstance(message["content"], str):
-                # If content is already a string
-                text = message["content"]
-            else:
-                # Fallback
-                text = str(message["content"])
-                
-            st.markdown(format_dollar_signs(text))
+    # Only the most recent window is rendered; older messages are loaded on request
+    hidden_count = max(0, len(st.session_state.messages) - st.session_state.render_limit)
+    if hidden_count:
+        if st.button(f"Load older messages ({hidden_count} hidden)"):
+            st.session_state.render_limit += RENDER_WINDOW
+            st.rerun()
+
+    for message in st.session_state.messages[hidden_count:]:
+        with st.chat_message(message.role):
+            st.markdown(message.markdown)
 
     # Chat input
     if prompt := st.chat_input("Please let me know how I can help with your policy today."):
         # Format user message
-        user_message = {
-            "role": "user", 
-            "content": [{"text": prompt}]
-        }
+        user_message = ChatMessage("user", prompt)
         st.session_state.messages.append(user_message)
         
         # Save user message to chat history
@@ -206,21 +262,16 @@ def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory):
         )
 
         with st.chat_message("user"):
-            st.markdown(prompt)
+            st.markdown(user_message.markdown)
             
         try:
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
-                    # Format conversation history for agent
-                    session_messages = bedrock.format_conversation_history(
+                    # Build the bounded conversation history for the agent
+                    conversation_history = get_conversation_context(bedrock).build(
                         st.session_state.messages,
                         prompt
                     )
-
-                    # Convert conversation history to JSON string
-                    conversation_history = json.dumps({
-                        'messages': session_messages
-                    })
                     
                     response = bedrock.invoke_agent(
                         prompt=prompt,
@@ -228,18 +279,15 @@ def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory):
                             'user_id': st.session_state.authenticator.get_username(),
                             'policy_number': st.session_state.policy_number,
                             'conversationHistory': conversation_history
-                        }
+                        },
+                        session_id=st.session_state.current_session
                     )
 
                     # In the chat input section, update how the response is displayed
                     if response['status'] == 'success':
-                        formatted_response = format_dollar_signs(response['response'])
-                        assistant_message = {
-                            "role": "assistant",
-                            "content": [{"text": formatted_response}]
-                        }
+                        assistant_message = ChatMessage("assistant", format_dollar_signs(response['response']))
                         # Display only the text content
-                        st.markdown(formatted_response)
+                        st.markdown(assistant_message.markdown)
                         st.session_state.messages.append(assistant_message)
                         
                         # Add to chat history
@@ -266,8 +314,8 @@ def display_chat_interface(bedrock: BedrockService, chat_history: ChatHistory):
     )
 
 def main():
-    auth, bedrock, chat_history = initialize_services()
-    if not (auth and bedrock and chat_history):
+    auth, bedrock, chat_history, session_bootstrap = initialize_services()
+    if not (auth and bedrock and chat_history and session_bootstrap):
         st.error("Failed to initialize application. Please try again later.")
         return
     
@@ -279,6 +327,10 @@ def main():
     if not auth.is_authenticated():
         st.title("Product Search Assistant")
         if auth.login():
+            # Start loading the first screen while the app reruns
+            policy_number = auth.get_policy_number()
+            if policy_number:
+                st.session_state.policy_bootstrap = session_bootstrap.prefetch(policy_number)
             st.rerun()
         return
     
@@ -291,9 +343,10 @@ def main():
         session_id = chat_history.create_session(st.session_state.user_id)
         st.session_state.current_session = session_id
         st.session_state.messages = []
+        st.session_state.render_limit = RENDER_WINDOW
         st.session_state.initial_message_sent = False  # Reset flag for new session
     
-    display_chat_interface(bedrock, chat_history)
+    display_chat_interface(bedrock, chat_history, session_bootstrap)
     
     if st.sidebar.button("Logout"):
         auth.logout()
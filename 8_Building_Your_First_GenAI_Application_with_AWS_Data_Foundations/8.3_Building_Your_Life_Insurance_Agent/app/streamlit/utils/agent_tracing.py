@@ -0,0 +1,221 @@
+# app/streamlit/utils/agent_tracing.py
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry export is optional
+    otel_trace = None
+
+# Trace parts reported by the agent and the span phase they belong to
+TRACE_PHASES = {
+    'preProcessingTrace': 'preprocessing',
+    'orchestrationTrace': 'orchestration',
+    'postProcessingTrace': 'postprocessing',
+}
+
+class Span:
+    """A timed section of an agent invocation"""
+
+    __slots__ = ('name', 'phase', 'step', 'start_ns', 'end_ns', 'attributes')
+
+    def __init__(self, name: str, phase: str, step: Optional[str] = None, start_ns: Optional[int] = None):
+        self.name = name
+        self.phase = phase
+        self.step = step
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict = {}
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'phase': self.phase,
+            'step': self.step,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+        }
+
+class TraceRecorder:
+    """
+    Turns the trace events of one invoke_agent stream into spans.
+
+    Spans are opened on model and action invocation inputs and closed by the matching
+    output or observation; when the agent reports its own timings in the event metadata
+    they take precedence over arrival times.
+    """
+
+    def __init__(self, session_id: str):
+        self.root = Span('agent.invoke', 'agent')
+        self.root.attributes['session_id'] = session_id
+        self.spans: List[Span] = []
+        self._open: Dict[tuple, Span] = {}
+        self.last_trace = None
+
+    def _start(self, key: tuple, name: str, phase: str, step: Optional[str]) -> Span:
+        span = Span(name, phase, step)
+        self._open[key] = span
+        self.spans.append(span)
+        return span
+
+    def _end(self, key: tuple, metadata: Optional[Dict] = None, **attributes) -> Optional[Span]:
+        span = self._open.pop(key, None)
+        if span is None:
+            return None
+        span.end_ns = time.time_ns()
+        metadata = metadata or {}
+        if metadata.get('totalTimeMs') is not None:
+            span.start_ns = span.end_ns - int(metadata['totalTimeMs'] * 1e6)
+        usage = metadata.get('usage') or {}
+        if usage:
+            span.attributes['input_tokens'] = usage.get('inputTokens', 0)
+            span.attributes['output_tokens'] = usage.get('outputTokens', 0)
+        span.attributes.update({k: v for k, v in attributes.items() if v is not None})
+        return span
+
+    def record(self, trace_event: Dict):
+        """Record one 'trace' event from the completion stream"""
+        self.last_trace = trace_event
+        trace_body = trace_event.get('trace', {})
+
+        for trace_type, phase in TRACE_PHASES.items():
+            part = trace_body.get(trace_type)
+            if part:
+                self._record_part(phase, part)
+
+        if 'failureTrace' in trace_body:
+            self.root.attributes['failure'] = trace_body['failureTrace'].get('failureReason')
+        if 'guardrailTrace' in trace_body:
+            self.root.attributes['guardrail_action'] = trace_body['guardrailTrace'].get('action')
+
+    def _record_part(self, phase: str, part: Dict):
+        if 'modelInvocationInput' in part:
+            step = part['modelInvocationInput'].get('traceId')
+            self._start((phase, step, 'model'), f'{phase}.model', phase, step)
+
+        if 'modelInvocationOutput' in part:
+            output = part['modelInvocationOutput']
+            self._end((phase, output.get('traceId'), 'model'), output.get('metadata'))
+
+        if 'invocationInput' in part:
+            invocation = part['invocationInput']
+            step = invocation.get('traceId')
+            invocation_type = invocation.get('invocationType', 'UNKNOWN')
+            if 'actionGroupInvocationInput' in invocation:
+                action = invocation['actionGroupInvocationInput']
+                span = self._start((phase, step, 'invocation'), 'action_group', phase, step)
+                span.attributes['action_group'] = action.get('actionGroupName')
+                span.attributes['api_path'] = action.get('apiPath')
+            elif 'knowledgeBaseLookupInput' in invocation:
+                span = self._start((phase, step, 'invocation'), 'knowledge_base', phase, step)
+                span.attributes['knowledge_base_id'] = invocation['knowledgeBaseLookupInput'].get('knowledgeBaseId')
+            else:
+                self._start((phase, step, 'invocation'), invocation_type.lower(), phase, step)
+
+        if 'observation' in part:
+            observation = part['observation']
+            step = observation.get('traceId')
+            metadata = None
+            for output_key in ('actionGroupInvocationOutput', 'knowledgeBaseLookupOutput'):
+                if output_key in observation:
+                    metadata = observation[output_key].get('metadata')
+            references = observation.get('knowledgeBaseLookupOutput', {}).get('retrievedReferences')
+            self._end((phase, step, 'invocation'), metadata,
+                      retrieved_references=len(references) if references is not None else None)
+
+    def finish(self) -> List[Span]:
+        """Close the invocation and return all spans, root first"""
+        now = time.time_ns()
+        for span in self._open.values():
+            span.end_ns = now
+            span.attributes['incomplete'] = True
+        self._open.clear()
+        self.root.end_ns = now
+
+        model_spans = [s for s in self.spans if s.name.endswith('.model')]
+        self.root.attributes['input_tokens'] = sum(s.attributes.get('input_tokens', 0) for s in model_spans)
+        self.root.attributes['output_tokens'] = sum(s.attributes.get('output_tokens', 0) for s in model_spans)
+        return [self.root] + self.spans
+
+    def latency_breakdown(self) -> Dict[str, float]:
+        """Total milliseconds spent per span name"""
+        breakdown = {'total': self.root.duration_ms or 0.0}
+        for span in self.spans:
+            breakdown[span.name] = breakdown.get(span.name, 0.0) + (span.duration_ms or 0.0)
+        return breakdown
+
+class JsonlSpanExporter:
+    """
+    Appends spans to a local JSON Lines file, one invocation per batch.
+
+    Once the file reaches max_bytes it is moved to <path>.1, replacing the previous
+    one, so at most two files of traces are kept.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock:
+            try:
+                if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+            except FileNotFoundError:
+                pass
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+class OpenTelemetrySpanExporter:
+    """Re-emits recorded spans through the configured OpenTelemetry tracer provider"""
+
+    def __init__(self):
+        if otel_trace is None:
+            raise ImportError("opentelemetry-api is required for the 'otel' trace exporter")
+        self.tracer = otel_trace.get_tracer('life_insurance_assistant.agent')
+
+    def export(self, spans: List[Span]):
+        root, children = spans[0], spans[1:]
+        root_span = self.tracer.start_span(root.name, start_time=root.start_ns, attributes=self._attributes(root))
+        context = otel_trace.set_span_in_context(root_span)
+        for span in children:
+            child = self.tracer.start_span(span.name, context=context, start_time=span.start_ns,
+                                           attributes=self._attributes(span))
+            child.end(end_time=span.end_ns)
+        root_span.end(end_time=root.end_ns)
+
+    @staticmethod
+    def _attributes(span: Span) -> Dict:
+        attributes = {'agent.phase': span.phase}
+        if span.step:
+            attributes['agent.step'] = span.step
+        attributes.update({f'agent.{k}': v for k, v in span.attributes.items()
+                           if isinstance(v, (str, bool, int, float))})
+        return attributes
+
+def get_span_exporter():
+    """Create the span exporter selected by AGENT_TRACE_EXPORTER (jsonl, otel or none, the default)"""
+    exporter = os.getenv('AGENT_TRACE_EXPORTER', 'none').lower()
+    if exporter == 'otel':
+        return OpenTelemetrySpanExporter()
+    if exporter == 'jsonl':
+        return JsonlSpanExporter(os.getenv('AGENT_TRACE_JSONL_PATH', '/tmp/agent_traces.jsonl'),
+                                 int(os.getenv('AGENT_TRACE_JSONL_MAX_BYTES', str(10 * 1024 * 1024))))
+    return None
@@ -1,13 +1,12 @@
 # app/streamlit/utils/auth.py
 
-import json
-import boto3
 import logging
 import botocore
 import streamlit as st
 from typing import Optional
 from botocore.exceptions import ClientError
 from streamlit_cognito_auth import CognitoAuthenticator
+from utils.aws_cache import get_secret, invalidate_secret, get_user_attributes
 
 logger = logging.getLogger(__name__)
 
@@ -23,21 +22,20 @@ class Auth:
             st.session_state.user_attributes = None
         if 'cognito_user_pool_id' not in st.session_state:
             st.session_state.cognito_user_pool_id = None
+        if 'cognito_secret_id' not in st.session_state:
+            st.session_state.cognito_secret_id = None
 
     def initialize_auth(self, secret_id: str):
         """Initialize the authenticator using the secret ID"""
         try:
-            # Get Cognito parameters from Secrets Manager
-            secretsmanager_client = boto3.client("secretsmanager")
-            response = secretsmanager_client.get_secret_value(
-                SecretId=secret_id,
-            )
-            secret_string = json.loads(response['SecretString'])
+            # Get Cognito parameters from Secrets Manager (cached across reruns)
+            st.session_state.cognito_secret_id = secret_id
+            secret_string = get_secret(secret_id)
             pool_id = secret_string['cognito_user_pool_id']
             app_client_id = secret_string['cognito_app_client_id']
             app_client_secret = secret_string['cognito_app_client_secret']
 
-            logger.info(f"Retrieved Cognito parameters for pool ID: {pool_id}")
+            logger.debug(f"Retrieved Cognito parameters for pool ID: {pool_id}")
             
             # Store pool ID for later use
             st.session_state.cognito_user_pool_id = pool_id
@@ -75,28 +73,33 @@ class Auth:
             except botocore.exceptions.ClientError as e:
                 if e.response['Error']['Code'] == 'UserNotFoundException':
                     st.error("User does not exist. Please check your login credentials.")
+                elif self._is_secret_mismatch(e) and st.session_state.cognito_secret_id:
+                    # The app client secret may have been rotated; rebuild the authenticator on the next run
+                    if invalidate_secret(st.session_state.cognito_secret_id):
+                        st.session_state.authenticator = None
+                    st.error(f"Error logging in: {str(e)}")
                 else:
                     st.error(f"Error logging in: {str(e)}")
         return False
 
+    @staticmethod
+    def _is_secret_mismatch(error: ClientError) -> bool:
+        """Whether Cognito rejected the app client secret rather than the user's credentials"""
+        message = error.response['Error'].get('Message', '').lower()
+        return (error.response['Error']['Code'] == 'NotAuthorizedException'
+                and ('secret hash' in message or 'client secret' in message))
+
     def _fetch_user_attributes(self):
         """Fetch and store user attributes using Cognito client"""
         try:
             if not self.is_authenticated() or not st.session_state.user_id:
                 return None
 
-            cognito_idp = boto3.client('cognito-idp')
-            response = cognito_idp.admin_get_user(
-                UserPoolId=st.session_state.cognito_user_pool_id,
-                Username=st.session_state.user_id
+            attributes = get_user_attributes(
+                st.session_state.cognito_user_pool_id,
+                st.session_state.user_id
             )
             
-            # Convert attributes list to dictionary
-            attributes = {
-                attr['Name']: attr['Value'] 
-                for attr in response['UserAttributes']
-            }
-            
             st.session_state.user_attributes = attributes
             logger.info(f"Successfully fetched attributes for user {st.session_state.user_id}")
             return attributes
@@ -0,0 +1,146 @@
+# app/streamlit/utils/aws_cache.py
+
+import os
+import json
+import time
+import boto3
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Thread-safe cache with per-entry expiry and single-flight loading.
+
+    When several threads miss the same key at once, only one of them runs the
+    loader; the others wait for its result instead of calling AWS again.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._loading: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a fresh cached value, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+        return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Get a cached value, loading it at most once concurrently when missing or expired.
+
+        Args:
+            key (Hashable): Cache key
+            loader (Callable): Function producing the value on a miss
+
+        Returns:
+            Any: The cached or freshly loaded value
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    return entry[1]
+                in_flight = self._loading.get(key)
+                if in_flight is None:
+                    in_flight = self._loading[key] = threading.Event()
+                    is_leader = True
+                else:
+                    is_leader = False
+
+            if not is_leader:
+                # Another thread is loading this key; use its result once it is stored
+                in_flight.wait()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[0] > time.monotonic():
+                        return entry[1]
+                continue  # The leader failed, try loading ourselves
+
+            try:
+                value = loader()
+                self.set(key, value)
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+                in_flight.set()
+
+# Process-wide caches shared by all Streamlit sessions
+_secret_cache = TTLCache(ttl=float(os.getenv('SECRET_CACHE_TTL', '900')))
+_user_attribute_cache = TTLCache(ttl=float(os.getenv('USER_ATTRIBUTE_CACHE_TTL', '300')))
+# Forced secret refreshes can be triggered by user input, so they are spaced out per secret
+_SECRET_REFRESH_INTERVAL = float(os.getenv('SECRET_REFRESH_MIN_INTERVAL', '60'))
+_secret_refreshed: Dict[str, float] = {}
+_secret_refreshed_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def get_client(service_name: str):
+    """Get a boto3 client shared across reruns and sessions"""
+    with _clients_lock:
+        if service_name not in _clients:
+            _clients[service_name] = boto3.client(service_name)
+        return _clients[service_name]
+
+def get_secret(secret_id: str) -> Dict:
+    """
+    Get a JSON secret from Secrets Manager, cached for SECRET_CACHE_TTL seconds.
+
+    After expiry the secret is fetched again, so rotated values are picked up
+    without a restart; call invalidate_secret when a value is rejected to refresh early.
+    """
+    def load():
+        response = get_client('secretsmanager').get_secret_value(SecretId=secret_id)
+        logger.info(f"Loaded secret {secret_id} (version {response.get('VersionId')})")
+        return json.loads(response['SecretString'])
+
+    return _secret_cache.get_or_load(secret_id, load)
+
+def invalidate_secret(secret_id: str) -> bool:
+    """
+    Drop a cached secret so the next lookup fetches the current version.
+
+    Only done once per SECRET_REFRESH_MIN_INTERVAL seconds for a secret; returns
+    whether the cached value was dropped.
+    """
+    now = time.monotonic()
+    with _secret_refreshed_lock:
+        if now - _secret_refreshed.get(secret_id, float('-inf')) < _SECRET_REFRESH_INTERVAL:
+            return False
+        _secret_refreshed[secret_id] = now
+    _secret_cache.invalidate(secret_id)
+    return True
+
+def get_user_attributes(user_pool_id: str, username: str) -> Dict[str, str]:
+    """Get a Cognito user's attributes, cached per user for USER_ATTRIBUTE_CACHE_TTL seconds"""
+    def load():
+        response = get_client('cognito-idp').admin_get_user(
+            UserPoolId=user_pool_id,
+            Username=username
+        )
+        return {
+            attr['Name']: attr['Value']
+            for attr in response['UserAttributes']
+        }
+
+    return _user_attribute_cache.get_or_load((user_pool_id, username), load)
+
+def invalidate_user_attributes(user_pool_id: str, username: str):
+    """Drop a user's cached attributes, e.g. after they were updated"""
+    _user_attribute_cache.invalidate((user_pool_id, username))
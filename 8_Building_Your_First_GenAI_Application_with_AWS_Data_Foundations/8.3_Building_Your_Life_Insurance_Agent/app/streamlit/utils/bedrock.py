@@ -3,45 +3,90 @@
 import os
 import json
 import uuid
-import time
 import boto3
-import backoff
 import logging
+from botocore.config import Config
 from datetime import datetime, timezone
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Union
 from botocore.exceptions import ClientError
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from utils.rate_limiter import RateLimiter, RateLimitTimeout
+from utils.single_flight import SingleFlight, SingleFlightTimeout
+from utils.agent_tracing import TraceRecorder, get_span_exporter
+from utils.chat_message import ChatMessage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _is_throttling(error: BaseException) -> bool:
+    """Only throttled agent calls are retried; a rate limit timeout or other error is raised at once"""
+    return isinstance(error, ClientError) and error.response['Error']['Code'].lower() == 'throttlingexception'
+
 class BedrockService:
-    _instance = None
-    
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
+    """
+    Process-wide agent client shared by all Streamlit sessions.
+
+    One instance is built per process by the app's st.cache_resource getter, which
+    also rebuilds it when the cache is cleared. Only thread-safe state lives on the
+    instance (the pooled boto3 clients and the rate limiter); the agent sessionId is
+    derived per call from the chat session.
+    """
     
     def __init__(self, agent_id: str, guardrail_id: str, guardrail_version: str):
-        if not self._initialized:
-            self.bedrock_agent_runtime = boto3.client('bedrock-agent-runtime')
-            self.session_id = str(uuid.uuid4())
-            
-            # Add rate limiting parameters
-            self.last_request_time = 0
-            self.min_request_interval = 1.0  # Minimum time between requests in seconds
-            
-            self.config = {
-                'agent_id': agent_id,
-                'agent_alias_id': 'TSTALIASID',
-                'guardrail_id': guardrail_id,
-                'guardrail_version': guardrail_version,
-            }
+        # One client for all sessions, with a connection pool sized for concurrent turns
+        self.bedrock_agent_runtime = boto3.client(
+            'bedrock-agent-runtime',
+            config=Config(
+                max_pool_connections=int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS', '50'))
+            )
+        )
+        
+        # Direct model calls for work outside the agent, such as conversation summaries
+        self.bedrock_runtime = boto3.client('bedrock-runtime')
+        self.summary_model_id = os.getenv('CONVERSATION_SUMMARY_MODEL_ID', os.getenv('BEDROCK_MODEL_ID'))
+        
+        # Token bucket rate limiting with global and per-user quotas
+        self.rate_limiter = RateLimiter(
+            global_rate=float(os.getenv('BEDROCK_RATE_LIMIT', '5')),
+            global_burst=float(os.getenv('BEDROCK_RATE_BURST', '10')),
+            user_rate=float(os.getenv('BEDROCK_USER_RATE_LIMIT', '1')),
+            user_burst=float(os.getenv('BEDROCK_USER_RATE_BURST', '3'))
+        )
+        self.rate_limit_timeout = float(os.getenv('BEDROCK_RATE_LIMIT_TIMEOUT', '30'))
+        
+        # Identical idempotent prompts in flight for the same chat share one invocation
+        self.agent_calls = SingleFlight(
+            'invoke_agent',
+            timeout=float(os.getenv('BEDROCK_SINGLE_FLIGHT_TIMEOUT', '120'))
+        )
+        
+        # Where parsed agent trace spans are sent (JSONL file, OpenTelemetry or nowhere)
+        self.span_exporter = get_span_exporter()
+        
+        self.config = {
+            'agent_id': agent_id,
+            'agent_alias_id': 'TSTALIASID',
+            'guardrail_id': guardrail_id,
+            'guardrail_version': guardrail_version,
+        }
+        
+        logger.info(f"Initialized BedrockService with config: {json.dumps(self.config)}")
+
+    @staticmethod
+    def get_agent_session_id(chat_session_id: Optional[str] = None) -> str:
+        """
+        Map a ChatHistory session ID to the agent sessionId used for it.
+        
+        The mapping is deterministic so every app instance resumes the same agent
+        memory for a chat. Calls without a chat session get a one-off sessionId.
+        
+        Args:
+            chat_session_id (str, optional): ChatHistory session ID
             
-            logger.info(f"Initialized BedrockService with config: {json.dumps(self.config, indent=2)} and session_id: {self.session_id}")
-            self._initialized = True
+        Returns:
+            str: Agent sessionId
+        """
+        return chat_session_id or str(uuid.uuid4())
 
     def get_iso_timestamp(self):
         """Get current timestamp in ISO 8601 format"""
@@ -71,7 +116,37 @@ class BedrockService:
         logger.debug(f"Message alternation validation passed for {len(messages)} messages")
         return True
         
-    def format_conversation_history(self, messages: List[Dict], prompt: str) -> List[Dict]:
+    def summarize_conversation(self, previous_summary: str, lines: List[str], max_tokens: int) -> str:
+        """
+        Rewrite a conversation summary so it also covers older turns.
+
+        Args:
+            previous_summary (str): The summary so far, empty for the first turns
+            lines (List[str]): Turns that left the conversation window, as "role: text" lines
+            max_tokens (int): Most tokens the new summary may have
+
+        Returns:
+            str: The new summary
+        """
+        prompt = (
+            "Summarize this conversation between a life insurance customer and an assistant for the "
+            "assistant's later reference. Keep facts, figures, policy details, decisions and open "
+            f"questions; leave out greetings. Answer with the summary only, in at most {max_tokens * 3 // 4} words."
+            f"\n\nSummary so far:\n{previous_summary or '(none)'}\n\nLater turns:\n" + "\n".join(lines)
+        )
+        response = self.bedrock_runtime.invoke_model(
+            modelId=self.summary_model_id,
+            body=json.dumps({
+                'anthropic_version': 'bedrock-2023-05-31',
+                'max_tokens': max_tokens,
+                'temperature': 0,
+                'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': prompt}]}]
+            })
+        )
+        body = json.loads(response['body'].read())
+        return ''.join(block.get('text', '') for block in body.get('content', []) if block.get('type') == 'text')
+
+    def format_conversation_history(self, messages: List[Union[ChatMessage, Dict]], prompt: str) -> List[Dict]:
         """
         Format conversation history ensuring proper structure and content.
         """
@@ -82,6 +157,10 @@ class BedrockService:
             
             # Process existing messages
             for msg in messages:
+                if isinstance(msg, ChatMessage):
+                    formatted_history.append(msg.to_dict())
+                    continue
+                
                 # Ensure message has required fields
                 if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
                     logger.warning(f"Skipping malformed message: {msg}")
@@ -123,52 +202,82 @@ class BedrockService:
                 "content": [{"text": prompt}]
             }]
 
-    def _wait_for_rate_limit(self):
-        """Implement simple rate limiting"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            time.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
+    def _wait_for_rate_limit(self, user_id: Optional[str] = None):
+        """Wait until the request is admitted by the global and per-user quotas"""
+        self.rate_limiter.acquire(user_id, timeout=self.rate_limit_timeout)
 
     @retry(
+        retry=retry_if_exception(_is_throttling),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
         reraise=True
     )
-
-    def _invoke_with_retry(self, request_params: dict) -> dict:
-        """Execute the agent invocation with retries"""
+    def _invoke_with_retry(self, request_params: dict, user_id: Optional[str] = None) -> dict:
+        """Execute the agent invocation, retrying throttled calls; each attempt waits for its own token"""
         try:
-            self._wait_for_rate_limit()
-            return self.bedrock_agent_runtime.invoke_agent(**request_params)
+            self._wait_for_rate_limit(user_id)
+            response = self.bedrock_agent_runtime.invoke_agent(**request_params)
+            self.rate_limiter.on_success()
+            return response
         except ClientError as e:
-            if e.response['Error']['Code'] == 'throttlingException':
+            if _is_throttling(e):
                 logger.warning("Request throttled, retrying with backoff...")
+                self.rate_limiter.on_throttle()
                 raise  # Will be caught by retry decorator
             raise
 
-    def invoke_agent(self, prompt: str, session_attributes: Optional[Dict] = None) -> Dict:
+    def _export_spans(self, recorder: TraceRecorder):
+        """Close the trace recorder and hand its spans to the exporter"""
+        spans = recorder.finish()
+        logger.info("Agent latency breakdown (ms): " + ", ".join(
+            f"{name}={ms:.0f}" for name, ms in recorder.latency_breakdown().items()))
+        if self.span_exporter:
+            try:
+                self.span_exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"Failed to export agent trace spans: {str(e)}")
+
+    def invoke_agent(self, prompt: str, session_attributes: Optional[Dict] = None,
+                     session_id: Optional[str] = None, idempotent: bool = False) -> Dict:
         """
         Invokes the Bedrock Agent with the given prompt, using only the session ID for context.
         
         Args:
             prompt (str): The user's input text
             session_attributes (Dict, optional): Additional session attributes
+            session_id (str, optional): ChatHistory session ID the turn belongs to
+            idempotent (bool): Whether repeating the prompt gives the same answer, e.g. the
+                initial policy details lookup; identical requests for the same chat session
+                that arrive while one is in flight then share its response
             
         Returns:
             Dict: Response from the agent with status and completion text
         """
+        if not idempotent or not session_id:
+            return self._invoke_agent(prompt, session_attributes, session_id)
+        
+        key = (session_id, prompt, json.dumps(session_attributes or {}, sort_keys=True, default=str))
+        try:
+            response = self.agent_calls.do(key, lambda: self._invoke_agent(prompt, session_attributes, session_id))
+            logger.debug(f"Agent single-flight metrics: {self.agent_calls.metrics()}")
+            return response
+        except SingleFlightTimeout:
+            return {
+                'status': 'error',
+                'message': "The service is temporarily busy. Please try again in a few moments."
+            }
+
+    def _invoke_agent(self, prompt: str, session_attributes: Optional[Dict],
+                      session_id: Optional[str]) -> Dict:
+        """Invoke the agent and collect its completion and trace"""
         try:
             logger.info(f"Starting agent invocation for prompt: {prompt}")
+            agent_session_id = self.get_agent_session_id(session_id)
             
             request_params = {
                 'agentId': self.config['agent_id'],
                 'agentAliasId': self.config['agent_alias_id'],
-                'sessionId': self.session_id,
+                'sessionId': agent_session_id,
                 'inputText': prompt,
                 'enableTrace': True,
                 'sessionState': {
@@ -176,14 +285,18 @@ class BedrockService:
                 }
             }
 
-            logger.info(f"Final request parameters: {json.dumps(request_params, default=str, indent=2)}")
+            logger.debug(f"Invoking agent {self.config['agent_id']} in session {agent_session_id} "
+                         f"with attributes: {sorted((session_attributes or {}).keys())}")
+            recorder = TraceRecorder(agent_session_id)
 
             try:
-                response = self._invoke_with_retry(request_params)
+                response = self._invoke_with_retry(
+                    request_params,
+                    user_id=(session_attributes or {}).get('user_id')
+                )
                 logger.info("Successfully received agent response")
                 
                 completion = ""
-                trace_info = None
                 
                 for event in response['completion']:
                     if 'chunk' in event:
@@ -191,18 +304,20 @@ class BedrockService:
                         if 'bytes' in chunk_data:
                             completion += chunk_data['bytes'].decode('utf-8')
                     elif 'trace' in event:
-                        trace_info = event['trace']
-                        logger.debug(f"Trace information received: {json.dumps(trace_info, default=str, indent=2)}")
+                        recorder.record(event['trace'])
+
+                self._export_spans(recorder)
 
                 return {
                     'status': 'success',
                     'response': completion,
-                    'trace': trace_info,
-                    'session_id': self.session_id
+                    'trace': recorder.last_trace,
+                    'latency': recorder.latency_breakdown(),
+                    'session_id': agent_session_id
                 }
                 
-            except ClientError as e:
-                logger.error(f"ClientError in agent invocation: {str(e)}", exc_info=True)
+            except (ClientError, RateLimitTimeout) as e:
+                logger.error(f"Error in agent invocation: {str(e)}", exc_info=True)
                 return {
                     'status': 'error',
                     'message': "The service is temporarily busy. Please try again in a few moments."
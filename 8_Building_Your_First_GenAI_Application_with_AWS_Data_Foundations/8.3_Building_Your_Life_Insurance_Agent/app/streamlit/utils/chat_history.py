@@ -4,8 +4,9 @@ import uuid
 import boto3
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from botocore.exceptions import ClientError
+from utils.chat_message import ChatMessage
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,11 @@ class ChatHistory:
         )
         return response.get('Item')
 
+    def get_messages(self, user_id: str, session_id: str) -> List[ChatMessage]:
+        """Get the messages of a chat session, normalized to ChatMessage."""
+        session = self.get_session(user_id, session_id) or {}
+        return [ChatMessage.from_dict(message) for message in session.get('messages', [])]
+
     def validate_session_messages(self, user_id: str, session_id: str) -> bool:
         """
         Validate the messages in a session.
@@ -96,14 +102,14 @@ class ChatHistory:
             logger.error(f"Error validating session messages: {str(e)}", exc_info=True)
             return False
 
-    def add_message(self, user_id: str, session_id: str, message: Dict):
+    def add_message(self, user_id: str, session_id: str, message: Union[ChatMessage, Dict]):
         """
         Add a message to a chat session with proper formatting and validation.
         
         Args:
             user_id (str): The user's ID
             session_id (str): The chat session ID
-            message (Dict): The message to add, must contain 'role' and 'content'
+            message (ChatMessage | Dict): The message to add; dicts must contain 'role' and 'content'
             
         Raises:
             ValueError: If message format is invalid
@@ -114,6 +120,12 @@ class ChatHistory:
             if not user_id or not session_id:
                 raise ValueError("user_id and session_id are required")
                 
+            # Normalized messages are already in their stored shape
+            if isinstance(message, ChatMessage):
+                if message.role not in ['user', 'assistant']:
+                    raise ValueError(f"Invalid role: {message.role}. Must be 'user' or 'assistant'")
+                message = message.to_dynamodb_item()
+
             # Validate message structure
             if not isinstance(message, dict):
                 raise ValueError(f"Message must be a dictionary, got {type(message)}")
@@ -145,8 +157,10 @@ class ChatHistory:
             formatted_message = {
                 'role': message['role'],
                 'content': formatted_content,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': message.get('timestamp') or datetime.utcnow().isoformat()
             }
+            if message.get('message_id'):
+                formatted_message['message_id'] = message['message_id']
 
             # Check session existence and update
             try:
@@ -0,0 +1,89 @@
+# app/streamlit/utils/chat_message.py
+
+import re
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+DOLLAR_SIGN_PATTERN = re.compile(r'(?<!\\)\$')
+
+def format_dollar_signs(text: str) -> str:
+    """Format dollar signs in text to prevent unintended Markdown formatting."""
+    return DOLLAR_SIGN_PATTERN.sub(r'\$', text)
+
+def extract_text(content) -> str:
+    """Extract message text from any of the supported content shapes"""
+    if isinstance(content, list) and len(content) > 0:
+        # If content is a list of dictionaries with 'text' key
+        first = content[0]
+        return first.get('text', '') if isinstance(first, dict) else str(first)
+    if isinstance(content, dict) and 'text' in content:
+        # If content is a single dictionary with 'text' key
+        return content['text']
+    if isinstance(content, str):
+        # If content is already a string
+        return content
+    # Fallback
+    return str(content)
+
+class ChatMessage:
+    """
+    A chat message normalized once when it enters the app.
+
+    Messages arrive as plain dicts with string, list or dict content; they are
+    converted to a single text field on ingestion. The UI, ChatHistory and
+    BedrockService all work with this type, and each serialized form (markdown,
+    agent JSON) is computed on first use and reused after that.
+    """
+
+    __slots__ = ('role', 'text', 'message_id', 'timestamp', '_markdown', '_agent_json')
+
+    def __init__(self, role: str, text: str, message_id: Optional[str] = None,
+                 timestamp: Optional[str] = None):
+        self.role = role
+        self.text = text
+        self.message_id = message_id or str(uuid.uuid4())
+        self.timestamp = timestamp or datetime.utcnow().isoformat()
+        self._markdown = None
+        self._agent_json = None
+
+    @classmethod
+    def from_dict(cls, message: Dict) -> 'ChatMessage':
+        """Normalize a message dict from chat history or the agent"""
+        return cls(
+            role=message['role'],
+            text=extract_text(message['content']),
+            message_id=message.get('message_id'),
+            timestamp=message.get('timestamp')
+        )
+
+    def to_dict(self) -> Dict:
+        """Message dict in the content list shape used by chat history and the agent"""
+        return {
+            'role': self.role,
+            'content': [{'text': self.text}]
+        }
+
+    def to_dynamodb_item(self) -> Dict:
+        """Message as stored in the chat history table"""
+        return {
+            'role': self.role,
+            'content': [{'text': self.text}],
+            'timestamp': self.timestamp,
+            'message_id': self.message_id
+        }
+
+    @property
+    def agent_json(self) -> str:
+        """Message serialized for the agent's conversationHistory, computed once"""
+        if self._agent_json is None:
+            self._agent_json = json.dumps(self.to_dict())
+        return self._agent_json
+
+    @property
+    def markdown(self) -> str:
+        """Markdown for display, formatted once per message"""
+        if self._markdown is None:
+            self._markdown = format_dollar_signs(self.text)
+        return self._markdown
@@ -0,0 +1,194 @@
+# app/streamlit/utils/conversation_context.py
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from utils.chat_message import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+class _Entry(NamedTuple):
+    role: str
+    text: str
+    tokens: int
+    serialized: str
+
+class ConversationContext:
+    """
+    Builds a bounded conversationHistory session attribute for one chat session.
+
+    The most recent messages are kept verbatim as long as they fit the token budget.
+    Messages that fall out of the window are folded into a rolling summary that is
+    itself budgeted: the summarizer rewrites the previous summary with the new turns
+    in a background thread, off the request path, and the result is kept for the
+    session. Turns it has not folded in yet, or all of them when there is no
+    summarizer or it fails, are included as shortened lines instead. Each message
+    is added to the window once, reusing its cached agent serialization, so the
+    per-turn cost depends on the window size and not on the conversation length.
+
+    Args:
+        summarizer (Callable, optional): summarizer(previous_summary, lines, max_tokens)
+            returns a new summary covering the previous one and the new turn lines
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='conversation-summary')
+
+    def __init__(self, session_id: str, max_tokens: int = 2000, summary_max_tokens: int = 500,
+                 summary_line_chars: int = 200, chars_per_token: int = 4,
+                 summarizer: Optional[Callable[[str, List[str], int], str]] = None):
+        self.session_id = session_id
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_line_chars = summary_line_chars
+        self.chars_per_token = chars_per_token
+        self.summarizer = summarizer
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries: List[_Entry] = []
+        self._summary = ""
+        # Shortened turns not folded into the summary yet, numbered so a fold knows which it covered
+        self._summary_lines: List[Tuple[int, str]] = []
+        self._line_count = 0
+        self._summary_tokens = 0
+        self._summarized_count = 0
+        self._omitted_count = 0
+        self._summary_json = json.dumps("")
+        self._folding = False
+        # Folds started before a reset must not write into the new conversation
+        self._generation = object()
+
+    def estimate_tokens(self, text: str) -> int:
+        """Cheap token estimate used for budgeting"""
+        return len(text) // self.chars_per_token + 1
+
+    def _make_entry(self, message: ChatMessage) -> _Entry:
+        return _Entry(message.role, message.text, self.estimate_tokens(message.text), message.agent_json)
+
+    def _sync(self, messages: List[Dict]):
+        """Normalize and serialize messages that have not been seen yet"""
+        if len(messages) < len(self._entries):
+            # The message list was replaced (e.g. a different chat was loaded)
+            logger.info(f"Resetting conversation context for session {self.session_id}")
+            with self._lock:
+                self._reset()
+
+        for msg in messages[len(self._entries):]:
+            if isinstance(msg, dict):
+                if 'role' not in msg or 'content' not in msg:
+                    logger.warning(f"Skipping malformed message: {msg}")
+                    msg = ChatMessage('user', '')
+                else:
+                    msg = ChatMessage.from_dict(msg)
+            self._entries.append(self._make_entry(msg))
+
+    def _summarize(self, entries: List[_Entry]):
+        """Add messages leaving the window to the summary and fold them in the background"""
+        with self._lock:
+            for entry in entries:
+                if not entry.text:
+                    continue
+                snippet = " ".join(entry.text.split())
+                if len(snippet) > self.summary_line_chars:
+                    snippet = snippet[:self.summary_line_chars].rstrip() + "..."
+                self._line_count += 1
+                self._summary_lines.append((self._line_count, f"{entry.role}: {snippet}"))
+            self._render_summary()
+            self._start_fold()
+
+    def _start_fold(self):
+        """Summarize the pending lines unless that is already under way; called with the lock held"""
+        if self.summarizer is None or self._folding or not self._summary_lines:
+            return
+        self._folding = True
+        self._executor.submit(self._fold, self._generation, self._summary, list(self._summary_lines))
+
+    def _fold(self, generation, previous: str, lines: List[Tuple[int, str]]):
+        try:
+            summary = self.summarizer(previous, [line for _, line in lines], self.summary_max_tokens).strip()
+        except Exception as e:
+            # The shortened lines stay in the summary until a later fold succeeds
+            logger.warning(f"Could not summarize conversation for session {self.session_id}: {str(e)}")
+            summary = None
+        with self._lock:
+            if generation is not self._generation:
+                return
+            self._folding = False
+            if summary:
+                self._summary = summary
+                folded = lines[-1][0]
+                self._summary_lines = [(n, line) for n, line in self._summary_lines if n > folded]
+                self._render_summary()
+                self._start_fold()
+
+    def _render_summary(self):
+        """Serialize the summary and the newest pending lines that fit its budget; called with the lock held"""
+        # Pending lines are kept for the summarizer, up to a few summaries' worth while it lags
+        # behind or fails; without one, nothing folds them in and those beyond the budget go
+        pending_max_tokens = self.summary_max_tokens * (4 if self.summarizer else 1)
+        pending_tokens = sum(self.estimate_tokens(line) for _, line in self._summary_lines)
+        while len(self._summary_lines) > 1 and pending_tokens > pending_max_tokens:
+            _, dropped = self._summary_lines.pop(0)
+            pending_tokens -= self.estimate_tokens(dropped)
+            self._omitted_count += 1
+
+        tokens = self.estimate_tokens(self._summary) if self._summary else 0
+        shown: List[str] = []
+        for _, line in reversed(self._summary_lines):
+            line_tokens = self.estimate_tokens(line)
+            if shown and tokens + line_tokens > self.summary_max_tokens:
+                break
+            shown.insert(0, line)
+            tokens += line_tokens
+
+        parts = [self._summary] if self._summary else []
+        hidden = self._omitted_count + len(self._summary_lines) - len(shown)
+        if hidden:
+            parts.append(f"({hidden} earlier messages omitted)")
+        parts.extend(shown)
+        summary = "\n".join(parts)
+        self._summary_tokens = self.estimate_tokens(summary) if summary else 0
+        self._summary_json = json.dumps(summary)
+
+    def build(self, messages: List[Dict], prompt: str) -> str:
+        """
+        Build the serialized conversationHistory attribute for the next agent turn.
+
+        Args:
+            messages (List[Dict]): All messages of the chat session
+            prompt (str): The current user prompt
+
+        Returns:
+            str: JSON document with a summary of older turns and the recent messages
+        """
+        self._sync(messages)
+
+        entries = self._entries
+        if not entries or entries[-1].text != prompt:
+            entries = entries + [self._make_entry(ChatMessage('user', prompt))]
+
+        # Walk back from the newest message until the budget is spent
+        budget = self.max_tokens - self._summary_tokens
+        start = len(entries)
+        while start > self._summarized_count and budget - entries[start - 1].tokens >= 0:
+            start -= 1
+            budget -= entries[start].tokens
+        start = min(start, len(entries) - 1)
+
+        # Start the window on a user turn so roles keep alternating
+        while start < len(entries) - 1 and entries[start].role != 'user':
+            start += 1
+
+        if start > self._summarized_count:
+            self._summarize(entries[self._summarized_count:start])
+            self._summarized_count = start
+
+        window = entries[start:]
+        logger.debug(f"Conversation context for session {self.session_id}: "
+                     f"{len(window)} messages in window, {self._summarized_count} summarized")
+
+        return '{"summary": ' + self._summary_json + ', "messages": [' + \
+            ', '.join(entry.serialized for entry in window) + ']}'
@@ -0,0 +1,145 @@
+# app/streamlit/utils/rate_limiter.py
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class RateLimitTimeout(Exception):
+    """Raised when a request could not be admitted within its timeout"""
+    pass
+
+class TokenBucket:
+    """Thread-safe token bucket with a configurable refill rate and burst size"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until the requested tokens are available (0 if available now)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def take(self, tokens: float = 1.0):
+        """Consume tokens unconditionally; callers check wait_time first"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def is_full(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens >= self.burst
+
+class RateLimiter:
+    """
+    Admits requests against a global quota and a per-user quota.
+
+    The global rate adapts to throttling feedback: it is halved on every throttling
+    error and recovers additively on successful calls, up to the configured rate.
+    """
+
+    def __init__(self, global_rate: float = 5.0, global_burst: float = 10.0,
+                 user_rate: float = 1.0, user_burst: float = 3.0,
+                 min_global_rate: float = 0.2, recovery_step: float = 0.1,
+                 max_tracked_users: int = 1000):
+        self.max_global_rate = global_rate
+        self.min_global_rate = min_global_rate
+        self.recovery_step = recovery_step
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_tracked_users = max_tracked_users
+
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _get_user_bucket(self, user_id: Optional[str]) -> Optional[TokenBucket]:
+        if not user_id:
+            return None
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            if len(self._user_buckets) >= self.max_tracked_users:
+                # Forget idle users; a full bucket carries no state worth keeping
+                for idle_user in [uid for uid, b in self._user_buckets.items() if b.is_full()]:
+                    del self._user_buckets[idle_user]
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self._user_buckets[user_id] = bucket
+        return bucket
+
+    def _try_acquire(self, user_id: Optional[str]) -> float:
+        """Take one token from each applicable bucket, or return how long to wait"""
+        with self._lock:
+            user_bucket = self._get_user_bucket(user_id)
+            wait = self.global_bucket.wait_time()
+            if user_bucket:
+                wait = max(wait, user_bucket.wait_time())
+            if wait > 0:
+                return wait
+
+            self.global_bucket.take()
+            if user_bucket:
+                user_bucket.take()
+            return 0.0
+
+    def acquire(self, user_id: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Block until a request for the given user is admitted.
+
+        Args:
+            user_id (str, optional): User the request is made for
+            timeout (float, optional): Maximum seconds to wait
+
+        Raises:
+            RateLimitTimeout: If the request is not admitted within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire(user_id)
+            if wait == 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Rate limit wait exceeded {timeout}s for user {user_id}")
+            time.sleep(wait)
+
+    async def acquire_async(self, user_id: Optional[str] = None, timeout: Optional[float] = None):
+        """Async variant of acquire that yields to the event loop while waiting"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire(user_id)
+            if wait == 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Rate limit wait exceeded {timeout}s for user {user_id}")
+            await asyncio.sleep(wait)
+
+    def on_throttle(self):
+        """Back off the global rate after a throttling error from the service"""
+        new_rate = max(self.min_global_rate, self.global_bucket.rate / 2)
+        self.global_bucket.set_rate(new_rate)
+        logger.warning(f"Throttled by service, reducing global rate to {new_rate:.2f} req/s")
+
+    def on_success(self):
+        """Recover the global rate after a successful call"""
+        rate = self.global_bucket.rate
+        if rate < self.max_global_rate:
+            self.global_bucket.set_rate(min(self.max_global_rate, rate + self.recovery_step))
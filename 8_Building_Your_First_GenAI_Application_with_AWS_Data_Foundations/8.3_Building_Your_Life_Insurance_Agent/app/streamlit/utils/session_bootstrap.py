@@ -0,0 +1,176 @@
+# app/streamlit/utils/session_bootstrap.py
+
+import os
+import json
+import boto3
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+class SessionBootstrap:
+    """
+    Prepares the first screen of a chat session without going through the agent.
+
+    Policy details are read straight from the get-policy-details action group
+    Lambda and the welcome message is rendered from a template, cached per policy
+    and keyed by a hash of the policy data so it is rebuilt only when the data changes.
+    """
+
+    _welcome_cache: Dict[Tuple[str, str], str] = {}
+    _cache_lock = threading.Lock()
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='session-bootstrap')
+
+    def __init__(self, function_name: Optional[str] = None):
+        self.function_name = function_name or os.getenv('GET_POLICY_DETAILS_FUNCTION')
+        self.lambda_client = boto3.client('lambda')
+
+    def fetch_policy_details(self, policy_number: str) -> Optional[Dict]:
+        """
+        Invoke the get-policy-details Lambda directly with an action group shaped event.
+
+        Args:
+            policy_number (str): Policy number to look up
+
+        Returns:
+            Optional[Dict]: Parsed policy details, or None if the lookup failed
+        """
+        if not self.function_name:
+            logger.warning("GET_POLICY_DETAILS_FUNCTION is not set, skipping direct policy fetch")
+            return None
+
+        event = {
+            'messageVersion': '1.0',
+            'actionGroup': 'GetPolicyDetails',
+            'apiPath': '/get-policy-details',
+            'httpMethod': 'POST',
+            'requestBody': {
+                'content': {
+                    'application/json': {
+                        'properties': [
+                            {'name': 'policyNumber', 'type': 'string', 'value': policy_number}
+                        ]
+                    }
+                }
+            }
+        }
+
+        try:
+            response = self.lambda_client.invoke(
+                FunctionName=self.function_name,
+                InvocationType='RequestResponse',
+                Payload=json.dumps(event).encode('utf-8')
+            )
+            payload = json.loads(response['Payload'].read())
+            result = payload.get('response', {})
+
+            if result.get('httpStatusCode') != 200:
+                logger.error(f"Policy lookup for {policy_number} returned status {result.get('httpStatusCode')}")
+                return None
+
+            body = result['responseBody']['application/json']['body']
+            return json.loads(body)
+
+        except (ClientError, KeyError, ValueError) as e:
+            logger.error(f"Failed to fetch policy details for {policy_number}: {str(e)}")
+            return None
+
+    @staticmethod
+    def get_data_version(policy_details: Dict) -> str:
+        """Get a stable version identifier for a policy details payload"""
+        canonical = json.dumps(policy_details, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def render_welcome_message(policy_details: Dict) -> str:
+        """
+        Render the welcome message for a policy from its details.
+
+        Args:
+            policy_details (Dict): Response body of the get-policy-details action group
+
+        Returns:
+            str: Markdown welcome message
+        """
+        policy = policy_details.get('policy') or {}
+        premium = policy_details.get('premium') or {}
+        last_payment = policy_details.get('lastPayment') or {}
+
+        owner_name = policy.get('ownerName') or 'there'
+        policy_type = (policy.get('policyType') or '').replace('_', ' ').title()
+
+        lines = [
+            f"Welcome back, {owner_name}! I'm here to help with your "
+            f"{policy_type + ' ' if policy_type else ''}life insurance policy **{policy.get('policyNumber', '')}**.",
+            ""
+        ]
+
+        if policy.get('policyStatus'):
+            lines.append(f"- **Status:** {policy['policyStatus'].replace('_', ' ').title()}")
+        if policy.get('faceAmount') is not None:
+            lines.append(f"- **Face amount:** ${policy['faceAmount']:,.2f}")
+        if premium.get('amount') is not None:
+            frequency = (premium.get('frequency') or '').replace('_', ' ').lower()
+            lines.append(
+                f"- **Premium:** ${premium['amount']:,.2f} {frequency}".rstrip()
+                + (f", next due {premium['nextDueDate'][:10]}" if premium.get('nextDueDate') else "")
+            )
+        if last_payment.get('paymentAmount') is not None:
+            lines.append(
+                f"- **Last payment:** ${last_payment['paymentAmount']:,.2f}"
+                + (f" on {last_payment['paymentDate'][:10]}" if last_payment.get('paymentDate') else "")
+            )
+
+        lines.extend([
+            "",
+            "I can help you review your coverage, make a payment, update your address or "
+            "beneficiaries, and answer questions about your policy. How can I help today?"
+        ])
+        return "\n".join(lines)
+
+    def get_welcome_message(self, policy_number: str, policy_details: Dict) -> str:
+        """Get the cached welcome message for the current version of a policy's data"""
+        key = (policy_number, self.get_data_version(policy_details))
+
+        with self._cache_lock:
+            message = self._welcome_cache.get(key)
+        if message is not None:
+            return message
+
+        message = self.render_welcome_message(policy_details)
+        with self._cache_lock:
+            self._welcome_cache[key] = message
+        logger.info(f"Cached welcome message for policy {policy_number} (version {key[1]})")
+        return message
+
+    def bootstrap(self, policy_number: str) -> Dict:
+        """
+        Load everything the first screen of a session needs.
+
+        Args:
+            policy_number (str): Policy number of the authenticated user
+
+        Returns:
+            Dict: Bootstrap result with status, policy details and welcome message
+        """
+        policy_details = self.fetch_policy_details(policy_number)
+        if not policy_details:
+            return {
+                'status': 'error',
+                'message': f"Policy details unavailable for {policy_number}"
+            }
+
+        return {
+            'status': 'success',
+            'policy_details': policy_details,
+            'welcome_message': self.get_welcome_message(policy_number, policy_details)
+        }
+
+    def prefetch(self, policy_number: str) -> Future:
+        """Start bootstrapping a session in the background, e.g. right after login"""
+        logger.info(f"Prefetching session bootstrap for policy: {policy_number}")
+        return self._executor.submit(self.bootstrap, policy_number)
@@ -0,0 +1,69 @@
+# lambda/benchmarks/import_time_benchmark.py
+
+"""
+Import-time benchmark of the Python Lambda handlers.
+
+Imports each handler's index module in a fresh interpreter with `python -X importtime`,
+the way a cold start does, and reports the total import time and the slowest
+imports of the index module. The shared helpers are put on the path as they are when bundled.
+Run it in an environment with the handler's requirements installed.
+
+Usage:
+    python benchmarks/import_time_benchmark.py [--handlers load-sample-data create-kb-extension] [--runs 5] [--top 5]
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SHARED_DIR = os.path.join(LAMBDA_DIR, 'shared')
+
+def measure(handler: str):
+    """Import a handler once and return its import microseconds and those of its direct imports"""
+    handler_dir = os.path.join(LAMBDA_DIR, handler)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([handler_dir, SHARED_DIR]), PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import index'],
+        cwd=handler_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {handler} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    # Lines look like "import time: self [us] | cumulative | imported package", nested
+    # imports are indented by two more spaces and listed before the module importing them
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'index':
+                return int(cumulative), children
+            children = {}
+        elif depth == 1:
+            children[name.strip()] = int(cumulative)
+    raise RuntimeError(f"No import time reported for {handler}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', nargs='+', default=['load-sample-data', 'create-kb-extension'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    for handler in args.handlers:
+        runs = [measure(handler) for _ in range(args.runs)]
+        totals = [total for total, _ in runs]
+        print(f"{handler}: median {statistics.median(totals) / 1000:.1f} ms "
+              f"(min {min(totals) / 1000:.1f} ms, {args.runs} runs)")
+
+        _, imports = runs[-1]
+        for name, us in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"  {name:<30} {us / 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,226 @@
 # lambda/create-cognito-users/index.py
 
 import os
+import csv
+import io
 import json
+import time
 import boto3
-from typing import Dict, Any
+import random
+import threading
+import urllib.request
+from typing import Dict, Any, List
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
 cognito = boto3.client('cognito-idp')
 
+# Cognito admin API quotas are shared by the whole account, so stay below them
+MAX_WORKERS = int(os.getenv('COGNITO_PROVISIONING_WORKERS', '8'))
+REQUESTS_PER_SECOND = float(os.getenv('COGNITO_ADMIN_RPS', '20'))
+MAX_ATTEMPTS = int(os.getenv('COGNITO_MAX_ATTEMPTS', '6'))
+
+# Above this many users, use a Cognito user import job if a CloudWatch Logs role is configured
+IMPORT_JOB_THRESHOLD = int(os.getenv('COGNITO_IMPORT_JOB_THRESHOLD', '10000'))
+IMPORT_ROLE_ARN = os.getenv('COGNITO_IMPORT_ROLE_ARN')
+
+RETRYABLE_ERRORS = {'TooManyRequestsException', 'LimitExceededException', 'InternalErrorException'}
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace admin API calls"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 def read_policy_data() -> list:
     """Read policy data from the sample data file"""
     with open(os.environ['POLICY_DATA_PATH'], 'r') as f:
         data = json.load(f)
     return data['policies']
 
-def create_user(user_pool_id: str, policy: Dict[str, Any]) -> None:
-    """Create a Cognito user for a policy"""
-    try:
-        temp_password = os.getenv('COGNITO_TEMP_PASSWORD', 'ChangeMe123!')
-        # Changed owner_name to policy_owner
-        username = policy['policy_owner'].replace(' ', '').lower()
-        cognito.admin_create_user(
-            UserPoolId=user_pool_id,
-            Username=username,
-            UserAttributes=[
-                {
-                    'Name': 'custom:policy_number',
-                    'Value': policy['policy_number']
-                },
-                {
-                    'Name': 'name',
-                    'Value': policy['policy_owner']
-                },
-                {
-                    'Name': 'email',
-                    'Value': f"{username}@example.com"
-                },
-                {
-                    'Name': 'email_verified',
-                    'Value': 'true'
-                }
-            ],
-            TemporaryPassword=temp_password,
-            MessageAction='SUPPRESS'
-        )
-        print(f"Created user {username} for policy {policy['policy_number']}")
-    except Exception as e:
-        print(f"Error creating user for policy {policy['policy_number']}: {str(e)}")
-        raise
+def get_username(policy: Dict[str, Any]) -> str:
+    """Derive the Cognito username for a policy owner"""
+    return policy['policy_owner'].replace(' ', '').lower()
+
+def create_user(user_pool_id: str, policy: Dict[str, Any], bucket: TokenBucket) -> str:
+    """
+    Create a Cognito user for a policy, retrying throttled calls with jittered backoff.
+
+    Returns:
+        str: 'created', or 'skipped' if the user already exists
+    """
+    temp_password = os.getenv('COGNITO_TEMP_PASSWORD', 'ChangeMe123!')
+    # Changed owner_name to policy_owner
+    username = get_username(policy)
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        bucket.acquire()
+        try:
+            cognito.admin_create_user(
+                UserPoolId=user_pool_id,
+                Username=username,
+                UserAttributes=[
+                    {
+                        'Name': 'custom:policy_number',
+                        'Value': policy['policy_number']
+                    },
+                    {
+                        'Name': 'name',
+                        'Value': policy['policy_owner']
+                    },
+                    {
+                        'Name': 'email',
+                        'Value': f"{username}@example.com"
+                    },
+                    {
+                        'Name': 'email_verified',
+                        'Value': 'true'
+                    }
+                ],
+                TemporaryPassword=temp_password,
+                MessageAction='SUPPRESS'
+            )
+            return 'created'
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'UsernameExistsException':
+                return 'skipped'
+            if code not in RETRYABLE_ERRORS or attempt == MAX_ATTEMPTS:
+                raise
+            # Full jitter keeps retrying workers from hitting the quota in lockstep
+            time.sleep(random.uniform(0, min(20.0, 0.5 * 2 ** attempt)))
+
+def provision_users(user_pool_id: str, policies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Create users for all policies concurrently, paced to the Cognito admin API quota.
+
+    Returns:
+        Dict[str, Any]: Summary with created, skipped and failed counts and the failures
+    """
+    bucket = TokenBucket(REQUESTS_PER_SECOND, burst=MAX_WORKERS)
+    summary = {'created': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def provision(policy):
+        try:
+            outcome = create_user(user_pool_id, policy, bucket)
+        except Exception as e:
+            outcome = 'failed'
+            with lock:
+                summary['errors'].append(f"{policy['policy_number']}: {str(e)}")
+        with lock:
+            summary[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(provision, policies))
+
+    summary['elapsed_seconds'] = round(time.monotonic() - start, 2)
+    return summary
+
+def start_user_import_job(user_pool_id: str, policies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Provision users through a Cognito CSV user import job.
+
+    Imported users have no temporary password and must reset their password on
+    first sign-in; existing users are reported as failed rows in the job's logs.
+    """
+    header = cognito.get_csv_header(UserPoolId=user_pool_id)['CSVHeader']
+
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=header, extrasaction='ignore')
+    writer.writeheader()
+    for policy in policies:
+        username = get_username(policy)
+        writer.writerow({
+            'cognito:username': username,
+            'name': policy['policy_owner'],
+            'email': f"{username}@example.com",
+            'email_verified': 'true',
+            'custom:policy_number': policy['policy_number'],
+            'cognito:mfa_enabled': 'false'
+        })
+
+    job = cognito.create_user_import_job(
+        JobName=f"policyholders-{int(time.time())}",
+        UserPoolId=user_pool_id,
+        CloudWatchLogsRoleArn=IMPORT_ROLE_ARN
+    )['UserImportJob']
+
+    request = urllib.request.Request(
+        job['PreSignedUrl'],
+        data=output.getvalue().encode('utf-8'),
+        method='PUT',
+        headers={'x-amz-server-side-encryption': 'aws:kms'}
+    )
+    urllib.request.urlopen(request).read()
+
+    cognito.start_user_import_job(UserPoolId=user_pool_id, JobId=job['JobId'])
+    return {'import_job_id': job['JobId'], 'users': len(policies)}
 
 def handler(event, context):
     """Lambda handler for creating Cognito users"""
     try:
-        print("Event:", json.dumps(event, indent=2))
-        
+        print("Event:", json.dumps(event))
+
         if event['RequestType'] in ['Create', 'Update']:
             user_pool_id = event['ResourceProperties']['UserPoolId']
             print(f"Reading policy data from: {os.environ['POLICY_DATA_PATH']}")
             policies = read_policy_data()
             print(f"Found {len(policies)} policies")
-            print(f"First policy: {json.dumps(policies[0], indent=2)}")
-            
-            for policy in policies:
-                create_user(user_pool_id, policy)
-            
+
+            if len(policies) > IMPORT_JOB_THRESHOLD and IMPORT_ROLE_ARN:
+                result = start_user_import_job(user_pool_id, policies)
+                print(f"Started user import job: {json.dumps(result)}")
+                return {
+                    'PhysicalResourceId': 'CreateCognitoUsers',
+                    'Data': {
+                        'Message': f"Started import job {result['import_job_id']} for {len(policies)} users"
+                    }
+                }
+
+            summary = provision_users(user_pool_id, policies)
+            print(f"Provisioning summary: {json.dumps(summary)}")
+
+            if summary['failed']:
+                raise RuntimeError(
+                    f"Failed to create {summary['failed']} of {len(policies)} users: "
+                    f"{'; '.join(summary['errors'][:10])}"
+                )
+
             return {
                 'PhysicalResourceId': 'CreateCognitoUsers',
                 'Data': {
-                    'Message': f'Successfully created {len(policies)} users'
+                    'Message': f"Created {summary['created']} users, "
+                               f"skipped {summary['skipped']} existing users"
                 }
             }
 
         elif event['RequestType'] == 'Delete':
             print("Delete event received. No action needed for user deletion.")
-        
+
         return {
             'PhysicalResourceId': 'CreateCognitoUsers'
         }
-    
+
     except Exception as e:
         print(f"Error: {str(e)}")
         import traceback
         print(f"Traceback: {traceback.format_exc()}")
-        raise
\ No newline at end of file
+        raise
@@ -1,17 +1,8 @@
 # lambda/create-kb-extension/index.py
 
 import json
-import boto3
-import psycopg2
-import urllib3
 import os
-from sqlalchemy import create_engine, text, DDL
-
-def get_secret(secret_arn: str):
-    """Get secret from AWS Secrets Manager"""
-    client = boto3.client('secretsmanager')
-    response = client.get_secret_value(SecretId=secret_arn)
-    return json.loads(response['SecretString'])
+from db_utils import connect, get_connection, get_secret
 
 def send_cfn_response(event, context, response_status, response_data, physical_resource_id=None, reason=None):
     response_body = json.dumps({
@@ -26,6 +17,7 @@ def send_cfn_response(event, context, response_status, response_data, physical_r
 
     print(f"Response body:\n{response_body}")
 
+    import urllib3
     http = urllib3.PoolManager()
     try:
         http.request('PUT', event['ResponseURL'],
@@ -34,51 +26,15 @@ def send_cfn_response(event, context, response_status, response_data, physical_r
     except Exception as e:
         print(f"Failed to send response: {str(e)}")
 
-def handler(event, context):
-    """Lambda handler"""
-    print(f"Received event: {json.dumps(event)}")
-    
-    # Handle deletion
-    if event['RequestType'] == 'Delete':
-        send_cfn_response(event, context, 'SUCCESS', {})
-        return
-    
-    try:
-        # Get connection details from environment variables
-        secret = get_secret(os.environ['SECRET_ARN'])
-        db_name = os.environ['DB_NAME']
-        
-        # Connect to default database first
-        engine = create_engine(f"postgresql://{secret['username']}:{secret['password']}@{os.environ['CLUSTER_ENDPOINT']}/postgres")
-        connection = engine.connect()
-        
-        # Check if database exists
-        result = connection.execute(
-            text("SELECT 1 FROM pg_database WHERE datname = :name"),
-            {"name": db_name}
-        )
-        
-        if not result.fetchone():
-            print(f"Creating {db_name} database...")
-            connection.execute(text("COMMIT"))
-            # Need to use DDL for CREATE DATABASE
-            create_db = DDL(f"CREATE DATABASE {db_name}")
-            connection.execute(create_db)
-        
-        connection.close()
-        
-        # Connect to knowledge_db database
-        engine = create_engine(f"postgresql://{secret['username']}:{secret['password']}@{os.environ['CLUSTER_ENDPOINT']}/{db_name}")
-        connection = engine.connect()
-        connection.execute(text("COMMIT"))
-        
-        # Create vector extension
-        print("Creating vector extension...")
-        connection.execute(text('CREATE EXTENSION IF NOT EXISTS vector'))
-        
-        # Create the kb_documents table
-        print("Creating kb_documents table...")
-        connection.execute(text('''
+# Objects provisioned in the knowledge base database, in creation order. Each entry
+# pairs the DDL with the catalog expression that tells whether it already exists.
+KB_SCHEMA_OBJECTS = [
+    ('vector extension',
+     "EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector')",
+     'CREATE EXTENSION IF NOT EXISTS vector'),
+    ('kb_documents table',
+     "to_regclass('public.kb_documents') IS NOT NULL",
+     '''
             CREATE TABLE IF NOT EXISTS kb_documents (
                 id SERIAL PRIMARY KEY,
                 title TEXT NOT NULL,
@@ -88,31 +44,28 @@ def handler(event, context):
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
             )
-        '''))
-        
-        # Create categories table
-        print("Creating kb_categories table...")
-        connection.execute(text('''
+        '''),
+    ('kb_categories table',
+     "to_regclass('public.kb_categories') IS NOT NULL",
+     '''
             CREATE TABLE IF NOT EXISTS kb_categories (
                 id SERIAL PRIMARY KEY,
                 name VARCHAR(100) NOT NULL UNIQUE,
                 description TEXT
             )
-        '''))
-        
-        # Create junction table
-        print("Creating kb_document_categories table...")
-        connection.execute(text('''
+        '''),
+    ('kb_document_categories table',
+     "to_regclass('public.kb_document_categories') IS NOT NULL",
+     '''
             CREATE TABLE IF NOT EXISTS kb_document_categories (
                 document_id INTEGER REFERENCES kb_documents(id),
                 category_id INTEGER REFERENCES kb_categories(id),
                 PRIMARY KEY (document_id, category_id)
             )
-        '''))
-        
-        # Create update timestamp function
-        print("Creating update timestamp function...")
-        connection.execute(text('''
+        '''),
+    ('update timestamp function',
+     "EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'update_updated_at_column')",
+     '''
             CREATE OR REPLACE FUNCTION update_updated_at_column()
             RETURNS TRIGGER AS $$
             BEGIN
@@ -120,28 +73,96 @@ def handler(event, context):
                 RETURN NEW;
             END;
             $$ language 'plpgsql'
-        '''))
-        
-        # Create trigger
-        print("Creating update timestamp trigger...")
-        connection.execute(text('''
+        '''),
+    ('update timestamp trigger',
+     "EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'update_kb_documents_updated_at')",
+     '''
             DROP TRIGGER IF EXISTS update_kb_documents_updated_at ON kb_documents;
             CREATE TRIGGER update_kb_documents_updated_at
                 BEFORE UPDATE ON kb_documents
                 FOR EACH ROW
                 EXECUTE FUNCTION update_updated_at_column()
-        '''))
-        
-        # Create index for vector similarity search
-        print("Creating vector similarity index...")
-        connection.execute(text('''
+        '''),
+    ('vector similarity index',
+     "to_regclass('public.kb_documents_embedding_idx') IS NOT NULL",
+     '''
             CREATE INDEX IF NOT EXISTS kb_documents_embedding_idx ON kb_documents 
             USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100)
-        '''))
-        
+        '''),
+]
+
+def ensure_database(secret: dict, db_name: str):
+    """Create the database if it does not exist yet"""
+    connection = connect(secret, os.environ['CLUSTER_ENDPOINT'], 'postgres')
+    try:
+        # CREATE DATABASE cannot run inside a transaction block
+        connection.autocommit = True
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+            if not cur.fetchone():
+                print(f"Creating {db_name} database...")
+                cur.execute(f'CREATE DATABASE "{db_name}"')
+    finally:
         connection.close()
+
+def find_missing_objects(cur) -> list:
+    """Check every schema object with a single catalog query"""
+    checks = ", ".join(f"{check} AS c{i}" for i, (_, check, _) in enumerate(KB_SCHEMA_OBJECTS))
+    cur.execute(f"SELECT {checks}")
+    present = cur.fetchone()
+    return [obj for obj, exists in zip(KB_SCHEMA_OBJECTS, present) if not exists]
+
+def create_missing_objects(connection) -> list:
+    """Check the catalog and create whatever is missing, all in one transaction"""
+    with connection, connection.cursor() as cur:
+        missing = find_missing_objects(cur)
+        if not missing:
+            print("All knowledge base objects already exist")
+            return []
+
+        print(f"Creating: {', '.join(name for name, _, _ in missing)}")
+        cur.execute(";\n".join(ddl.strip() for _, _, ddl in missing))
+        return [name for name, _, _ in missing]
+
+def provision_schema(secret_arn: str, db_name: str) -> list:
+    """
+    Create the knowledge base database and its missing objects.
+
+    Returns:
+        list: Names of the objects that were created
+    """
+    import psycopg2
+
+    host = os.environ['CLUSTER_ENDPOINT']
+    try:
+        connection = get_connection(secret_arn, host, db_name)
+    except psycopg2.OperationalError as e:
+        # Only the first deployment has to create the database
+        if f'database "{db_name}" does not exist' not in str(e):
+            raise
+        ensure_database(get_secret(secret_arn), db_name)
+        connection = get_connection(secret_arn, host, db_name)
+    return create_missing_objects(connection)
+
+def handler(event, context):
+    """Lambda handler"""
+    print(f"Received event: {json.dumps(event)}")
+    
+    # Handle deletion
+    if event['RequestType'] == 'Delete':
+        send_cfn_response(event, context, 'SUCCESS', {})
+        return
+    
+    try:
+        # Get connection details from environment variables
+        db_name = os.environ['DB_NAME']
         
-        responseData = {'Message': 'Successfully created vector extension and tables'}
+        created = provision_schema(os.environ['SECRET_ARN'], db_name)
+        
+        responseData = {
+            'Message': 'Successfully created vector extension and tables' if created
+                       else 'Vector extension and tables already exist'
+        }
         send_cfn_response(event, context, 'SUCCESS', responseData)
         
     except Exception as e:
@@ -153,7 +174,3 @@ def handler(event, context):
             {'Error': str(e)},
             reason=str(e)
         )
-        
-    finally:
-        if 'connection' in locals() and connection is not None:
-            connection.close()
@@ -1,11 +1,23 @@
 # lambda/initialize-db/index.py
 
 import os
+import re
 import json
+import time
 import boto3
+import hashlib
 import psycopg2
 from botocore.exceptions import ClientError
 
+PLACEHOLDER_PATTERN = re.compile(r'\$\{([A-Z_]+)\}')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+NO_TRANSACTION_DIRECTIVE = '-- migrate:no-transaction'
+CREATE_INDEX_PATTERN = re.compile(
+    r'^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?'
+    r'([\w$]+)\s+ON\s+(?:ONLY\s+)?([\w$.]+)',
+    re.IGNORECASE | re.M
+)
+
 def log_environment():
     """Log all environment variables (excluding sensitive data)"""
     sensitive_keys = {'SECRET_ARN', 'password', 'secret'}
@@ -21,8 +33,8 @@ def validate_environment():
         'DB_NAME',
         'CLUSTER_ENDPOINT',
         'SECRET_ARN',
-        'SQL_DIR',
-        'SQL_FILE'
+        'MIGRATIONS_DIR',
+        'MIGRATIONS_SET'
     ]
     
     policy_vars = [
@@ -40,13 +52,13 @@ def validate_environment():
         'KB_MAIN_TABLE_NAME'
     ]
     
-    sql_file = os.environ.get('SQL_FILE', '')
-    if sql_file == 'policy_db_tables.sql':
+    migrations_set = os.environ.get('MIGRATIONS_SET', '')
+    if migrations_set == 'policy':
         required_vars = common_vars + policy_vars
-    elif sql_file == 'kb_tables.sql':
+    elif migrations_set == 'kb':
         required_vars = common_vars + kb_vars
     else:
-        raise ValueError(f"Unknown SQL file: {sql_file}")
+        raise ValueError(f"Unknown migrations set: {migrations_set}")
     
     missing = [var for var in required_vars if not os.environ.get(var)]
     if missing:
@@ -80,6 +92,152 @@ def execute_sql(cur, sql):
         print(f"Problematic SQL: {sql}")
         raise
 
+def render_sql(sql_template: str) -> str:
+    """Substitute ${VAR} placeholders from the environment in a single pass"""
+    def substitute(match):
+        name = match.group(1)
+        if name not in os.environ:
+            raise ValueError(f"Missing value for placeholder ${{{name}}}")
+        return os.environ[name]
+    return PLACEHOLDER_PATTERN.sub(substitute, sql_template)
+
+def split_statements(sql: str) -> list:
+    """Split a no-transaction migration into statements ending with ';' at end of line"""
+    statements = re.split(r';\s*$', sql, flags=re.M)
+    return [
+        stmt.strip() for stmt in statements
+        if any(line.strip() and not line.strip().startswith('--') for line in stmt.splitlines())
+    ]
+
+def created_index(statement: str):
+    """(index, table) created by a CREATE INDEX statement, or None for other statements"""
+    match = CREATE_INDEX_PATTERN.search(statement)
+    if not match:
+        return None
+    # Unquoted identifiers are folded to lower case, and the index lives in its table's schema
+    return match.group(1).lower(), match.group(2).lower()
+
+def invalid_indexes(cur, indexes: list) -> list:
+    """The indexes among (index, table) pairs that are left invalid, e.g. by a failed concurrent build"""
+    invalid = []
+    for index, table in indexes:
+        cur.execute("""
+            SELECT i.indexrelid::regclass::text
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = %s::regclass AND c.relname = %s AND NOT i.indisvalid
+        """, (table, index))
+        invalid.extend(row[0] for row in cur.fetchall())
+    return invalid
+
+def load_migrations(migrations_dir: str) -> list:
+    """
+    Load the ordered migrations of a migration set.
+
+    Files are named NNNN_description.sql and applied in version order. A file whose
+    first lines contain '-- migrate:no-transaction' runs statement by statement
+    outside a transaction, which CREATE INDEX CONCURRENTLY requires.
+    """
+    migrations = []
+    for filename in sorted(os.listdir(migrations_dir)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(migrations_dir, filename), 'r') as file:
+            sql_template = file.read()
+        migrations.append({
+            'version': match.group(1),
+            'name': match.group(2),
+            'checksum': hashlib.sha256(sql_template.encode('utf-8')).hexdigest(),
+            'transactional': NO_TRANSACTION_DIRECTIVE not in sql_template.splitlines()[:5],
+            'sql': render_sql(sql_template)
+        })
+    return sorted(migrations, key=lambda m: int(m['version']))
+
+def ensure_migrations_table(conn):
+    """Create the table that records applied migrations"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.schema_migrations (
+                version VARCHAR(20) PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER NOT NULL
+            )
+        """)
+        cur.execute("SELECT version, checksum FROM public.schema_migrations")
+        applied = dict(cur.fetchall())
+    conn.commit()
+    return applied
+
+def record_migration(cur, migration: dict, duration_ms: int):
+    cur.execute(
+        "INSERT INTO public.schema_migrations (version, name, checksum, duration_ms) "
+        "VALUES (%s, %s, %s, %s)",
+        (migration['version'], migration['name'], migration['checksum'], duration_ms)
+    )
+
+def apply_migration(conn, migration: dict) -> int:
+    """Apply one migration and record it; returns its duration in milliseconds"""
+    start = time.monotonic()
+
+    if migration['transactional']:
+        with conn.cursor() as cur:
+            execute_sql(cur, migration['sql'])
+            duration_ms = int((time.monotonic() - start) * 1000)
+            record_migration(cur, migration, duration_ms)
+        conn.commit()
+        return duration_ms
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            created = []
+            for statement in split_statements(migration['sql']):
+                step_start = time.monotonic()
+                execute_sql(cur, statement)
+                summary = next(line for line in statement.splitlines() if not line.strip().startswith('--'))
+                print(f"  {summary.strip()[:100]} ({(time.monotonic() - step_start) * 1000:.0f} ms)")
+                index = created_index(statement)
+                if index:
+                    created.append(index)
+
+            # A failed concurrent build leaves an invalid index that IF NOT EXISTS would skip.
+            # Only this migration's indexes are checked, not those of other sessions or deploys.
+            invalid = invalid_indexes(cur, created)
+            if invalid:
+                raise RuntimeError(f"Invalid indexes must be dropped before retrying: {', '.join(invalid)}")
+            duration_ms = int((time.monotonic() - start) * 1000)
+            record_migration(cur, migration, duration_ms)
+    finally:
+        conn.autocommit = False
+    return duration_ms
+
+def run_migrations(conn, migrations_dir: str) -> list:
+    """
+    Apply pending migrations in order, skipping the ones already recorded.
+
+    Returns:
+        list: Versions of the migrations applied by this run
+    """
+    applied = ensure_migrations_table(conn)
+    newly_applied = []
+
+    for migration in load_migrations(migrations_dir):
+        label = f"{migration['version']}_{migration['name']}"
+        if migration['version'] in applied:
+            if applied[migration['version']].strip() != migration['checksum']:
+                raise ValueError(f"Migration {label} was modified after it was applied")
+            print(f"Skipping applied migration {label}")
+            continue
+
+        print(f"Applying migration {label}")
+        duration_ms = apply_migration(conn, migration)
+        print(f"Applied migration {label} in {duration_ms} ms")
+        newly_applied.append(migration['version'])
+
+    return newly_applied
+
 def handler(event, context):
     try:
         print("Starting database initialization")
@@ -99,50 +257,17 @@ def handler(event, context):
             password=creds['password']
         )
         
-        # Create a cursor
-        cur = conn.cursor()
-        
-        # Read SQL file
-        sql_path = os.path.join(os.environ['SQL_DIR'], os.environ['SQL_FILE'])
-        print(f"Reading SQL file from: {sql_path}")
-        
-        with open(sql_path, 'r') as file:
-            sql_template = file.read()
-
-        # Replace placeholders based on SQL file type
-        if os.environ['SQL_FILE'] == 'policy_db_tables.sql':
-            replacements = {
-                '${POLICY_SCHEMA}': os.environ['POLICY_SCHEMA'],
-                '${POLICIES_TABLE}': os.environ['POLICIES_TABLE'],
-                '${PREMIUMS_TABLE}': os.environ['PREMIUMS_TABLE'],
-                '${ADDRESSES_TABLE}': os.environ['ADDRESSES_TABLE'],
-                '${BENEFICIARIES_TABLE}': os.environ['BENEFICIARIES_TABLE'],
-                '${PAYMENT_HISTORY_TABLE}': os.environ['PAYMENT_HISTORY_TABLE'],
-                '${PAYMENT_METHODS_TABLE}': os.environ['PAYMENT_METHODS_TABLE']
-            }
-            
-            sql = sql_template
-            for key, value in replacements.items():
-                sql = sql.replace(key, value)
-                
-        elif os.environ['SQL_FILE'] == 'kb_tables.sql':
-            sql = sql_template.replace('${KB_SCHEMA_NAME}', os.environ['KB_SCHEMA_NAME'])
-            sql = sql.replace('${KB_MAIN_TABLE_NAME}', os.environ['KB_MAIN_TABLE_NAME'])
-        
-        # Execute SQL
-        execute_sql(cur, sql)
-        
-        # Commit the transaction
-        conn.commit()
-        print("Successfully committed all changes")
-        
-        # Close cursor and connection
-        cur.close()
-        conn.close()
+        try:
+            migrations_dir = os.path.join(os.environ['MIGRATIONS_DIR'], os.environ['MIGRATIONS_SET'])
+            print(f"Running migrations from: {migrations_dir}")
+            applied = run_migrations(conn, migrations_dir)
+            print(f"Applied {len(applied)} migrations")
+        finally:
+            conn.close()
         
         return {
             'statusCode': 200,
-            'body': 'Database initialized successfully'
+            'body': f'Database initialized successfully ({len(applied)} migrations applied)'
         }
     
     except Exception as e:
@@ -0,0 +1,57 @@
+-- lambda/initialize-db/migrations/kb/0001_create_kb_tables.sql
+
+-- Enable vector extension
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Create schema for Bedrock integration
+CREATE SCHEMA IF NOT EXISTS ${KB_SCHEMA_NAME};
+
+-- Create the Bedrock knowledge base table with correct vector dimension
+CREATE TABLE IF NOT EXISTS ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME} (
+    id uuid PRIMARY KEY,
+    embedding vector(1024),
+    chunks text,
+    metadata jsonb,
+    custom_metadata jsonb
+);
+
+-- Create documents table for general knowledge base
+CREATE TABLE IF NOT EXISTS ${KB_SCHEMA_NAME}.kb_documents (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    embedding vector(384),
+    metadata JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create categories table
+CREATE TABLE IF NOT EXISTS ${KB_SCHEMA_NAME}.kb_categories (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE,
+    description TEXT
+);
+
+-- Create document categories junction table
+CREATE TABLE IF NOT EXISTS ${KB_SCHEMA_NAME}.kb_document_categories (
+    document_id INTEGER REFERENCES ${KB_SCHEMA_NAME}.kb_documents(id),
+    category_id INTEGER REFERENCES ${KB_SCHEMA_NAME}.kb_categories(id),
+    PRIMARY KEY (document_id, category_id)
+);
+
+-- Create or replace function to update timestamp
+CREATE OR REPLACE FUNCTION ${KB_SCHEMA_NAME}.update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- Drop existing trigger if it exists and create new one
+DROP TRIGGER IF EXISTS update_kb_documents_updated_at ON ${KB_SCHEMA_NAME}.kb_documents;
+CREATE TRIGGER update_kb_documents_updated_at
+    BEFORE UPDATE ON ${KB_SCHEMA_NAME}.kb_documents
+    FOR EACH ROW
+    EXECUTE FUNCTION ${KB_SCHEMA_NAME}.update_updated_at_column();
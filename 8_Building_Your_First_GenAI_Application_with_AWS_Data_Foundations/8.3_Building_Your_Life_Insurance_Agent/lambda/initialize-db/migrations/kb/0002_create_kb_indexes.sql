@@ -0,0 +1,40 @@
+-- lambda/initialize-db/migrations/kb/0002_create_kb_indexes.sql
+-- migrate:no-transaction
+
+-- Indexes are built concurrently so populated tables stay writable during deploys
+
+-- Bedrock knowledge base indexes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${KB_MAIN_TABLE_NAME}_embedding_idx
+ON ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME}
+USING hnsw (embedding vector_cosine_ops)
+WITH (ef_construction=256);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${KB_MAIN_TABLE_NAME}_chunks_idx
+ON ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME}
+USING gin (to_tsvector('simple', chunks));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${KB_MAIN_TABLE_NAME}_metadata_idx
+ON ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME}
+USING gin (metadata);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${KB_MAIN_TABLE_NAME}_policy_number_idx
+ON ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME}
+USING btree ((metadata->>'policy_number'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${KB_MAIN_TABLE_NAME}_custom_metadata_idx
+ON ${KB_SCHEMA_NAME}.${KB_MAIN_TABLE_NAME}
+USING gin (custom_metadata);
+
+-- General knowledge base document indexes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_documents_metadata_idx
+ON ${KB_SCHEMA_NAME}.kb_documents
+USING gin (metadata);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_documents_policy_number_idx
+ON ${KB_SCHEMA_NAME}.kb_documents
+USING btree ((metadata->>'policy_number'));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS kb_documents_embedding_idx
+ON ${KB_SCHEMA_NAME}.kb_documents
+USING ivfflat (embedding vector_cosine_ops)
+WITH (lists = 100);
@@ -1,4 +1,4 @@
--- lambda/initialize-db/sql/policy_db_tables.sql
+-- lambda/initialize-db/migrations/policy/0001_create_policy_tables.sql
 
 -- Create schema if it doesn't exist
 CREATE SCHEMA IF NOT EXISTS ${POLICY_SCHEMA};
@@ -115,14 +115,3 @@ CREATE TABLE IF NOT EXISTS ${POLICY_SCHEMA}.policy_valuations (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT unique_policy_valuation UNIQUE (policy_number, valuation_date)
 );
-
--- Create indexes
-CREATE INDEX IF NOT EXISTS idx_policies_owner ON ${POLICIES_TABLE}(policy_owner);
-CREATE INDEX IF NOT EXISTS idx_policies_insured ON ${POLICIES_TABLE}(insured_person);
-CREATE INDEX IF NOT EXISTS idx_premiums_policy ON ${PREMIUMS_TABLE}(policy_number);
-CREATE INDEX IF NOT EXISTS idx_addresses_policy ON ${ADDRESSES_TABLE}(policy_number);
-CREATE INDEX IF NOT EXISTS idx_beneficiaries_policy ON ${BENEFICIARIES_TABLE}(policy_number);
-CREATE INDEX IF NOT EXISTS idx_payment_methods_policy ON ${PAYMENT_METHODS_TABLE}(policy_number);
-CREATE INDEX IF NOT EXISTS idx_payment_history_policy ON ${PAYMENT_HISTORY_TABLE}(policy_number);
-CREATE INDEX IF NOT EXISTS idx_policy_valuations_policy ON ${POLICY_SCHEMA}.policy_valuations(policy_number);
-CREATE INDEX IF NOT EXISTS idx_policy_valuations_date ON ${POLICY_SCHEMA}.policy_valuations(valuation_date);
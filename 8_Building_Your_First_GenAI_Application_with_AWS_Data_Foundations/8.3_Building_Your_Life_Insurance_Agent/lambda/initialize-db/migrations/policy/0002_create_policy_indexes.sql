@@ -0,0 +1,13 @@
+-- lambda/initialize-db/migrations/policy/0002_create_policy_indexes.sql
+-- migrate:no-transaction
+
+-- Indexes are built concurrently so populated tables stay writable during deploys
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_policies_owner ON ${POLICY_SCHEMA}.${POLICIES_TABLE}(policy_owner);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_policies_insured ON ${POLICY_SCHEMA}.${POLICIES_TABLE}(insured_person);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_premiums_policy ON ${POLICY_SCHEMA}.${PREMIUMS_TABLE}(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_addresses_policy ON ${POLICY_SCHEMA}.${ADDRESSES_TABLE}(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_beneficiaries_policy ON ${POLICY_SCHEMA}.${BENEFICIARIES_TABLE}(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payment_methods_policy ON ${POLICY_SCHEMA}.${PAYMENT_METHODS_TABLE}(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payment_history_policy ON ${POLICY_SCHEMA}.${PAYMENT_HISTORY_TABLE}(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_policy_valuations_policy ON ${POLICY_SCHEMA}.policy_valuations(policy_number);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_policy_valuations_date ON ${POLICY_SCHEMA}.policy_valuations(valuation_date);
@@ -2,202 +2,64 @@
 
 import os
 import json
-import boto3
-from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Date, Numeric, Boolean, insert, select
-from botocore.exceptions import ClientError
 from datetime import datetime
+from db_utils import get_connection
 
-def get_db_credentials(secret_arn):
-    session = boto3.session.Session()
-    client = session.client('secretsmanager')
-    
-    try:
-        get_secret_value_response = client.get_secret_value(
-            SecretId=secret_arn
-        )
-    except ClientError as e:
-        raise e
-    else:
-        if 'SecretString' in get_secret_value_response:
-            # Fixed: Changed eval() to json.loads() for safer parsing
-            secret = json.loads(get_secret_value_response['SecretString'])
-            return secret
-        else:
-            raise ValueError("Secret binary is not supported")
+# Target table (environment variable holding its name, or the name itself), columns,
+# and the function mapping a sample data record to a row
+TABLE_LOADS = [
+    ('policies', 'POLICIES_TABLE',
+     ('policy_number', 'policy_type', 'policy_status', 'issue_date', 'face_amount',
+      'policy_owner', 'owner_date_of_birth', 'insured_person'),
+     lambda r: (r['policy_number'], r['policy_type'], r['policy_status'], r['issue_date'],
+                r['face_amount'], r['policy_owner'], r['owner_date_of_birth'], r['insured_person'])),
+    ('premiums', 'PREMIUMS_TABLE',
+     ('policy_number', 'premium_amount', 'premium_frequency', 'next_due_date'),
+     lambda r: (r['policy_number'], r['premium_amount'], r['premium_frequency'], r['next_due_date'])),
+    ('addresses', 'ADDRESSES_TABLE',
+     ('policy_number', 'address_type', 'street_address', 'city', 'state', 'zip_code', 'is_current'),
+     lambda r: (r['policy_number'], r['address_type'], r['street_address'], r['city'],
+                r['state'], r['zip_code'], r['is_current'])),
+    ('beneficiaries', 'BENEFICIARIES_TABLE',
+     ('policy_number', 'beneficiary_name', 'relationship', 'percentage', 'is_primary'),
+     lambda r: (r['policy_number'], r['beneficiary_name'], r['relationship'], r['percentage'],
+                r.get('is_primary', False))),
+    ('payment_methods', 'PAYMENT_METHODS_TABLE',
+     ('policy_number', 'payment_type', 'card_number', 'card_last_four', 'account_number',
+      'routing_number', 'expiration_date', 'is_default', 'status'),
+     lambda r: (r['policy_number'], r['payment_type'], r.get('card_number'), r.get('card_last_four'),
+                r.get('account_number'), r.get('routing_number'), r.get('expiration_date'),
+                r.get('is_default', False), 'ACTIVE')),
+    ('policy_valuations', None,
+     ('policy_number', 'net_cash_surrender', 'valuation_date'),
+     lambda r: (r['policy_number'], r['net_cash_surrender'], r['valuation_date'])),
+]
 
-def load_policy_data(connection, data, schema):
-    # Define table structures using SQLAlchemy Core
-    metadata = MetaData()
-    
-    policies_table = Table(os.environ['POLICIES_TABLE'], metadata,
-        Column('policy_number', String),
-        Column('policy_type', String),
-        Column('policy_status', String),
-        Column('issue_date', Date),
-        Column('face_amount', Numeric),
-        Column('policy_owner', String),
-        Column('owner_date_of_birth', Date),
-        Column('insured_person', String),
-        schema=schema
-    )
-    
-    premiums_table = Table(os.environ['PREMIUMS_TABLE'], metadata,
-        Column('policy_number', String),
-        Column('premium_amount', Numeric),
-        Column('premium_frequency', String),
-        Column('next_due_date', Date),
-        schema=schema
-    )
-    
-    addresses_table = Table(os.environ['ADDRESSES_TABLE'], metadata,
-        Column('policy_number', String),
-        Column('address_type', String),
-        Column('street_address', String),
-        Column('city', String),
-        Column('state', String),
-        Column('zip_code', String),
-        Column('is_current', Boolean),
-        schema=schema
-    )
-    
-    beneficiaries_table = Table(os.environ['BENEFICIARIES_TABLE'], metadata,
-        Column('policy_number', String),
-        Column('beneficiary_name', String),
-        Column('relationship', String),
-        Column('percentage', Numeric),
-        Column('is_primary', Boolean),
-        schema=schema
-    )
-    
-    payment_methods_table = Table(os.environ['PAYMENT_METHODS_TABLE'], metadata,
-        Column('payment_method_id', Integer),
-        Column('policy_number', String),
-        Column('payment_type', String),
-        Column('card_number', String),
-        Column('card_last_four', String),
-        Column('account_number', String),
-        Column('routing_number', String),
-        Column('expiration_date', Date),
-        Column('is_default', Boolean),
-        Column('status', String),
-        schema=schema
-    )
-    
-    payment_history_table = Table(os.environ['PAYMENT_HISTORY_TABLE'], metadata,
-        Column('policy_number', String),
-        Column('payment_method_id', Integer),
-        Column('payment_amount', Numeric),
-        Column('payment_date', Date),
-        Column('payment_status', String),
-        schema=schema
-    )
-    
-    valuations_table = Table('policy_valuations', metadata,
-        Column('policy_number', String),
-        Column('net_cash_surrender', Numeric),
-        Column('valuation_date', Date),
-        schema=schema
-    )
-    
-    try:
-        print("Loading policies...")
-        for policy in data['policies']:
-            print(f"Processing policy {policy['policy_number']}")
-            stmt = insert(policies_table).values(
-                policy_number=policy['policy_number'],
-                policy_type=policy['policy_type'],
-                policy_status=policy['policy_status'],
-                issue_date=policy['issue_date'],
-                face_amount=policy['face_amount'],
-                policy_owner=policy['policy_owner'],
-                owner_date_of_birth=policy['owner_date_of_birth'],
-                insured_person=policy['insured_person']
-            )
-            connection.execute(stmt)
-
-        print("Loading premiums...")
-        for premium in data['premiums']:
-            print(f"Processing premium for policy {premium['policy_number']}")
-            stmt = insert(premiums_table).values(
-                policy_number=premium['policy_number'],
-                premium_amount=premium['premium_amount'],
-                premium_frequency=premium['premium_frequency'],
-                next_due_date=premium['next_due_date']
-            )
-            connection.execute(stmt)
-
-        print("Loading addresses...")
-        for address in data['addresses']:
-            print(f"Processing address for policy {address['policy_number']}")
-            stmt = insert(addresses_table).values(
-                policy_number=address['policy_number'],
-                address_type=address['address_type'],
-                street_address=address['street_address'],
-                city=address['city'],
-                state=address['state'],
-                zip_code=address['zip_code'],
-                is_current=address['is_current']
-            )
-            connection.execute(stmt)
+def insert_rows(cur, table, columns, rows, template=None):
+    """Insert all rows of a table in batched multi-row INSERT statements"""
+    from psycopg2 import sql
+    from psycopg2.extras import execute_values
 
-        print("Loading beneficiaries...")
-        for beneficiary in data['beneficiaries']:
-            print(f"Processing beneficiary for policy {beneficiary['policy_number']}")
-            stmt = insert(beneficiaries_table).values(
-                policy_number=beneficiary['policy_number'],
-                beneficiary_name=beneficiary['beneficiary_name'],
-                relationship=beneficiary['relationship'],
-                percentage=beneficiary['percentage'],
-                is_primary=beneficiary.get('is_primary', False)
-            )
-            connection.execute(stmt)
+    statement = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        table, sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    execute_values(cur, statement.as_string(cur), rows, template=template, page_size=500)
 
-        print("Loading payment methods...")
-        for method in data['payment_methods']:
-            print(f"Processing payment method for policy {method['policy_number']}")
-            stmt = insert(payment_methods_table).values(
-                policy_number=method['policy_number'],
-                payment_type=method['payment_type'],
-                card_number=method.get('card_number'),
-                card_last_four=method.get('card_last_four'),
-                account_number=method.get('account_number'),
-                routing_number=method.get('routing_number'),
-                expiration_date=method.get('expiration_date'),
-                is_default=method.get('is_default', False),
-                status='ACTIVE'
-            )
-            connection.execute(stmt)
+def load_policy_data(connection, data, schema):
+    from psycopg2 import sql
 
-        print("Loading payment history...")
-        for payment in data['payment_history']:
-            print(f"Processing payment for policy {payment['policy_number']}")
-            # Get the payment method id
-            stmt = select(payment_methods_table.c.payment_method_id).where(
-                (payment_methods_table.c.policy_number == payment['policy_number']) &
-                (payment_methods_table.c.payment_type == payment['payment_type']) &
-                (payment_methods_table.c.is_default == True)
-            )
-            result = connection.execute(stmt)
-            payment_method_id = result.fetchone()
+    def table(name):
+        return sql.Identifier(schema, name)
 
-            stmt = insert(payment_history_table).values(
-                policy_number=payment['policy_number'],
-                payment_method_id=payment_method_id[0] if payment_method_id else None,
-                payment_amount=payment['payment_amount'],
-                payment_date=payment['payment_date'],
-                payment_status=payment['payment_status']
-            )
-            connection.execute(stmt)
+    try:
+        with connection.cursor() as cur:
+            for key, table_env, columns, to_row in TABLE_LOADS:
+                print(f"Loading {len(data[key])} {key.replace('_', ' ')}...")
+                table_name = os.environ[table_env] if table_env else key
+                insert_rows(cur, table(table_name), columns, [to_row(r) for r in data[key]])
 
-        print("Loading policy valuations...")
-        for valuation in data['policy_valuations']:
-            print(f"Processing valuation for policy {valuation['policy_number']}")
-            stmt = insert(valuations_table).values(
-                policy_number=valuation['policy_number'],
-                net_cash_surrender=valuation['net_cash_surrender'],
-                valuation_date=valuation['valuation_date']
-            )
-            connection.execute(stmt)
+            # Payment history looks up the default payment methods inserted above
+            load_payment_history(cur, data, table)
 
     except KeyError as e:
         print(f"Missing required field in data: {str(e)}")
@@ -206,6 +68,24 @@ def load_policy_data(connection, data, schema):
         print(f"Error in load_policy_data: {str(e)}")
         raise
 
+def load_payment_history(cur, data, table):
+    """Insert payment history, resolving each payment's default method in the same statement"""
+    from psycopg2 import sql
+
+    print(f"Loading {len(data['payment_history'])} payment history records...")
+    lookup = sql.SQL(
+        "(%s, (SELECT payment_method_id FROM {} WHERE policy_number = %s AND payment_type = %s "
+        "AND is_default = TRUE LIMIT 1), %s, %s, %s)"
+    ).format(table(os.environ['PAYMENT_METHODS_TABLE']))
+    rows = [
+        (p['policy_number'], p['policy_number'], p['payment_type'],
+         p['payment_amount'], p['payment_date'], p['payment_status'])
+        for p in data['payment_history']
+    ]
+    insert_rows(cur, table(os.environ['PAYMENT_HISTORY_TABLE']),
+                ('policy_number', 'payment_method_id', 'payment_amount', 'payment_date', 'payment_status'),
+                rows, template=lookup.as_string(cur))
+
 def handler(event, context):
     print(f"Starting sample data load at {datetime.now().isoformat()}")
     print("Event:", json.dumps(event, indent=2))
@@ -213,12 +93,10 @@ def handler(event, context):
     
     try:
         # Load policy data
-        print("Getting policy database credentials...")
-        policy_creds = get_db_credentials(os.environ['POLICY_SECRET_ARN'])
-        
         print(f"Connecting to policy database at {os.environ['POLICY_CLUSTER_ENDPOINT']}...")
-        engine = create_engine(f"postgresql://{policy_creds['username']}:{policy_creds['password']}@{os.environ['POLICY_CLUSTER_ENDPOINT']}/{os.environ['POLICY_DB_NAME']}")
-        connection = engine.connect()
+        connection = get_connection(os.environ['POLICY_SECRET_ARN'],
+                                    os.environ['POLICY_CLUSTER_ENDPOINT'],
+                                    os.environ['POLICY_DB_NAME'])
         
         print("Loading policy sample data...")
         sample_data_path = 'shared/sample-data/policy_data.json'
@@ -249,8 +127,6 @@ def handler(event, context):
         except Exception as e:
             connection.rollback()
             raise e
-        finally:
-            connection.close()
 
         return {
             'statusCode': 200,
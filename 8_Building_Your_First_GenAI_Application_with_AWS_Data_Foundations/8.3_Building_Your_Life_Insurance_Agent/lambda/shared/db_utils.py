@@ -0,0 +1,92 @@
+# lambda/shared/db_utils.py
+
+"""
+Database and secret helpers shared by the Python custom-resource handlers.
+
+The module is copied next to each handler's index.py at bundling time. boto3 and
+psycopg2 are imported on first use rather than at module load, and the secret,
+the Secrets Manager client and the database connections are kept in the
+execution environment so warm invocations skip the lookups and the TLS handshake.
+"""
+
+import os
+import json
+from typing import Dict, Tuple
+
+_secrets: Dict[str, Dict] = {}
+_connections: Dict[Tuple[str, str], object] = {}
+_secrets_client = None
+
+def get_secret(secret_arn: str) -> Dict:
+    """Get a JSON secret from Secrets Manager, cached for the life of the execution environment"""
+    global _secrets_client
+    if secret_arn not in _secrets:
+        if _secrets_client is None:
+            import boto3
+            _secrets_client = boto3.client('secretsmanager')
+        response = _secrets_client.get_secret_value(SecretId=secret_arn)
+        if 'SecretString' not in response:
+            raise ValueError("Secret binary is not supported")
+        _secrets[secret_arn] = json.loads(response['SecretString'])
+    return _secrets[secret_arn]
+
+def invalidate_secret(secret_arn: str):
+    """Drop a cached secret, e.g. after the password was rotated"""
+    _secrets.pop(secret_arn, None)
+
+def connect(secret: Dict, host: str, database: str, **kwargs):
+    """Open a new, uncached psycopg2 connection"""
+    import psycopg2
+    return psycopg2.connect(
+        host=host,
+        port=int(secret.get('port', 5432)),
+        dbname=database,
+        user=secret['username'],
+        password=secret['password'],
+        connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+        **kwargs
+    )
+
+def _is_alive(connection) -> bool:
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1")
+        connection.rollback()
+        return True
+    except Exception:
+        connection.close()
+        return False
+
+def get_connection(secret_arn: str, host: str, database: str):
+    """
+    Get a psycopg2 connection that is reused across warm invocations.
+
+    A cached connection is checked with a cheap round trip before it is handed out
+    and reopened if the server dropped it. If authentication fails the secret is
+    fetched again once, so a rotated password does not need a cold start.
+    """
+    import psycopg2
+
+    key = (host, database)
+    connection = _connections.get(key)
+    if connection is not None and _is_alive(connection):
+        return connection
+
+    try:
+        connection = connect(get_secret(secret_arn), host, database)
+    except psycopg2.OperationalError as e:
+        if 'password authentication failed' not in str(e):
+            raise
+        invalidate_secret(secret_arn)
+        connection = connect(get_secret(secret_arn), host, database)
+
+    _connections[key] = connection
+    return connection
+
+def close_connection(host: str, database: str):
+    """Close and forget a cached connection"""
+    connection = _connections.pop((host, database), None)
+    if connection is not None and not connection.closed:
+        connection.close()
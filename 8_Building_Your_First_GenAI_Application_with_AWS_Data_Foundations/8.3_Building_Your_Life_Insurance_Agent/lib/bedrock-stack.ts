@@ -454,6 +454,8 @@ export class BedrockStack extends cdk.Stack {
                           'mkdir -p /asset-output',
                           // Copy the load-sample-data Lambda function
                           'cp -r /asset-input/load-sample-data/* /asset-output/',
+                          // Copy the shared database and secret helpers
+                          'cp /asset-input/shared/db_utils.py /asset-output/',
                           // Create shared/sample-data directory
                           'mkdir -p /asset-output/shared/sample-data',
                           // Copy sample data files
@@ -567,12 +569,10 @@ export class BedrockStack extends cdk.Stack {
                       'bash', '-c', [
                           'mkdir -p /asset-output',
                           'cp -r /asset-input/* /asset-output/',
-                          'mkdir -p /asset-output/sql',
-                          'cp -r /asset-input/sql/* /asset-output/sql/',
                           'cd /asset-output',
                           'pip install -r requirements.txt -t .',
                           'ls -la /asset-output',
-                          'ls -la /asset-output/sql'
+                          'ls -laR /asset-output/migrations'
                       ].join(' && ')
                   ]
               }
@@ -585,8 +585,8 @@ export class BedrockStack extends cdk.Stack {
               CLUSTER_ENDPOINT: this.policyCluster.clusterEndpoint.hostname,
               SECRET_ARN: this.policyCluster.secret?.secretArn || '',
               DB_NAME: db_context.cluster.name,
-              SQL_DIR: 'sql',
-              SQL_FILE: 'policy_db_tables.sql',
+              MIGRATIONS_DIR: 'migrations',
+              MIGRATIONS_SET: 'policy',
               POLICY_SCHEMA: db_context.schema,
               POLICIES_TABLE: db_context.tables.policies,
               PREMIUMS_TABLE: db_context.tables.premiums,
@@ -629,13 +629,14 @@ export class BedrockStack extends cdk.Stack {
       runtime: lambda.Runtime.PYTHON_3_10,
       handler: 'index.handler',
       architecture: lambda.Architecture.ARM_64,
-      code: lambda.Code.fromAsset(path.join(__dirname, '../lambda/create-kb-extension'), {
+      code: lambda.Code.fromAsset(path.join(__dirname, '../lambda'), {
         bundling: {
           image: lambda.Runtime.PYTHON_3_10.bundlingImage,
           command: [
             'bash', '-c', [
               'mkdir -p /asset-output',
-              'cp /asset-input/* /asset-output/',
+              'cp /asset-input/create-kb-extension/*.py /asset-input/create-kb-extension/requirements.txt /asset-output/',
+              'cp /asset-input/shared/db_utils.py /asset-output/',
               'cd /asset-output',
               'pip install -r requirements.txt -t .'
             ].join(' && ')
@@ -693,12 +694,10 @@ export class BedrockStack extends cdk.Stack {
                       'bash', '-c', [
                           'mkdir -p /asset-output',
                           'cp -r /asset-input/* /asset-output/',
-                          'mkdir -p /asset-output/sql',
-                          'cp -r /asset-input/sql/* /asset-output/sql/',
                           'cd /asset-output',
                           'pip install -r requirements.txt -t .',
                           'ls -la /asset-output',
-                          'ls -la /asset-output/sql'
+                          'ls -laR /asset-output/migrations'
                       ].join(' && ')
                   ]
               }
@@ -711,8 +710,8 @@ export class BedrockStack extends cdk.Stack {
               CLUSTER_ENDPOINT: this.kbCluster.clusterEndpoint.hostname,
               SECRET_ARN: this.kbCluster.secret?.secretArn || '',
               DB_NAME: db_context.cluster.name,
-              SQL_DIR: 'sql',
-              SQL_FILE: 'kb_tables.sql',
+              MIGRATIONS_DIR: 'migrations',
+              MIGRATIONS_SET: 'kb',
               KB_SCHEMA_NAME: db_context.schema,
               KB_MAIN_TABLE_NAME: db_context.tables.bedrock_kb
           }
@@ -191,6 +191,9 @@ export class StreamlitAppStack extends cdk.Stack {
       BEDROCK_TOP_P: String(bedrock_context.agent.topP || 0.9),
       BEDROCK_NUM_RESULTS: String(bedrock_context.agent.numResults || 5),
       
+      // Session bootstrap reads policy details straight from the action group Lambda
+      GET_POLICY_DETAILS_FUNCTION: props.naming.functionName('get-policy-details'),
+      
       // App configuration
       APP_TITLE: app_context.title || "Product Search Assistant",
       APP_ICON: app_context.icon || "🔍",
@@ -6,11 +6,21 @@ import os
 import json
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
-import pandas as pd
 from dotenv import load_dotenv
-import re
 import logging
+import threading
 import traceback
+from converse_requests import ConverseClient
+from db_router import ConnectionRouter, PoolTimeout
+from model_router import ModelRouter, classify
+from query_guard import QueryCostGuard, apply_row_limit
+from query_shapes import PreparedStatementCache
+from rollups import RollupManager
+from result_cache import EXPORT_FORMATS, ResultCache, fetch_arrow, result_key
+from result_types import register_numeric_as_number, to_pandas
+from single_flight import SingleFlight, SingleFlightTimeout
+from speculative_sql import Check, SpeculativeSQL
+from sql_validator import validate
 
 # Set up logging - only warning and errors
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -66,33 +76,10 @@ def is_safe_query(query):
         if not query or not isinstance(query, str):
             return False, "Invalid query format"
 
-        # Convert to lowercase for easier pattern matching
-        query_lower = query.lower()
-
-        # List of forbidden patterns
-        forbidden_patterns = [
-            r'\bdrop\b',
-            r'\btruncate\b',
-            r'\bdelete\b',
-            r'\bupdate\b',
-            r'\binsert\b',
-            r'\bcreate\b',
-            r'\balter\b',
-            r'\bgrant\b',
-            r'\brevoke\b',
-            r'\bexec\b',
-            r'\bmerge\b'
-        ]
-
-        # Check for forbidden patterns
-        for pattern in forbidden_patterns:
-            if re.search(pattern, query_lower):
-                clean_pattern = pattern.replace(r'\b', '')
-                return False, f"Sorry, {clean_pattern} operations are not allowed for security reasons."
-
-        # Only allow SELECT statements
-        if not query_lower.strip().startswith('select'):
-            return False, "Only SELECT queries are allowed. Please rephrase your question to retrieve information."
+        # One lexical pass: keywords in string literals, quoted identifiers and comments are ignored
+        validation = validate(query)
+        if not validation.allowed:
+            return False, validation.message
 
         return True, ""
     except Exception as e:
@@ -118,37 +105,114 @@ def get_bedrock_client():
         logger.error(f"Unexpected error creating Bedrock client: {str(e)}")
         return None
 
+@st.cache_resource
+def get_converse_client():
+    """
+    Converse client shared by all sessions; it marks static prompt prefixes for caching and records token usage.
+
+    Raises RuntimeError when the Bedrock client cannot be created, so that the failure is not cached.
+    """
+    client = get_bedrock_client()
+    if not client:
+        raise RuntimeError("Could not initialize Bedrock client")
+    return ConverseClient(client, cache=os.getenv('PROMPT_CACHE', 'true').lower() != 'false')
+
+@st.cache_resource
+def get_single_flights():
+    """In-flight model calls and queries shared by identical concurrent requests from all sessions"""
+    return {
+        'generate_sql_query': SingleFlight('generate_sql_query',
+                                           timeout=float(os.getenv('SINGLE_FLIGHT_MODEL_TIMEOUT', '120'))),
+        'execute_query': SingleFlight('execute_query', timeout=float(os.getenv('SINGLE_FLIGHT_QUERY_TIMEOUT', '60')))
+    }
+
+@st.cache_resource
+def get_model_routers():
+    """
+    Model routing for SQL generation and summaries, shared by all sessions.
+
+    Simple questions use the fast model with a tight max_tokens and are escalated
+    to the large model when its output fails validation; routing adapts to each
+    model's recent latency and success rate.
+    """
+    models = [os.getenv('MODEL_FAST_ID', 'anthropic.claude-3-haiku-20240307-v1:0'),
+              os.getenv('MODEL_LARGE_ID', 'anthropic.claude-3-7-sonnet-20250219-v1:0')]
+    latency_budget = float(os.getenv('MODEL_LATENCY_BUDGET', '0')) or None
+    min_success_rate = float(os.getenv('MODEL_MIN_SUCCESS_RATE', '0.9'))
+    return {
+        'sql': ModelRouter(models, max_tokens={'simple': 500, 'moderate': 1000, 'complex': 4000},
+                           min_success_rate=min_success_rate, latency_budget=latency_budget),
+        'summary': ModelRouter(models, max_tokens={'simple': 400, 'moderate': 600, 'complex': 1000},
+                               min_success_rate=min_success_rate, latency_budget=latency_budget)
+    }
+
+def invoke_routed(converse, router, complexity, system, text, temperature, validate=None, cache=None):
+    """
+    Invoke the model routed for a question, escalating while validate rejects its text or it is cut off.
+
+    system is the static part of the prompt, sent first and cached; text is the
+    per-question part. Returns the text and whether it was cut off at max_tokens.
+    """
+    def invoke(route):
+        return converse.send(route.model_id, system, text, route.max_tokens, temperature, cache=cache)
+
+    def is_valid(reply):
+        if reply.stop_reason == 'max_tokens':
+            return False
+        return validate is None or validate(reply.text)
+
+    reply, route, _ = router.call(complexity, invoke, is_valid)
+    logger.info(f"Routed {route.level} question to {route.model_id} (escalated: {route.escalated}), "
+                f"model stats: {router.stats()}, token usage: {converse.stats()}")
+    return reply.text, reply.stop_reason == 'max_tokens'
+
 def generate_sql_query(question):
-    """Generate a SQL query from a natural language question using Bedrock"""
+    """Generate a SQL query from a natural language question, sharing the model call with identical questions in flight"""
+    flight = get_single_flights()['generate_sql_query']
+    key = ' '.join(question.lower().split())
+    try:
+        sql_query = flight.do(key, lambda: _generate_sql_query(question))
+        logger.info(f"SQL generation single-flight metrics: {flight.metrics()}")
+        return sql_query
+    except SingleFlightTimeout:
+        return "Error: Generating the query is taking longer than expected. Please try again."
+
+def _generate_sql_query(question, temperature=0.7, feedback=None, converse=None, table_data=None, rollup_schema=None,
+                        router=None):
+    """
+    Generate a SQL query from a natural language question using Bedrock.
+
+    feedback is a failed query and its error, to ask for a corrected query. The
+    client, metadata, rollup schema and model router can be passed in when called
+    from worker threads.
+    """
     try:
-        bedrock = get_bedrock_client()
-        if not bedrock:
-            return "Error: Could not initialize Bedrock client"
+        converse = converse or get_converse_client()
 
-        table_data = retrieve_db_metadata()
+        table_data = table_data or retrieve_db_metadata()
         if not table_data:
             return "Error: Could not retrieve database metadata"
-        body = json.dumps({
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"Given the following table metadata:\n{json.dumps(table_data, indent=2)}\n\nConvert the following question into a SQL query:\n\"{question}\"\n\nImportant rules:\n1. Only generateSELECT queries\n2. Do not use any DDL or DML operations (CREATE, INSERT, UPDATE, DELETE, etc.)\n3. Make sure the query is compatible with PostgreSQL syntax\n4. Return only the SQL query with no other charactersor strings"
-                }
-            ],
-            "max_tokens": 20000,
-            "temperature": 0.7,
-            "top_p": 0.999,
-            "anthropic_version": "bedrock-2023-05-31"
-        })
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",
-            #modelId="anthropic.claude-3-7-sonnet-20250219-v1:0",
-            body=body
-        )
-
-        response_body = json.loads(response['body'].read())
-        #return response_body['completion'].strip()
-        return response_body['content'][0]['text'].strip()
+        if rollup_schema is None:
+            rollups = get_available_rollups()
+            rollup_schema = rollups.describe_for_prompt() if rollups else ""
+        if rollup_schema:
+            rollup_schema = f"\n\n{rollup_schema}"
+        repair = ""
+        if feedback:
+            failed_query, error = feedback
+            repair = f"\n\nA previous query for this question failed:\n{failed_query}\nPostgreSQL error: {error}\nReturn a corrected query."
+        # The schema and rules are the same for every question and are cached; the question comes last
+        system = f"Given the following table metadata:\n{json.dumps(table_data, indent=2)}{rollup_schema}\n\nImportant rules:\n1. Only generateSELECT queries\n2. Do not use any DDL or DML operations (CREATE, INSERT, UPDATE, DELETE, etc.)\n3. Make sure the query is compatible with PostgreSQL syntax\n4. Return only the SQL query with no other charactersor strings"
+        text = f"Convert the following question into a SQL query:\n\"{question}\"{repair}"
+
+        # Simple questions go to the fast model; queries that fail validation or are cut off are escalated
+        router = router or get_model_routers()['sql']
+        complexity = classify(question, json.loads(table_data), sql=feedback[0] if feedback else None)
+        sql_query, truncated = invoke_routed(converse, router, complexity, system, text, temperature,
+                                             validate=lambda text: is_safe_query(text)[0])
+        if truncated:
+            return "Error: The generated query was too long. Please try a simpler question."
+        return sql_query
     except ClientError as e:
         error_msg = f"Bedrock API error: {str(e)}"
         logger.error(error_msg)
@@ -162,36 +226,28 @@ def generate_sql_query(question):
         logger.error(f"{error_msg}\n{traceback.format_exc()}")
         return f"Error: {error_msg}"
 
+def summary_prompt(question, df, sql_query):
+    """Static instructions, per-question text and complexity of the summary of a query result"""
+    # Convert DataFrame to string representation
+    df_str = df.to_string()
+    system = "Please provide a natural language summary of the results of the query below. Theresponse should be:\n1. Conversational and easy to understand\n2. Include specific numbers and insights from the data\n3. Highlight any interesting patterns or findings\n4. Be concise but informative. Maximum 100 words.\n\nFormat the response in a way that a healthcare professional would find useful."
+    text = f"Original question: \"{question}\"\nSQL Query used: {sql_query}\nQuery results:\n{df_str}"
+
+    table_data = retrieve_db_metadata()
+    complexity = classify(question, json.loads(table_data) if table_data else {}, sql=sql_query)
+    return system, text, complexity
+
 def generate_natural_response(question, df, sql_query):
     """Generate a natural language response from query results"""
     try:
-        bedrock = get_bedrock_client()
-        if not bedrock:
-            return "Error: Could not initialize Bedrock client"
-
-        # Convert DataFrame to string representation
-        df_str = df.to_string()
-        body = json.dumps({
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"Given the following:\n\nOriginal question: \"{question}\"\nSQL Query used: {sql_query}\nQuery results:\n{df_str}\n\nPlease provide a natural language summary of the results. Theresponse should be:\n1. Conversational and easy to understand\n2. Include specific numbers and insights from the data\n3. Highlight any interesting patterns or findings\n4. Be concise but informative. Maximum 100 words.\n\nFormat the response in a way that a healthcare professional would find useful."
-                }
-            ],
-            "max_tokens": 20000,
-            "temperature": 0.7,
-            "top_p": 0.999,
-            "anthropic_version": "bedrock-2023-05-31"
-        })
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",
-            #modelId="anthropic.claude-3-7-sonnet-20250219-v1:0",
-            body=body
-        )
-
-        response_body = json.loads(response['body'].read())
-        #return response_body['completion'].strip()
-        return response_body['content'][0]['text'].strip()
+        converse = get_converse_client()
+        system, text, complexity = summary_prompt(question, df, sql_query)
+        # The instructions are too short to reach the minimum cacheable prompt length
+        natural_response, truncated = invoke_routed(converse, get_model_routers()['summary'], complexity,
+                                                    system, text, 0.7, cache=False)
+        if truncated:
+            logger.warning("Summary was cut off at the routed max_tokens of the largest model")
+        return natural_response
     except ClientError as e:
         error_msg = f"Bedrock API error: {str(e)}"
         logger.error(error_msg)
@@ -205,10 +261,232 @@ def generate_natural_response(question, df, sql_query):
         logger.error(f"{error_msg}\n{traceback.format_exc()}")
         return f"Error generating insights: {error_msg}"
 
+def stream_natural_response(placeholder, system, text, complexity, keep):
+    """
+    Stream a summary into the analysis area as it is generated and return its full text.
+
+    When the user submits a new question, Streamlit stops this run at its next
+    update of the page; the stream is then closed and recorded as cancelled.
+    keep(text, cancelled) is called with the text received whenever the stream
+    ends, including when it is stopped, so that it can be saved.
+    """
+    try:
+        converse = get_converse_client()
+        router = get_model_routers()['summary']
+        # A streamed summary is already on screen, so it is routed but not escalated
+        route = router.route(complexity)
+        start = time.monotonic()
+        try:
+            stream = converse.stream(route.model_id, system, text, route.max_tokens, 0.7, cache=False)
+            try:
+                for _ in stream:
+                    placeholder.markdown(stream.text + "▌")
+            finally:
+                stream.close()
+                keep(stream.text, stream.cancelled)
+        except Exception:
+            # Failed calls count against the model, as in ModelRouter.call; a stopped run is not a failure
+            router.record(route, time.monotonic() - start, False)
+            raise
+        router.record(route, time.monotonic() - start, stream.stop_reason != 'max_tokens')
+        placeholder.markdown(stream.text)
+        logger.info(f"Summary time to first token: {stream.ttft}, token usage: {converse.stats()}")
+        return stream.text
+    except ClientError as e:
+        error_msg = f"Bedrock API error: {str(e)}"
+        logger.error(error_msg)
+    except Exception as e:
+        error_msg = f"Error generating natural language response: {str(e)}"
+        logger.error(f"{error_msg}\n{traceback.format_exc()}")
+    placeholder.error(f"Error generating insights: {error_msg}")
+    return f"Error generating insights: {error_msg}"
+
+@st.cache_resource
+def get_db_router():
+    """Connection router shared by all sessions; read-only queries go to the Aurora readers"""
+    return ConnectionRouter.from_config(
+        DB_CONFIG,
+        writer=os.getenv('DB_WRITER_HOST'),
+        readers=os.getenv('DB_READER_HOSTS'),
+        max_lag_ms=float(os.getenv('DB_MAX_REPLICA_LAG_MS', '1000')),
+        max_connections=int(os.getenv('DB_POOL_MAX_CONNECTIONS', '5')),
+        acquire_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    )
+
+@st.cache_resource
+def get_query_guard():
+    """EXPLAIN-based cost guard whose plan verdicts are shared by all sessions"""
+    return QueryCostGuard(
+        max_cost=float(os.getenv('QUERY_MAX_COST', '1000000')),
+        max_rows=int(os.getenv('QUERY_MAX_ROWS', '10000')),
+        explain_timeout_ms=int(os.getenv('QUERY_EXPLAIN_TIMEOUT_MS', '500'))
+    )
+
+@st.cache_resource
+def get_prepared_statements():
+    """Prepared statements per pooled connection, keyed by query shape"""
+    return PreparedStatementCache(max_statements=int(os.getenv('QUERY_MAX_PREPARED_STATEMENTS', '100')))
+
+@st.cache_resource
+def get_rollups():
+    """
+    Materialized aggregates of the healthcare table, shared by all sessions.
+
+    Only the views that already exist are loaded here. Missing ones are created,
+    and all of them refreshed on a schedule, in a background thread, so no request
+    waits for ANALYZE or a materialized view build. Raises when the metadata or
+    the database is unavailable, so that the failure is not cached.
+    """
+    table_data = retrieve_db_metadata()
+    if not table_data:
+        raise RuntimeError("Could not retrieve database metadata")
+    rollups = RollupManager(json.loads(table_data), max_cardinality=int(os.getenv('ROLLUP_MAX_CARDINALITY', '100')))
+    router = get_db_router()
+    with router.connection(read_only=True) as connection:
+        rollups.load(connection)
+
+    def create_and_refresh():
+        try:
+            with router.connection(read_only=False) as connection:
+                rollups.ensure(connection)
+        except Exception as e:
+            logger.error(f"Could not create rollups, using the existing ones: {str(e)}")
+        interval = float(os.getenv('ROLLUP_REFRESH_INTERVAL', '3600'))
+        if interval > 0:
+            rollups.start_refresh_schedule(lambda: router.connection(read_only=False), interval)
+
+    threading.Thread(target=create_and_refresh, name='rollup-setup', daemon=True).start()
+    return rollups
+
+def get_available_rollups():
+    """The rollups, or None while they cannot be loaded; queries then read the base table"""
+    try:
+        return get_rollups()
+    except Exception as e:
+        logger.error(f"Rollups are unavailable, querying the base table: {str(e)}")
+        return None
+
+def get_result_cache():
+    """Arrow results of this session's queries, paged and exported without running them again"""
+    if 'result_cache' not in st.session_state:
+        st.session_state['result_cache'] = ResultCache(
+            max_results=int(os.getenv('RESULT_CACHE_MAX_RESULTS', '5')),
+            max_bytes=int(os.getenv('RESULT_CACHE_MAX_MB', '256')) * 1024 * 1024
+        )
+    return st.session_state['result_cache']
+
+def show_result_pages(key, page_size=100):
+    """Render one page of a cached result, with exports written from the cache"""
+    result_cache = get_result_cache()
+    table = result_cache.get(key)
+    if table is None:
+        st.info("These results are no longer cached. Please run the question again.")
+        return
+
+    page_count = max(1, -(-table.num_rows // page_size))
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, key=f"page_{key}")
+    st.dataframe(result_cache.page(key, page - 1, page_size))
+    st.caption(f"{table.num_rows:,} rows")
+
+    columns = st.columns(len(EXPORT_FORMATS))
+    for column, (export_format, (mime, extension)) in zip(columns, EXPORT_FORMATS.items()):
+        column.download_button(f"Download {extension.upper()}", result_cache.export(key, export_format),
+                               file_name=f"results.{extension}", mime=mime, key=f"{export_format}_{key}")
+
+def fetch_result(query):
+    """
+    Run a safe query on the database and fetch its result as an Arrow table.
+
+    Returns the table and its attributes, or None and the cost guard's message
+    when the query is rejected.
+    """
+    # Answer simple aggregates from a rollup instead of scanning the base table
+    rollups = get_available_rollups()
+    rollup_query = rollups.rewrite(query) if rollups else None
+    if rollup_query:
+        logger.info(f"Rewrote query to use a rollup: {rollup_query}")
+        query = rollup_query
+
+    with get_db_router().connection(query) as connection:
+        # Reject or limit the query from its estimated plan before running it
+        verdict = get_query_guard().check(connection, query)
+        if not verdict.allowed:
+            return None, {'message': verdict.message}
+        if verdict.row_limit:
+            logger.warning(f"Limiting query estimated at {verdict.estimated_rows:.0f} rows to {verdict.row_limit}")
+            query = apply_row_limit(query, verdict.row_limit)
+
+        # Queries differing only in literals reuse one prepared statement; NUMERIC
+        # values are parsed to floats, the type they are materialized as
+        register_numeric_as_number(connection)
+        with get_prepared_statements().execute(connection, query) as cursor:
+            table = fetch_arrow(cursor)
+    logger.info(f"Query executed successfully, prepared statements: {get_prepared_statements().stats()}")
+    return table, {'row_limit': verdict.row_limit, 'rollup': rollup_query is not None}
+
+class QueryRejected(Exception):
+    """Raised when the cost guard rejects a query; the message is shown to the user"""
+    pass
+
+def run_query(query):
+    """
+    Run a safe query and return its result as a DataFrame.
+
+    Raises QueryRejected when the cost guard rejects the query, and the
+    psycopg2 error when the query fails.
+    """
+    # A result this session already fetched is served from its cache
+    result_cache = get_result_cache()
+    key = result_key(query)
+    table = result_cache.get(key)
+    if table is None:
+        # Identical queries in flight, from any session, share one execution
+        flight = get_single_flights()['execute_query']
+        table, attrs = flight.do(key, lambda: fetch_result(query))
+        logger.info(f"Query single-flight metrics: {flight.metrics()}")
+        if table is None:
+            raise QueryRejected(attrs['message'])
+        result_cache.put(key, table, **attrs)
+
+    df = to_pandas(table)
+    df.attrs.update(result_cache.attrs(key), result_key=key)
+    return df
+
+def describe_query_error(e):
+    """User-facing message for an exception raised while running a query"""
+    if isinstance(e, QueryRejected):
+        return str(e)
+    if isinstance(e, SingleFlightTimeout):
+        return "The same question is still running. Please try again in a moment."
+    if isinstance(e, PoolTimeout):
+        logger.warning(f"Database connection pool is busy: {str(e)}")
+        return "The database is busy. Please try again in a moment."
+    if isinstance(e, psycopg2.OperationalError):
+        logger.error(f"Database connection error: {str(e)}")
+        return "Unable to connect to the database. Please try again later."
+    if isinstance(e, psycopg2.ProgrammingError):
+        error_message = str(e)
+        logger.error(f"SQL Programming error: {error_message}")
+
+        # Make error messages more user-friendly
+        if "syntax error" in error_message.lower():
+            return "There seems to be an issue with the query structure. Please try rephrasing your question."
+        elif "does not exist" in error_message.lower():
+            return "I couldn't find the data you're looking for. Please make sure you're asking about information from the healthcare dataset."
+        elif "column" in error_message.lower() and "does not exist" in error_message.lower():
+            return "I couldn't find one of the columns you're asking about. Please check the available fields and try again."
+        else:
+            return "There was an issue running your query. Please try rephrasing your question."
+    if isinstance(e, psycopg2.Error):
+        logger.error(f"PostgreSQL error: {str(e)}")
+        return "There was a database error. Please try rephrasing your question or contact support."
+    logger.error(f"Unexpected error in execute_query: {str(e)}\n{traceback.format_exc()}")
+    return "An unexpected error occurred while executing the query."
+
 def execute_query(query):
     """Execute SQL query with error handling"""
-    connection = None
-    cursor = None
     try:
         # First check if the query is safe
         is_safe, message = is_safe_query(query)
@@ -221,45 +499,85 @@ def execute_query(query):
             logger.error("Missing required database configuration parameters")
             return False, "Database configuration error. Please contact support."
 
-        connection = psycopg2.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        results = cursor.fetchall()
-        logger.info("Query executed successfully")
-        return True, pd.DataFrame(results, columns=columns)
-    except psycopg2.OperationalError as e:
-        error_message = f"Database connection error: {str(e)}"
-        logger.error(error_message)
-        return False, "Unable to connect to the database. Please try again later."
-    except psycopg2.ProgrammingError as e:
-        error_message = str(e)
-        logger.error(f"SQL Programming error: {error_message}")
-
-        # Make error messages more user-friendly
-        if "syntax error" in error_message.lower():
-            return False, "There seems to be an issue with the query structure. Please try rephrasing your question."
-        elif "does not exist" in error_message.lower():
-            return False, "I couldn't find the data you're looking for. Please make sure you're asking about information from the healthcare dataset."
-        elif "column" in error_message.lower() and "does not exist" in error_message.lower():
-            return False, "I couldn't find one of the columns you're asking about. Please check the available fields and try again."
-        else:
-            return False, "There was an issue running your query. Please try rephrasing your question."
-    except psycopg2.Error as e:
-        logger.error(f"PostgreSQL error: {str(e)}")
-        return False, "There was a database error. Please try rephrasing your question or contact support."
+        return True, run_query(query)
     except Exception as e:
-        logger.error(f"Unexpected error in execute_query: {str(e)}\n{traceback.format_exc()}")
-        return False, "An unexpected error occurred while executing the query."
-    finally:
-        try:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
-        except Exception as e:
-            logger.error(f"Error closing database resources: {str(e)}")
+        return False, describe_query_error(e)
+
+@st.cache_resource
+def get_speculative_sql():
+    """
+    Speculative SQL generation shared by all sessions, or None when SQL_CANDIDATES is 1.
+
+    Candidates are generated and checked in worker threads, so the Converse client,
+    metadata, rollups, routers and guard are resolved here rather than inside them.
+    The chosen query runs in the session's own thread through run_query. Raises
+    when one of them is unavailable, so that the failure is not cached.
+    """
+    candidates = int(os.getenv('SQL_CANDIDATES', '1'))
+    if candidates <= 1:
+        return None
+
+    converse = get_converse_client()
+    table_data = retrieve_db_metadata()
+    if not table_data:
+        raise RuntimeError("Could not retrieve database metadata")
+    rollups = get_rollups()
+    router = get_db_router()
+    guard = get_query_guard()
+    model_router = get_model_routers()['sql']
+
+    def generate(question, temperature, feedback):
+        # Described on each call, as rollups created in the background appear later
+        sql_query = _generate_sql_query(question, temperature, feedback, converse, table_data,
+                                        rollups.describe_for_prompt(), model_router)
+        if sql_query.startswith("Error:"):
+            raise RuntimeError(sql_query)
+        return sql_query
+
+    def check(sql_query):
+        is_safe, message = is_safe_query(sql_query)
+        if not is_safe:
+            return Check(False, message)
+        query = rollups.rewrite(sql_query) or sql_query
+        with router.connection(query) as connection:
+            verdict = guard.check(connection, query)
+        return Check(verdict.allowed, verdict.message, verdict.estimated_cost)
+
+    # Spread the temperatures from 0 up to SQL_MAX_TEMPERATURE, one per candidate
+    max_temperature = float(os.getenv('SQL_MAX_TEMPERATURE', '0.8'))
+    return SpeculativeSQL(
+        generate, check, run_query,
+        temperatures=[round(max_temperature * i / (candidates - 1), 2) for i in range(candidates)],
+        grace_period=float(os.getenv('SQL_CANDIDATE_GRACE_PERIOD', '0.5')),
+        max_repairs=int(os.getenv('SQL_MAX_REPAIRS', '2')),
+        repairable_errors=(psycopg2.ProgrammingError, psycopg2.DataError),
+        timeout=float(os.getenv('SINGLE_FLIGHT_MODEL_TIMEOUT', '120'))
+    )
+
+def store_answer(question, sql_query, results):
+    """
+    Keep the answer to a question in the session, so paging and downloads survive reruns.
+
+    With SUMMARY_STREAMING the summary is left to be streamed when the answer is
+    shown; otherwise it is generated here.
+    """
+    streaming = os.getenv('SUMMARY_STREAMING', 'true').lower() != 'false'
+    st.session_state['answer'] = {
+        'sql_query': sql_query,
+        'natural_response': None if streaming else generate_natural_response(question, results, sql_query),
+        'summary_prompt': summary_prompt(question, results, sql_query) if streaming else None,
+        'result_key': results.attrs['result_key'],
+        'truncated': bool(results.attrs.get('row_limit')) and len(results) >= results.attrs['row_limit'],
+        'row_limit': results.attrs.get('row_limit'),
+        'rollup': results.attrs.get('rollup')
+    }
+
+def show_query_error(sql_query, message):
+    """Show a query that could not be answered and why"""
+    with st.expander("View SQL Query"):
+        st.code(sql_query, language="sql")
+    st.error("⚠️ " + message)
+    st.info("💡 Try rephrasing your question or asking about different aspects of the healthcare data.")
 
 def get_secret():
     """Retrieve database credentials from AWS Secrets Manager"""
@@ -339,49 +657,51 @@ try:
 
     # Add a submit button
     if st.button("Generate and Execute Query", type="primary"):
+        # The answer is kept in the session so paging and downloads survive reruns
+        st.session_state.pop('answer', None)
         if user_question:
             try:
-                with st.spinner("Generating SQL query..."):
-                    sql_query = generate_sql_query(user_question)
-
-                    # Check if there was an error generating the query
-                    if sql_query.startswith("Error:"):
-                        st.error(sql_query)
+                try:
+                    speculative = get_speculative_sql()
+                except Exception as e:
+                    logger.error(f"Speculative SQL generation is unavailable, generating one query per question: {str(e)}")
+                    speculative = None
+                if speculative:
+                    # Several candidates race; the first valid, cheapest one runs and failures are repaired
+                    with st.spinner("Generating and checking SQL queries..."):
+                        outcome = speculative.run(user_question)
+                    logger.info(f"Speculative SQL stats: {speculative.stats()}")
+                    if outcome.success:
+                        with st.spinner("Generating insights..."):
+                            store_answer(user_question, outcome.sql, outcome.result)
+                    elif not outcome.sql:
+                        st.error(outcome.result)
                     else:
-                        # Check if query is safe before showing it
-                        is_safe, safety_message = is_safe_query(sql_query)
-                        if not is_safe:
-                            st.error("⚠️ " + safety_message)
-                            st.warning("Please rephrase your question to focus on retrieving information rather than modifying data.")
+                        message = describe_query_error(outcome.error) if outcome.error is not None else outcome.result
+                        show_query_error(outcome.sql, message)
+                else:
+                    with st.spinner("Generating SQL query..."):
+                        sql_query = generate_sql_query(user_question)
+
+                        # Check if there was an error generating the query
+                        if sql_query.startswith("Error:"):
+                            st.error(sql_query)
                         else:
-                            with st.expander("View SQL Query"):
-                                st.code(sql_query, language="sql")
-
-                            with st.spinner("Executing query..."):
-                                success, results = execute_query(sql_query)
-
-                                if success:
-                                    # Generate natural language response
-                                    with st.spinner("Generating insights..."):
-                                        natural_response = generate_natural_response(user_question, results, sql_query)
-
-                                        # Check if there was an error generating insights
-                                        if natural_response.startswith("Error generating insights:"):
-                                            st.error(natural_response)
-                                            # Still show the raw data
-                                            st.write("### 📊 Raw Data")
-                                            st.dataframe(results)
-                                        else:
-                                            # Display the natural language response in a nice format
-                                            st.write("### 📊 Analysis")
-                                            st.write(natural_response)
-
-                                            # Show the raw data in an expander
-                                            with st.expander("View Raw Data"):
-                                                st.dataframe(results)
-                                else:
-                                    st.error("⚠️ " + results)
-                                    st.info("💡 Try rephrasing your question or asking about different aspects of the healthcare data.")
+                            # Check if query is safe before showing it
+                            is_safe, safety_message = is_safe_query(sql_query)
+                            if not is_safe:
+                                st.error("⚠️ " + safety_message)
+                                st.warning("Please rephrase your question to focus on retrieving information rather than modifying data.")
+                            else:
+                                with st.spinner("Executing query..."):
+                                    success, results = execute_query(sql_query)
+
+                                    if success:
+                                        # Generate natural language response
+                                        with st.spinner("Generating insights..."):
+                                            store_answer(user_question, sql_query, results)
+                                    else:
+                                        show_query_error(sql_query, results)
             except Exception as e:
                 logger.error(f"Unhandled exception in main flow: {str(e)}\n{traceback.format_exc()}")
                 st.error(f"An unexpected error occurred: {str(e)}")
@@ -389,6 +709,47 @@ try:
         else:
             st.warning("Please enter a question first.")
 
+    answer = st.session_state.get('answer')
+    if answer:
+        with st.expander("View SQL Query"):
+            st.code(answer['sql_query'], language="sql")
+        if answer['truncated']:
+            st.info(f"Showing the first {answer['row_limit']:,} rows of a larger result.")
+        if answer['rollup']:
+            st.caption("Answered from pre-aggregated data, refreshed periodically.")
+
+        # Check if there was an error generating insights
+        streaming = answer['natural_response'] is None
+        if not streaming and answer['natural_response'].startswith("Error generating insights:"):
+            st.error(answer['natural_response'])
+            # Still show the raw data
+            st.write("### 📊 Raw Data")
+            show_result_pages(answer['result_key'])
+        else:
+            # Display the natural language response in a nice format
+            st.write("### 📊 Analysis")
+            summary_area = st.empty()
+            regenerate = False
+            if answer.get('summary_cancelled'):
+                # Stopped by a rerun before it was complete; it is only generated again on request
+                summary_area.write(answer['natural_response'])
+                regenerate = st.button("Regenerate analysis")
+                if not regenerate:
+                    st.caption("The analysis was stopped before it was complete.")
+            if streaming or regenerate:
+                # Written as it arrives and kept so reruns show it without a new call. It counts as
+                # stopped until the stream ends, so a rerun that interrupts it does not start another.
+                answer.update(natural_response="", summary_cancelled=True)
+                def keep(text, cancelled):
+                    answer.update(natural_response=text, summary_cancelled=cancelled)
+                answer['natural_response'] = stream_natural_response(summary_area, *answer['summary_prompt'], keep)
+            elif not answer.get('summary_cancelled'):
+                summary_area.write(answer['natural_response'])
+
+            # Show the raw data in an expander
+            with st.expander("View Raw Data"):
+                show_result_pages(answer['result_key'])
+
     # Footer
     st.write("---")
     st.markdown("*Powered by Amazon Aurora PostgreSQL and Amazon Bedrock*")
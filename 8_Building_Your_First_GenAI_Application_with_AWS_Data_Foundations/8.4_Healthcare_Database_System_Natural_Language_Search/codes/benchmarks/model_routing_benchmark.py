@@ -0,0 +1,116 @@
+"""
+Harness for model routing against stub models, compared with always using one model.
+
+Questions of mixed complexity are generated against the healthcare schema. The
+fast stub model answers quickly but fails validation more often as questions get
+more complex; the large stub model is slower and more reliable. Halfway through,
+the fast model degrades on moderate questions, to show routing adapt. Reports
+per strategy the share of valid answers, the end-to-end latency (including
+escalations) and the calls per model, then the router's own statistics.
+
+Usage:
+    python benchmarks/model_routing_benchmark.py [--questions 2000] [--time-scale 0.001]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from model_router import ModelRouter, classify
+
+SCHEMA = {'healthcare_data': ['Name', 'Age', 'Gender', 'Blood Type', 'Medical Condition', 'Date of Admission',
+                              'Doctor', 'Hospital', 'Insurance Provider', 'Billing Amount', 'Room Number',
+                              'Admission Type', 'Discharge Date', 'Medication', 'Test Results']}
+
+QUESTIONS = [
+    "How many patients are there?",
+    "What is the average age of patients?",
+    "How many patients have diabetes?",
+    "What is the average billing amount by medical condition for patients over 60?",
+    "Which hospital has the most emergency admissions this year by admission type?",
+    "Compare the billing amount, age and gender of patients by medical condition and admission type, "
+    "and show the medication with the most abnormal test results for each insurance provider",
+]
+
+class StubModel:
+    """
+    Model stub with log-normal latency and a failure rate per complexity level.
+
+    A response is cut off, and so fails, when it needs more tokens than the call allows.
+    """
+
+    def __init__(self, model_id, latency, failure_rates, tokens, rng, time_scale):
+        self.model_id = model_id
+        self.latency = latency
+        self.failure_rates = dict(failure_rates)
+        self.tokens = tokens
+        self.rng = rng
+        self.time_scale = time_scale
+        self.calls = 0
+
+    def invoke(self, route):
+        self.calls += 1
+        time.sleep(self.rng.lognormvariate(0, 0.3) * self.latency * self.time_scale)
+        needed = self.tokens[route.level]
+        valid = needed <= route.max_tokens and self.rng.random() >= self.failure_rates[route.level]
+        return {'valid': valid, 'stop_reason': 'end_turn' if needed <= route.max_tokens else 'max_tokens'}
+
+def make_models(seed, time_scale):
+    rng = random.Random(seed)
+    tokens = {'simple': 120, 'moderate': 400, 'complex': 1500}
+    return {
+        'fast': StubModel('fast', 1.0, {'simple': 0.03, 'moderate': 0.08, 'complex': 0.35}, tokens, rng, time_scale),
+        'large': StubModel('large', 4.0, {'simple': 0.01, 'moderate': 0.02, 'complex': 0.05}, tokens, rng, time_scale),
+    }
+
+def run(label, router, models, questions, time_scale):
+    latencies, answered = [], 0
+    for i, question in enumerate(questions):
+        if i == len(questions) // 2:
+            models['fast'].failure_rates['moderate'] = 0.3  # e.g. a prompt or model change regresses
+        start = time.monotonic()
+        response, route, valid = router.call(classify(question, SCHEMA),
+                                             lambda route: models[route.model_id].invoke(route),
+                                             lambda response: response['valid'])
+        latencies.append((time.monotonic() - start) / time_scale)
+        answered += valid
+
+    latencies.sort()
+    calls = ', '.join(f"{name} {model.calls / len(questions):.2f}" for name, model in models.items())
+    print(f"{label:<12} valid {answered / len(questions):6.1%}  p50 {statistics.median(latencies):5.2f}s  "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:5.2f}s  calls/question: {calls}")
+    return router
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--time-scale', type=float, default=0.001, help='sleep this fraction of simulated time')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = [rng.choice(QUESTIONS) for _ in range(args.questions)]
+    print('question levels: ' + ', '.join(f"{classify(q, SCHEMA).level}" for q in QUESTIONS) + '\n')
+
+    max_tokens = {'simple': 500, 'moderate': 1000, 'complex': 4000}
+    strategies = [
+        ('fast only', ModelRouter(['fast'], max_tokens=max_tokens)),
+        ('large only', ModelRouter(['large'], max_tokens=max_tokens)),
+        ('routed', ModelRouter(['fast', 'large'], max_tokens=max_tokens)),
+    ]
+    for label, router in strategies:
+        run(label, router, make_models(args.seed, args.time_scale), questions, args.time_scale)
+
+    stats = strategies[-1][1].stats()
+    print(f"\nrouted: {stats['escalations']} escalations")
+    for model, model_stats in stats['models'].items():
+        print(f"    {model:<6} recent calls {model_stats['samples']:4d}  p50 {model_stats['p50'] / args.time_scale:5.2f}s  "
+              f"p95 {model_stats['p95'] / args.time_scale:5.2f}s  success {model_stats['success_rate']:6.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Harness for the Converse requests of SQL generation against a stub bedrock-runtime client.
+
+The stub counts tokens as characters / 4 and keeps a prompt cache like the
+provider's: a prefix ending at a cache point is written on first use, read on
+later uses within the TTL, and not cached below the minimum length. It answers
+through converse(), or through invoke_model() only, as boto3 does on Python 3.7.
+One model rejects cache points, to exercise the fallback.
+
+Sends the same questions with the cache point and without it and reports the
+cached and uncached input tokens recorded by ConverseClient, the input cost
+relative to sending every prompt uncached (cache reads cost 0.1x, writes 1.25x)
+and the simulated prompt processing time.
+
+Usage:
+    python benchmarks/prompt_cache_benchmark.py [--questions 500] [--columns 200]
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from converse_requests import ConverseClient
+
+RULES = ("Important rules:\n1. Only generateSELECT queries\n2. Do not use any DDL or DML operations (CREATE, "
+         "INSERT, UPDATE, DELETE, etc.)\n3. Make sure the query is compatible with PostgreSQL syntax\n4. Return "
+         "only the SQL query with no other charactersor strings")
+
+QUESTIONS = ["How many patients have diabetes?", "What is the average billing amount by medical condition?",
+             "Which hospital admitted the most emergency patients?", "How many patients are over 60?"]
+
+def tokens(text):
+    return max(1, len(text) // 4)
+
+class StubPromptCache:
+    """
+    Prompt cache and token accounting shared by the stub clients.
+
+    Args:
+        clock (list): One-element list holding the simulated time in seconds
+        min_cache_tokens (int): Shortest prefix that is cached
+        ttl (float): Seconds a cached prefix lives after its last use
+        rejects_cache (set): Model ids answering a cache point with a ValidationException
+    """
+
+    def __init__(self, clock, min_cache_tokens=1024, ttl=300, rejects_cache=()):
+        self.clock = clock
+        self.min_cache_tokens = min_cache_tokens
+        self.ttl = ttl
+        self.rejects_cache = set(rejects_cache)
+        self.cache = {}
+        self.prompt_seconds = 0.0
+
+    def _respond(self, model_id, prefix, cached, rest):
+        """Usage of one request: the cached prefix is read or written, the rest is uncached"""
+        read = write = 0
+        prefix_tokens = tokens(prefix) if cached else 0
+        if cached and prefix_tokens >= self.min_cache_tokens:
+            key = (model_id, prefix)
+            if self.cache.get(key, -1) >= self.clock[0]:
+                read = prefix_tokens
+            else:
+                write = prefix_tokens
+            self.cache[key] = self.clock[0] + self.ttl
+        uncached = tokens(prefix) + tokens(rest) - read - write
+        # Reading a cached prefix skips most of its processing
+        self.prompt_seconds += (uncached + write) * 0.0004 + read * 0.00004
+        return "SELECT count(*) FROM healthcare_data", uncached, read, write
+
+class StubBedrockRuntime(StubPromptCache):
+    """converse() of a bedrock-runtime client"""
+
+    def converse(self, modelId, system, messages, inferenceConfig):
+        cached = any('cachePoint' in block for block in system)
+        if cached and modelId in self.rejects_cache:
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'This model does not support prompt caching'}}, 'Converse')
+        prefix = ''.join(block.get('text', '') for block in system)
+        rest = ''.join(block['text'] for message in messages for block in message['content'])
+        text, uncached, read, write = self._respond(modelId, prefix, cached, rest)
+        return {'output': {'message': {'role': 'assistant', 'content': [{'text': text}]}},
+                'stopReason': 'end_turn',
+                'usage': {'inputTokens': uncached, 'outputTokens': tokens(text),
+                          'cacheReadInputTokens': read, 'cacheWriteInputTokens': write}}
+
+class StubInvokeModelRuntime(StubPromptCache):
+    """invoke_model() only, as the bedrock-runtime client of boto3 versions without converse()"""
+
+    def invoke_model(self, modelId, body):
+        request = json.loads(body)
+        cached = any('cache_control' in block for block in request['system'])
+        prefix = ''.join(block['text'] for block in request['system'])
+        rest = ''.join(block['text'] for message in request['messages'] for block in message['content'])
+        text, uncached, read, write = self._respond(modelId, prefix, cached, rest)
+        response = {'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn',
+                    'usage': {'input_tokens': uncached, 'output_tokens': tokens(text),
+                              'cache_read_input_tokens': read, 'cache_creation_input_tokens': write}}
+        return {'body': BytesIO(json.dumps(response).encode())}
+
+def system_prompt(columns):
+    metadata = {'healthcare_data': {f"column_{i}": 'string' if i % 3 else 'bigint' for i in range(columns)}}
+    return f"Given the following table metadata:\n{json.dumps(json.dumps(metadata), indent=2)}\n\n{RULES}"
+
+def run(label, runtime, clock, questions, model_ids, system, cache, rng):
+    converse = ConverseClient(runtime, cache=cache)
+    for question in questions:
+        clock[0] += rng.expovariate(1 / 20)  # a question every 20 seconds on average
+        converse.send(rng.choice(model_ids), system,
+                      f"Convert the following question into a SQL query:\n\"{question}\"", 500, 0.7)
+
+    totals = {field: 0 for field in ('input_tokens', 'cache_read_tokens', 'cache_write_tokens')}
+    for stats in converse.stats().values():
+        for field in totals:
+            totals[field] += stats[field]
+    prompt = sum(totals.values())
+    cost = totals['input_tokens'] + 0.1 * totals['cache_read_tokens'] + 1.25 * totals['cache_write_tokens']
+    print(f"{label:<28} uncached {totals['input_tokens']:8,}  cache read {totals['cache_read_tokens']:8,}  "
+          f"write {totals['cache_write_tokens']:6,}  input cost {cost / prompt:5.1%}  "
+          f"prompt time {runtime.prompt_seconds / len(questions) * 1000:5.0f} ms/request")
+    return converse
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=200, help='columns in the schema preamble')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    system = system_prompt(args.columns)
+    rng = random.Random(args.seed)
+    questions = [rng.choice(QUESTIONS) for _ in range(args.questions)]
+    models = ['fast', 'large']
+    print(f"system prompt: {tokens(system):,} tokens\n")
+
+    for label, runtime_class, cache in [('converse, no cache point', StubBedrockRuntime, False),
+                                        ('converse, cache point', StubBedrockRuntime, True),
+                                        ('invoke_model, cache_control', StubInvokeModelRuntime, True)]:
+        clock = [0.0]
+        run(label, runtime_class(clock), clock, questions, models, system, cache, random.Random(args.seed))
+
+    clock = [0.0]
+    converse = run('one model rejects caching', StubBedrockRuntime(clock, rejects_cache={'fast'}), clock,
+                   questions, models, system, True, random.Random(args.seed))
+    print('\n' + '\n'.join(f"{model}: {stats}" for model, stats in converse.stats().items()))
+
+if __name__ == '__main__':
+    main()
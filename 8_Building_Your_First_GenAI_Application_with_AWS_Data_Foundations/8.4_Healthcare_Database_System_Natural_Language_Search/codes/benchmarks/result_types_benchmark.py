@@ -0,0 +1,111 @@
+"""
+Benchmark of typed result materialization against pd.DataFrame over fetched tuples.
+
+Simulates a psycopg2 cursor returning a healthcare result (numerics,
+low-cardinality text, dates) and builds a DataFrame from it: the previous
+pd.DataFrame(cursor.fetchall(), columns=columns), and typed Arrow columns from
+the type OIDs in cursor.description converted to pandas, once with the Decimal
+values psycopg2 returns by default and once with the numbers it returns when
+NUMERIC_AS_NUMBER is registered. Reports the build time, the resulting dtypes
+and the DataFrame memory. The time psycopg2 itself spends creating the values
+is not included.
+
+Usage:
+    python benchmarks/result_types_benchmark.py [--rows 1000000] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+from decimal import Decimal
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from result_cache import fetch_arrow
+from result_types import to_pandas
+
+# (name, type_code, display_size, internal_size, precision, scale, null_ok) as psycopg2 describes them
+DESCRIPTION = [
+    ('patient_id', 23, None, 4, None, None, None),
+    ('name', 1043, None, 255, None, None, None),
+    ('gender', 1043, None, 255, None, None, None),
+    ('medical_condition', 1043, None, 255, None, None, None),
+    ('admission_date', 1082, None, 4, None, None, None),
+    ('age', 20, None, 8, None, None, None),
+    ('billing_amount', 1700, None, -1, 10, 2, None),
+    ('avg_length_of_stay', 1700, None, -1, None, None, None),
+]
+
+CONDITIONS = ['Diabetes', 'Asthma', 'Obesity', 'Arthritis', 'Hypertension', 'Cancer']
+
+class FakeCursor:
+    """The parts of a psycopg2 cursor used when materializing results"""
+
+    description = DESCRIPTION
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.position = 0
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+def generate_rows(count, rng):
+    start = datetime.date(2019, 1, 1)
+    return [
+        (i, f"Patient {i}", rng.choice(('Male', 'Female')), rng.choice(CONDITIONS),
+         start + datetime.timedelta(days=rng.randrange(1500)), rng.randint(18, 90),
+         Decimal(rng.randrange(100000, 5000000)) / 100, Decimal(rng.randrange(10, 300)) / 7)
+        for i in range(count)
+    ]
+
+def build_tuples(rows):
+    cursor = FakeCursor(rows)
+    columns = [desc[0] for desc in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def build_typed(rows):
+    return to_pandas(fetch_arrow(FakeCursor(rows)))
+
+def measure(build, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = build(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings), df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows, random.Random(42))
+    float_rows = [row[:6] + (float(row[6]), float(row[7])) for row in rows]
+    print(f"{args.rows:,} rows, {len(DESCRIPTION)} columns\n")
+
+    results = [('DataFrame from tuples', *measure(build_tuples, rows, args.repeat)),
+               ('typed, Decimal values', *measure(build_typed, rows, args.repeat)),
+               ('typed, NUMERIC_AS_NUMBER', *measure(build_typed, float_rows, args.repeat))]
+    baseline_time, baseline_memory = results[0][1], results[0][2].memory_usage(deep=True).sum()
+    for label, seconds, df in results:
+        memory = df.memory_usage(deep=True).sum()
+        print(f"{label:<24} {seconds:6.2f}s build ({baseline_time / seconds:4.1f}x)  "
+              f"{memory / 1024 ** 2:7.1f} MB ({baseline_memory / memory:4.1f}x smaller)")
+        print('    ' + ', '.join(f"{column}: {dtype}" for column, dtype in df.dtypes.items()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of aggregate questions answered from rollups against the base table.
+
+Loads a synthetic healthcare table with millions of rows into a PostgreSQL
+database, creates its rollups, and times typical generated aggregate queries as
+written and as rewritten by the rollup manager. The results of both are compared,
+and the time of a concurrent refresh is reported.
+
+The table and its rollups are created under the name given by --table and are
+dropped afterwards unless --keep is given.
+
+Usage:
+    python benchmarks/rollup_benchmark.py --dsn "host=localhost dbname=postgres user=postgres" [--rows 5000000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from decimal import Decimal
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rollups import RollupManager
+
+METADATA_COLUMNS = {
+    'age': 'bigint', 'gender': 'string', 'blood_type': 'string', 'medical_condition': 'string',
+    'admission_type': 'string', 'insurance_provider': 'string', 'length_of_stay': 'bigint',
+    'billing_amount': 'bigint', 'name': 'string'
+}
+
+QUERIES = [
+    "SELECT medical_condition, AVG(length_of_stay) FROM {table} GROUP BY medical_condition",
+    "SELECT COUNT(*) FROM {table} WHERE admission_type = 'Emergency'",
+    "SELECT insurance_provider, SUM(billing_amount) AS total_billing FROM {table} "
+    "GROUP BY insurance_provider ORDER BY total_billing DESC LIMIT 3",
+    "SELECT (age / 10) * 10 AS age_band, ROUND(AVG(length_of_stay), 2) AS avg_stay FROM {table} "
+    "GROUP BY age_band ORDER BY age_band",
+    "SELECT gender, COUNT(*) AS patients, MAX(billing_amount) FROM {table} GROUP BY gender",
+    "SELECT AVG(billing_amount) FROM {table} WHERE blood_type IN ('O-', 'AB-')",
+]
+
+def load_table(connection, table, rows):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        cursor.execute(f"""
+            CREATE TABLE {table} AS
+            SELECT (18 + random() * 72)::bigint AS age,
+                   (ARRAY['Male', 'Female'])[1 + (random() * 1)::int] AS gender,
+                   (ARRAY['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-'])[1 + (random() * 7)::int] AS blood_type,
+                   (ARRAY['Diabetes', 'Asthma', 'Obesity', 'Arthritis', 'Hypertension', 'Cancer'])
+                       [1 + (random() * 5)::int] AS medical_condition,
+                   (ARRAY['Emergency', 'Elective', 'Urgent'])[1 + (random() * 2)::int] AS admission_type,
+                   (ARRAY['Aetna', 'Blue Cross', 'Cigna', 'Medicare', 'UnitedHealthcare'])
+                       [1 + (random() * 4)::int] AS insurance_provider,
+                   (1 + random() * 29)::bigint AS length_of_stay,
+                   (1000 + random() * 49000)::bigint AS billing_amount,
+                   'patient ' || n AS name
+            FROM generate_series(1, %s) AS n
+        """, (rows,))
+        cursor.execute(f"ANALYZE {table}")
+    connection.commit()
+
+def time_query(connection, query, repeat):
+    timings = []
+    for _ in range(repeat):
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            timings.append(time.perf_counter() - start)
+    connection.rollback()
+    return statistics.median(timings), rows
+
+def same_rows(left, right):
+    def normalized(rows):
+        return sorted(tuple(round(float(v), 6) if isinstance(v, (int, float, Decimal)) else v for v in row)
+                      for row in rows)
+    return normalized(left) == normalized(right)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', required=True, help='libpq connection string of a scratch database')
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--table', default='healthcare_data_benchmark')
+    parser.add_argument('--keep', action='store_true', help='keep the table and rollups afterwards')
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.dsn)
+    start = time.perf_counter()
+    load_table(connection, args.table, args.rows)
+    print(f"Loaded {args.rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+    rollups = RollupManager({args.table: METADATA_COLUMNS})
+    start = time.perf_counter()
+    rollups.ensure(connection)
+    print(f"Created {len(rollups.rollups)} rollups in {time.perf_counter() - start:.1f}s: "
+          f"{', '.join(sorted(rollups.rollups))}")
+
+    start = time.perf_counter()
+    rollups.refresh(connection)
+    print(f"Refreshed all rollups concurrently in {time.perf_counter() - start:.1f}s\n")
+
+    print(f"{'base table':>12} {'rollup':>10} {'speedup':>9}  query")
+    for template in QUERIES:
+        query = template.format(table=args.table)
+        rewritten = rollups.rewrite(query)
+        base_time, base_rows = time_query(connection, query, args.repeat)
+        if rewritten is None:
+            print(f"{base_time * 1000:10.1f}ms {'-':>10} {'-':>9}  {query}")
+            continue
+        rollup_time, rollup_rows = time_query(connection, rewritten, args.repeat)
+        match = '' if same_rows(base_rows, rollup_rows) else '  (RESULTS DIFFER)'
+        print(f"{base_time * 1000:10.1f}ms {rollup_time * 1000:8.2f}ms {base_time / rollup_time:8.0f}x  "
+              f"{query}{match}")
+
+    if not args.keep:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {args.table} CASCADE")
+        connection.commit()
+    connection.close()
+
+if __name__ == '__main__':
+    main()
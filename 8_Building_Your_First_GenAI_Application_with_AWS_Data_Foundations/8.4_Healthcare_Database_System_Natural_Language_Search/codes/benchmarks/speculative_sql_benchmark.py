@@ -0,0 +1,129 @@
+"""
+Benchmark of speculative SQL generation against a single generation per attempt.
+
+Uses a stub model whose latency and error rate are configurable: a generated
+query is either correct, fails its EXPLAIN check (e.g. a missing column) or
+fails only when executed (e.g. a type error). The baseline makes one generation
+at temperature 0.7 and, when the query fails, the user asks again, up to
+--attempts times. The speculative mode generates one candidate per temperature
+and repairs failures with the error message. Reports the success rate, the
+latency of answered questions and the model calls per question.
+
+Usage:
+    python benchmarks/speculative_sql_benchmark.py [--questions 200] [--candidates 3] [--time-scale 0.01]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from speculative_sql import Check, SpeculativeSQL
+
+class StubQueryError(Exception):
+    """Stands in for a psycopg2 error raised when the query runs"""
+
+class StubModel:
+    """
+    Text-to-SQL stub with log-normal latency.
+
+    A query fails with probability error_rate + temperature * temperature_penalty,
+    half of the failures at EXPLAIN and half at execution. A repair request fixes
+    the query with probability repair_rate.
+    """
+
+    def __init__(self, seed, latency, error_rate, temperature_penalty, repair_rate, time_scale):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.temperature_penalty = temperature_penalty
+        self.repair_rate = repair_rate
+        self.time_scale = time_scale
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, question, temperature, feedback=None):
+        with self._lock:
+            self.calls += 1
+            delay = self.rng.lognormvariate(0, 0.35) * self.latency
+            if feedback is not None:
+                failed = self.rng.random() > self.repair_rate
+            else:
+                failed = self.rng.random() < self.error_rate + temperature * self.temperature_penalty
+            failure = self.rng.choice(('explain', 'execute')) if failed else 'ok'
+            cost = self.rng.uniform(100, 10000)
+        time.sleep(delay * self.time_scale)
+        return f"SELECT count(*) FROM healthcare_data /* {failure} {cost:.0f} */"
+
+    def check(self, sql):
+        time.sleep(0.02 * self.time_scale)
+        if 'explain' in sql:
+            return Check(False, 'column "length_of_stays" does not exist')
+        return Check(True, cost=float(sql.split()[-2]))
+
+    def execute(self, sql):
+        time.sleep(0.15 * self.time_scale)
+        if 'execute' in sql:
+            raise StubQueryError('operator does not exist: character varying > integer')
+        return [(42,)]
+
+def baseline(model, question, attempts):
+    """One generation per attempt; a failure costs the user another full round trip"""
+    start = time.monotonic()
+    for _ in range(attempts):
+        sql = model.generate(question, 0.7)
+        if model.check(sql).valid:
+            try:
+                model.execute(sql)
+                return True, time.monotonic() - start
+            except StubQueryError:
+                pass
+    return False, time.monotonic() - start
+
+def summarize(label, outcomes, calls, questions, time_scale):
+    latencies = sorted(latency / time_scale for success, latency in outcomes if success)
+    answered = len(latencies)
+    p50 = statistics.median(latencies) if latencies else float('nan')
+    p95 = latencies[int(0.95 * (answered - 1))] if latencies else float('nan')
+    print(f"{label:<24} answered {answered / questions:6.1%}  p50 {p50:5.2f}s  p95 {p95:5.2f}s  "
+          f"model calls/question {calls / questions:4.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--candidates', type=int, default=3)
+    parser.add_argument('--attempts', type=int, default=3, help='baseline attempts per question')
+    parser.add_argument('--max-repairs', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=2.0, help='median model latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.15)
+    parser.add_argument('--temperature-penalty', type=float, default=0.2)
+    parser.add_argument('--repair-rate', type=float, default=0.8)
+    parser.add_argument('--time-scale', type=float, default=0.01, help='sleep this fraction of simulated time')
+    args = parser.parse_args()
+
+    model_args = (args.latency, args.error_rate, args.temperature_penalty, args.repair_rate, args.time_scale)
+    questions = [f"question {i}" for i in range(args.questions)]
+
+    model = StubModel(1, *model_args)
+    outcomes = [baseline(model, q, args.attempts) for q in questions]
+    summarize('single generation', outcomes, model.calls, args.questions, args.time_scale)
+
+    model = StubModel(1, *model_args)
+    temperatures = [round(0.8 * i / max(1, args.candidates - 1), 2) for i in range(args.candidates)]
+    speculative = SpeculativeSQL(model.generate, model.check, model.execute, temperatures=temperatures,
+                                 grace_period=0.3 * args.time_scale, max_repairs=args.max_repairs,
+                                 repairable_errors=(StubQueryError,))
+    outcomes = []
+    for question in questions:
+        outcome = speculative.run(question)
+        outcomes.append((outcome.success, outcome.latency))
+    summarize(f"speculative (k={args.candidates})", outcomes, model.calls, args.questions, args.time_scale)
+    print(f"\n{speculative.stats()}")
+
+if __name__ == '__main__':
+    main()
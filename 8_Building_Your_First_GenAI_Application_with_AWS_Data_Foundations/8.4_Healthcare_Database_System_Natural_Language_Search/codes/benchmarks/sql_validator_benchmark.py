@@ -0,0 +1,97 @@
+"""
+Benchmark of the tokenizer-based SQL validator against the previous regex loop.
+
+Generates a corpus of text-to-SQL style queries, validates each one twice (as the
+app does, once in the UI flow and once in execute_query), and reports the time
+per validation and where the two validators disagree.
+
+Usage:
+    python benchmarks/sql_validator_benchmark.py [--queries 20000] [--distinct 2000]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sql_validator import validate, _classify
+
+def legacy_is_safe_query(query):
+    """The previous validator: 11 uncompiled searches over the lowercased query"""
+    query_lower = query.lower()
+    forbidden_patterns = [
+        r'\bdrop\b', r'\btruncate\b', r'\bdelete\b', r'\bupdate\b', r'\binsert\b', r'\bcreate\b',
+        r'\balter\b', r'\bgrant\b', r'\brevoke\b', r'\bexec\b', r'\bmerge\b'
+    ]
+    for pattern in forbidden_patterns:
+        if re.search(pattern, query_lower):
+            return False
+    return query_lower.strip().startswith('select')
+
+COLUMNS = ['age', 'length_of_stay', 'diagnosis', 'gender', 'admission_type', 'billing_amount', 'medical_condition']
+CATEGORIES = ['Emergency', 'Elective', 'Urgent', 'Diabetes', 'Asthma', 'Update pending', 'Create follow-up']
+
+def generate_query(rng):
+    """One generated query; a few are unsafe or contain keywords inside literals"""
+    column = rng.choice(COLUMNS)
+    kind = rng.random()
+    if kind < 0.45:
+        return (f"SELECT AVG({column}) FROM healthcare_data WHERE age > {rng.randint(18, 90)} "
+                f"AND admission_type = '{rng.choice(CATEGORIES)}';")
+    if kind < 0.5:
+        return (f"SELECT {column} FROM healthcare_data WHERE medical_condition ~* '{rng.choice(CATEGORIES)}' "
+                f"AND age>=-{rng.randint(1, 9)} AND admission_type || '' <> 'x'")
+    if kind < 0.8:
+        return (f"SELECT {column}, COUNT(*) AS patients FROM healthcare_data "
+                f"WHERE billing_amount > {rng.randint(100, 50000)}.{rng.randint(0, 99)} "
+                f"GROUP BY {column} ORDER BY patients DESC LIMIT {rng.randint(5, 50)}")
+    if kind < 0.9:
+        return (f"WITH recent AS (SELECT * FROM healthcare_data WHERE age < {rng.randint(18, 90)}) "
+                f"SELECT medical_condition, AVG(length_of_stay) FROM recent GROUP BY medical_condition")
+    if kind < 0.93:
+        return f"SELECT * FROM healthcare_data WHERE age = {rng.randint(1, 99)}; DROP TABLE healthcare_data"
+    if kind < 0.95:
+        return f"SELECT COUNT(*) FROM healthcare_data; SELECT pg_sleep({rng.randint(10, 60)})"
+    if kind < 0.96:
+        return f'SELECT "pg_sleep"({rng.randint(10, 60)})'
+    if kind < 0.97:
+        return """SELECT "PG_READ_FILE"('/etc/passwd')"""
+    return f"UPDATE healthcare_data SET age = {rng.randint(1, 99)} WHERE diagnosis = 'x'"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    distinct = [generate_query(rng) for _ in range(args.distinct)]
+    corpus = [rng.choice(distinct) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    legacy = [(legacy_is_safe_query(q), legacy_is_safe_query(q)) for q in corpus]
+    legacy_time = time.perf_counter() - start
+
+    validate.cache_clear()
+    _classify.cache_clear()
+    start = time.perf_counter()
+    tokenized = [(validate(q), validate(q)) for q in corpus]
+    tokenized_time = time.perf_counter() - start
+
+    validations = len(corpus) * 2
+    print(f"{len(corpus)} questions ({args.distinct} distinct queries), {validations} validations")
+    print(f"  regex loop:      {legacy_time * 1e6 / validations:8.2f} us per validation")
+    print(f"  tokenizer + LRU: {tokenized_time * 1e6 / validations:8.2f} us per validation")
+    print(f"  verdict cache:   {_classify.cache_info().currsize} query shapes")
+
+    false_rejects = sum(1 for q in distinct if not legacy_is_safe_query(q) and validate(q).allowed)
+    missed = sum(1 for q in distinct if legacy_is_safe_query(q) and not validate(q).allowed)
+    print(f"  distinct queries the regex loop rejected but are safe: {false_rejects}")
+    print(f"  distinct queries the regex loop allowed but are unsafe: {missed}")
+
+if __name__ == '__main__':
+    main()
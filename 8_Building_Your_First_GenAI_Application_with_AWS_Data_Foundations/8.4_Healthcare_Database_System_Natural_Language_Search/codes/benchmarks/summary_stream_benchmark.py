@@ -0,0 +1,146 @@
+"""
+Benchmark of streamed summaries against waiting for the whole completion.
+
+A stub bedrock-runtime client answers invoke_model_with_response_stream() with
+the Anthropic Messages event stream (message_start, content_block_delta per
+token, message_delta, message_stop), after a prompt processing delay and at a
+fixed output rate, and invoke_model() with the same completion at once. Reports
+the time until the user sees text: the whole completion when blocking, the first
+token when streaming. A share of the streams is cancelled partway, as when the
+user submits a new question, to check that reading stops and is recorded.
+
+Usage:
+    python benchmarks/summary_stream_benchmark.py [--summaries 50] [--time-scale 0.05]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import threading
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from converse_requests import ConverseClient
+
+SUMMARY = ("Patients over 60 stayed 6.2 days on average, 1.8 days longer than younger patients. "
+           "Emergency admissions account for most of the difference, especially for heart failure and "
+           "pneumonia, where stays above ten days are common.")
+
+class StubEventStream:
+    """Iterable of response stream events, like botocore's EventStream"""
+
+    def __init__(self, events, prompt_delay, token_delay):
+        self.events = events
+        self.prompt_delay = prompt_delay
+        self.token_delay = token_delay
+        self.closed = False
+        self.sent = 0
+
+    def __iter__(self):
+        time.sleep(self.prompt_delay)
+        for event in self.events:
+            if self.closed:
+                return
+            if event['type'] == 'content_block_delta':
+                time.sleep(self.token_delay)
+            self.sent += 1
+            yield {'chunk': {'bytes': json.dumps(event).encode()}}
+
+    def close(self):
+        self.closed = True
+
+class StubStreamingRuntime:
+    """
+    bedrock-runtime client whose completion takes prompt_seconds, then token_seconds per output token.
+
+    Args:
+        prompt_seconds (float): Delay before the first token
+        token_seconds (float): Delay per output token
+        time_scale (float): Fraction of the simulated delays actually slept
+    """
+
+    def __init__(self, prompt_seconds, token_seconds, time_scale):
+        self.prompt_delay = prompt_seconds * time_scale
+        self.token_delay = token_seconds * time_scale
+        self.streams = []
+
+    def _tokens(self, body):
+        request = json.loads(body)
+        words = SUMMARY.split(' ')
+        tokens = [word + ' ' for word in words[:request['max_tokens']]]
+        return tokens, len(json.dumps(request)) // 4
+
+    def invoke_model(self, modelId, body):
+        tokens, input_tokens = self._tokens(body)
+        time.sleep(self.prompt_delay + self.token_delay * len(tokens))
+        response = {'content': [{'type': 'text', 'text': ''.join(tokens)}], 'stop_reason': 'end_turn',
+                    'usage': {'input_tokens': input_tokens, 'output_tokens': len(tokens)}}
+        return {'body': BytesIO(json.dumps(response).encode())}
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        tokens, input_tokens = self._tokens(body)
+        events = [{'type': 'message_start', 'message': {'usage': {'input_tokens': input_tokens, 'output_tokens': 1}}},
+                  {'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}}]
+        events += [{'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': token}}
+                   for token in tokens]
+        events += [{'type': 'content_block_stop', 'index': 0},
+                   {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                    'usage': {'output_tokens': len(tokens)}},
+                   {'type': 'message_stop'}]
+        stream = StubEventStream(events, self.prompt_delay, self.token_delay)
+        self.streams.append(stream)
+        return {'body': stream}
+
+def describe(label, seconds, time_scale):
+    seconds = sorted(s / time_scale for s in seconds)
+    print(f"{label:<34} p50 {statistics.median(seconds):5.2f}s  p95 {seconds[int(0.95 * (len(seconds) - 1))]:5.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--summaries', type=int, default=50)
+    parser.add_argument('--prompt-seconds', type=float, default=0.8, help='simulated time to the first token')
+    parser.add_argument('--token-seconds', type=float, default=0.03, help='simulated time per output token')
+    parser.add_argument('--cancel-share', type=float, default=0.2, help='share of streams cancelled partway')
+    parser.add_argument('--time-scale', type=float, default=0.05, help='sleep this fraction of simulated time')
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    runtime = StubStreamingRuntime(args.prompt_seconds, args.token_seconds, args.time_scale)
+    converse = ConverseClient(runtime)
+    system, text = "Please provide a natural language summary of the results.", "Query results: ..."
+
+    blocking = []
+    for _ in range(args.summaries):
+        start = time.monotonic()
+        converse.send('fast', system, text, 600, 0.7, cache=False)
+        blocking.append(time.monotonic() - start)
+
+    first_text, complete, cancelled = [], [], 0
+    for _ in range(args.summaries):
+        stream = converse.stream('fast', system, text, 600, 0.7, cache=False)
+        cancel = rng.random() < args.cancel_share
+        if cancel:
+            # A new question from the same user, while the summary is being shown
+            threading.Timer((args.prompt_seconds + 10 * args.token_seconds) * args.time_scale, stream.cancel).start()
+        for _ in stream:
+            pass
+        cancelled += stream.cancelled
+        if stream.ttft is not None:
+            first_text.append(stream.ttft)
+        if not stream.cancelled:
+            complete.append(time.monotonic() - stream.started)
+
+    describe('blocking: text shown after', blocking, args.time_scale)
+    describe('streaming: first text shown after', first_text, args.time_scale)
+    describe('streaming: summary complete after', complete, args.time_scale)
+    unread = sum(len(s.events) - s.sent for s in runtime.streams if s.closed)
+    print(f"\ncancelled {cancelled} of {args.summaries} streams, {unread} events left unread")
+    print(f"recorded: {converse.stats()['fast']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""
+Bedrock Converse requests with a cached static prefix, and their token usage.
+
+The parts of a prompt that are the same for every question (the schema and the
+rules) go in the system block, followed by a cachePoint, so the model provider
+can reuse the processed prefix instead of reading it again. The per-question text
+comes last, in the user message. The cached and uncached input tokens reported in
+the response usage are recorded per model.
+
+Models that do not support prompt caching reject the cachePoint; their requests
+are sent again without it and later requests to them leave it out. A prefix
+shorter than the model's minimum cacheable length is simply not cached.
+
+boto3 versions without converse(), such as the last ones for Python 3.7, get
+the same request as an Anthropic Messages body for invoke_model(), with the
+cache point as cache_control, and its response in the Converse shape. Streamed
+responses use invoke_model_with_response_stream() with the same body; their
+time to first token is recorded along with their usage.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+CACHE_POINT = {'cachePoint': {'type': 'default'}}
+
+class Usage(NamedTuple):
+    """Token counts of one response; input_tokens excludes the tokens read from or written to the cache"""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    @classmethod
+    def from_response(cls, response: dict) -> 'Usage':
+        usage = response.get('usage', {})
+        return cls(usage.get('inputTokens', 0), usage.get('outputTokens', 0),
+                   usage.get('cacheReadInputTokens', 0), usage.get('cacheWriteInputTokens', 0))
+
+class Reply(NamedTuple):
+    """The text of a Converse response, why it stopped and its usage"""
+    text: str
+    stop_reason: str
+    usage: Usage
+
+def build_request(model_id: str, system: str, text: str, max_tokens: int, temperature: float,
+                  top_p: float = 0.999, cache: bool = True) -> dict:
+    """
+    Converse request arguments with the static system text first and the question last.
+
+    Args:
+        model_id (str): Model or inference profile id
+        system (str): Text shared by all questions, e.g. the schema and the rules
+        text (str): The per-question part of the prompt
+        max_tokens (int): Most tokens to generate
+        temperature (float): Sampling temperature
+        top_p (float): Nucleus sampling probability
+        cache (bool): Whether to mark the system text as a cacheable prefix
+
+    Returns:
+        dict: Keyword arguments for the bedrock-runtime client's converse()
+    """
+    system_blocks = [{'text': system}]
+    if cache:
+        system_blocks.append(CACHE_POINT)
+    return {
+        'modelId': model_id,
+        'system': system_blocks,
+        'messages': [{'role': 'user', 'content': [{'text': text}]}],
+        'inferenceConfig': {'maxTokens': max_tokens, 'temperature': temperature, 'topP': top_p},
+    }
+
+def parse_reply(response: dict) -> Reply:
+    """Text, stop reason and usage of a converse() response"""
+    content = response['output']['message']['content']
+    text = ''.join(block.get('text', '') for block in content)
+    return Reply(text.strip(), response.get('stopReason', ''), Usage.from_response(response))
+
+def to_messages_body(request: dict) -> str:
+    """Anthropic Messages body for invoke_model() with the prompt and cache point of a Converse request"""
+    system = []
+    for block in request['system']:
+        if 'cachePoint' in block:
+            system[-1]['cache_control'] = {'type': 'ephemeral'}
+        else:
+            system.append({'type': 'text', 'text': block['text']})
+    config = request['inferenceConfig']
+    return json.dumps({
+        'anthropic_version': 'bedrock-2023-05-31',
+        'system': system,
+        'messages': [{'role': message['role'], 'content': [{'type': 'text', 'text': block['text']}
+                                                           for block in message['content']]}
+                     for message in request['messages']],
+        'max_tokens': config['maxTokens'],
+        'temperature': config['temperature'],
+        'top_p': config['topP'],
+    })
+
+def from_messages_response(body: dict) -> dict:
+    """Converse-shaped response from the body of an Anthropic Messages invoke_model() response"""
+    usage = body.get('usage', {})
+    return {
+        'output': {'message': {'role': 'assistant', 'content': [{'text': block.get('text', '')}
+                                                                for block in body.get('content', [])
+                                                                if block.get('type') == 'text']}},
+        'stopReason': body.get('stop_reason', ''),
+        'usage': {'inputTokens': usage.get('input_tokens', 0), 'outputTokens': usage.get('output_tokens', 0),
+                  'cacheReadInputTokens': usage.get('cache_read_input_tokens', 0),
+                  'cacheWriteInputTokens': usage.get('cache_creation_input_tokens', 0)},
+    }
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class ResponseStream:
+    """
+    Text of one streamed Anthropic Messages completion, read as it arrives.
+
+    Iterating yields the text of each content_block_delta event. cancel(), from any
+    thread, stops reading at the next event; close() stops reading and closes the
+    connection. Once the stream ends, text, stop_reason (None when cancelled),
+    usage and ttft, the seconds from the request to the first text, are set.
+
+    Args:
+        body: The EventStream of an invoke_model_with_response_stream() response
+        started (float): time.monotonic() when the request was sent
+        on_close (Callable): Called with the stream once it is closed
+    """
+
+    def __init__(self, body, started: float, on_close: Callable[['ResponseStream'], None]):
+        self.body = body
+        self.started = started
+        self.on_close = on_close
+        self.stop_reason: Optional[str] = None
+        self.usage = Usage()
+        self.ttft: Optional[float] = None
+        self.closed = False
+        self._parts: List[str] = []
+        self._cancelled = threading.Event()
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.closed and self.stop_reason is None
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for event in self.body:
+                if self._cancelled.is_set():
+                    break
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                data = json.loads(chunk['bytes'])
+                kind = data.get('type')
+                if kind == 'content_block_delta':
+                    text = data.get('delta', {}).get('text')
+                    if text:
+                        if self.ttft is None:
+                            self.ttft = time.monotonic() - self.started
+                        self._parts.append(text)
+                        yield text
+                elif kind == 'message_start':
+                    usage = data.get('message', {}).get('usage', {})
+                    self.usage = self.usage._replace(
+                        input_tokens=usage.get('input_tokens', 0),
+                        cache_read_tokens=usage.get('cache_read_input_tokens', 0),
+                        cache_write_tokens=usage.get('cache_creation_input_tokens', 0))
+                elif kind == 'message_delta':
+                    self.stop_reason = data.get('delta', {}).get('stop_reason') or self.stop_reason
+                    self.usage = self.usage._replace(output_tokens=data.get('usage', {}).get('output_tokens', 0))
+        finally:
+            self.close()
+
+    def cancel(self):
+        """Stop reading at the next event, e.g. when the user asked a new question"""
+        self._cancelled.set()
+
+    def close(self):
+        """Stop reading and close the connection; safe to call more than once"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._cancelled.is_set():
+            self.stop_reason = None
+        if hasattr(self.body, 'close'):
+            self.body.close()
+        self.on_close(self)
+
+class ConverseClient:
+    """
+    Sends Converse requests with a cached system prefix and records their token usage per model.
+
+    Args:
+        client: A bedrock-runtime client, or any object with a compatible converse() or invoke_model()
+        cache (bool): Whether to mark system text as cacheable; False sends plain requests
+    """
+
+    def __init__(self, client, cache: bool = True):
+        self.client = client
+        self.cache = cache
+        self._uncacheable: Set[str] = set()
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._ttft: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _with_cache_fallback(self, model_id: str, cache: bool, send: Callable[[bool], dict]) -> dict:
+        """send(cache), sent again without the cache point if the model rejects it"""
+        try:
+            return send(cache)
+        except ClientError as e:
+            if not cache or e.response.get('Error', {}).get('Code') != 'ValidationException':
+                raise
+            response = send(False)
+            logger.warning(f"{model_id} rejected the prompt cache point, sending its requests without it: {e}")
+            with self._lock:
+                self._uncacheable.add(model_id)
+            return response
+
+    def send(self, model_id: str, system: str, text: str, max_tokens: int, temperature: float,
+             top_p: float = 0.999, cache: Optional[bool] = None) -> Reply:
+        """
+        Send one request and record its usage.
+
+        Args:
+            cache (bool, optional): Overrides the client's setting, e.g. for prompts
+                whose system text is too short to be worth caching
+
+        Returns:
+            Reply: The response text, stop reason and usage
+
+        Raises:
+            ClientError: When Bedrock rejects the request
+        """
+        cache = (self.cache if cache is None else cache) and model_id not in self._uncacheable
+        response = self._with_cache_fallback(model_id, cache, lambda cache: self._converse(
+            build_request(model_id, system, text, max_tokens, temperature, top_p, cache)))
+        reply = parse_reply(response)
+        self._record(model_id, reply.usage)
+        return reply
+
+    def stream(self, model_id: str, system: str, text: str, max_tokens: int, temperature: float,
+               top_p: float = 0.999, cache: Optional[bool] = None) -> ResponseStream:
+        """
+        Start a streamed completion with invoke_model_with_response_stream().
+
+        Takes the same arguments as send(). The usage and time to first token are
+        recorded when the stream is closed, including when it is cancelled.
+
+        Raises:
+            ClientError: When Bedrock rejects the request
+        """
+        cache = (self.cache if cache is None else cache) and model_id not in self._uncacheable
+        started = time.monotonic()
+        def start(cache):
+            body = to_messages_body(build_request(model_id, system, text, max_tokens, temperature, top_p, cache))
+            return self.client.invoke_model_with_response_stream(modelId=model_id, body=body)
+
+        response = self._with_cache_fallback(model_id, cache, start)
+        return ResponseStream(response['body'], started, lambda stream: self._record_stream(model_id, stream))
+
+    def _converse(self, request: dict) -> dict:
+        if hasattr(self.client, 'converse'):
+            return self.client.converse(**request)
+        response = self.client.invoke_model(modelId=request['modelId'], body=to_messages_body(request))
+        return from_messages_response(json.loads(response['body'].read()))
+
+    def _record(self, model_id: str, usage: Usage):
+        with self._lock:
+            totals = self._usage.setdefault(model_id, dict.fromkeys(('requests',) + Usage._fields, 0))
+            totals['requests'] += 1
+            for field, count in usage._asdict().items():
+                totals[field] += count
+
+    def _record_stream(self, model_id: str, stream: ResponseStream):
+        self._record(model_id, stream.usage)
+        with self._lock:
+            totals = self._usage[model_id]
+            totals['streams'] = totals.get('streams', 0) + 1
+            totals['cancelled_streams'] = totals.get('cancelled_streams', 0) + stream.cancelled
+            if stream.ttft is not None:
+                self._ttft.setdefault(model_id, deque(maxlen=200)).append(stream.ttft)
+
+    def stats(self) -> dict:
+        """
+        Requests and token counts per model, the share of prompt tokens read from the
+        cache, and the p50/p95 time to first token of recent streams
+        """
+        with self._lock:
+            stats = {}
+            for model_id, totals in self._usage.items():
+                prompt = totals['input_tokens'] + totals['cache_read_tokens'] + totals['cache_write_tokens']
+                stats[model_id] = dict(totals, cached_ratio=totals['cache_read_tokens'] / prompt if prompt else 0.0,
+                                       caching=self.cache and model_id not in self._uncacheable)
+                ttft = list(self._ttft.get(model_id, ()))
+                if ttft:
+                    stats[model_id].update(ttft_p50=_percentile(ttft, 0.5), ttft_p95=_percentile(ttft, 0.95))
+            return stats
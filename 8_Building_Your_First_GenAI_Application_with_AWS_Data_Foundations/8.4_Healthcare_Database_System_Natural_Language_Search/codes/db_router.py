@@ -0,0 +1,239 @@
+"""
+Read/write connection routing for Aurora PostgreSQL.
+
+Read-only statements go to the reader endpoints in round-robin order and everything
+else goes to the writer. A reader whose replica lag exceeds the configured limit,
+or that cannot be reached, is skipped for a cooldown period; when no reader is
+usable the statement falls back to the writer.
+
+Endpoints are given as "host" or "host:port", so the router can be exercised
+against two local PostgreSQL instances, e.g.
+DB_WRITER_HOST=localhost:5432 DB_READER_HOSTS=localhost:5433.
+"""
+
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Statements that never write; a WITH query only qualifies without a data-modifying CTE
+READ_ONLY_PREFIX = re.compile(r'^\s*(\(\s*)*(select|with|show|explain|values|table)\b', re.IGNORECASE)
+DATA_MODIFYING = re.compile(r'\b(insert|update|delete|merge|truncate|create|alter|drop|grant|revoke|copy|call|lock)\b|\bfor\s+(update|share|no\s+key\s+update|key\s+share)\b', re.IGNORECASE)
+
+# Aurora reports lag through aurora_replica_status(); plain PostgreSQL replicas
+# through the last replay timestamp. A server that is not in recovery has no lag.
+AURORA_LAG_QUERY = """
+    SELECT replica_lag_in_msec FROM aurora_replica_status()
+    WHERE server_id = aurora_db_instance_identifier()
+"""
+POSTGRES_LAG_QUERY = """
+    SELECT CASE WHEN pg_is_in_recovery()
+                THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) * 1000, 0)
+                ELSE 0 END
+"""
+
+def is_read_only(query: str) -> bool:
+    """Whether a statement can be served by a reader"""
+    return bool(READ_ONLY_PREFIX.match(query)) and not DATA_MODIFYING.search(query)
+
+def parse_endpoint(endpoint: str, default_port: int) -> Tuple[str, int]:
+    """Split "host" or "host:port" into its parts"""
+    host, _, port = endpoint.strip().partition(':')
+    return host, int(port) if port else default_port
+
+def default_reader_endpoint(writer_host: str) -> Optional[str]:
+    """Aurora's cluster reader endpoint, derived from the cluster writer endpoint"""
+    if '.cluster-' in writer_host and '.cluster-ro-' not in writer_host:
+        return writer_host.replace('.cluster-', '.cluster-ro-', 1)
+    return None
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No pooled connection became free within the acquire timeout"""
+
+class _Endpoint:
+    """A database endpoint with its connection pool and health state"""
+
+    def __init__(self, name: str, host: str, port: int, max_connections: int):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.pool = None
+        # ThreadedConnectionPool raises instead of waiting when it is full, so callers queue here first
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.unavailable_until = 0.0
+        self.lag_checked_at = 0.0
+        self.lag_ms = 0.0
+
+class ConnectionRouter:
+    """
+    Routes statements to the writer or one of the readers.
+
+    Args:
+        writer (str): Writer endpoint, "host" or "host:port"
+        readers (List[str]): Reader endpoints; custom Aurora endpoints are used round-robin
+        database, user, password (str): Connection credentials shared by all endpoints
+        port (int): Port used for endpoints that do not specify one
+        max_lag_ms (float): Readers lagging more than this are not used
+        lag_check_interval (float): Seconds a reader's measured lag is trusted
+        cooldown (float): Seconds a lagging or unreachable reader is skipped
+        max_connections (int): Pool size per endpoint
+        acquire_timeout (float): Seconds to wait for a free pooled connection before raising PoolTimeout
+    """
+
+    def __init__(self, writer: str, readers: List[str], database: str, user: str, password: str,
+                 port: int = 5432, max_lag_ms: float = 1000, lag_check_interval: float = 5,
+                 cooldown: float = 30, max_connections: int = 5, connect_timeout: int = 5,
+                 acquire_timeout: float = 10):
+        self.connect_kwargs = {
+            'dbname': database,
+            'user': user,
+            'password': password,
+            'connect_timeout': connect_timeout
+        }
+        self.max_lag_ms = max_lag_ms
+        self.lag_check_interval = lag_check_interval
+        self.cooldown = cooldown
+        self.max_connections = max_connections
+        self.acquire_timeout = acquire_timeout
+
+        self.writer = _Endpoint('writer', *parse_endpoint(writer, port), max_connections)
+        self.readers = [
+            _Endpoint(f'reader-{i}', *parse_endpoint(reader, port), max_connections)
+            for i, reader in enumerate(readers) if reader.strip()
+        ]
+        self._next_reader = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, db_config: Dict, writer: Optional[str] = None, readers: Optional[str] = None,
+                    **kwargs) -> 'ConnectionRouter':
+        """
+        Create a router from the app's DB_CONFIG.
+
+        The writer defaults to the configured host. Readers are a comma-separated
+        list and default to the Aurora cluster reader endpoint.
+        """
+        writer = writer or db_config['host']
+        if readers:
+            reader_list = readers.split(',')
+        else:
+            reader = default_reader_endpoint(parse_endpoint(writer, 0)[0])
+            reader_list = [reader] if reader else []
+        return cls(writer, reader_list, db_config['database'], db_config['user'], db_config['password'],
+                   port=int(db_config.get('port') or 5432), **kwargs)
+
+    def _get_pool(self, endpoint: _Endpoint) -> ThreadedConnectionPool:
+        with self._lock:
+            if endpoint.pool is None:
+                endpoint.pool = ThreadedConnectionPool(
+                    1, self.max_connections, host=endpoint.host, port=endpoint.port, **self.connect_kwargs
+                )
+            return endpoint.pool
+
+    @contextmanager
+    def _connection(self, endpoint: _Endpoint):
+        if not endpoint.slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeout(f"No connection to {endpoint.host}:{endpoint.port} became free "
+                              f"within {self.acquire_timeout:g}s")
+        try:
+            pool = self._get_pool(endpoint)
+            connection = pool.getconn()
+            try:
+                yield connection
+            finally:
+                # A connection the server dropped is discarded instead of handed out again
+                if not connection.closed:
+                    connection.rollback()
+                pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            endpoint.slots.release()
+
+    def _measure_lag(self, endpoint: _Endpoint) -> float:
+        with self._connection(endpoint) as connection:
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute(AURORA_LAG_QUERY)
+                except psycopg2.Error:
+                    connection.rollback()
+                    cursor.execute(POSTGRES_LAG_QUERY)
+                row = cursor.fetchone()
+        return float(row[0]) if row and row[0] is not None else 0.0
+
+    def _is_usable(self, endpoint: _Endpoint) -> bool:
+        now = time.monotonic()
+        if endpoint.unavailable_until > now:
+            return False
+        if now - endpoint.lag_checked_at < self.lag_check_interval:
+            return endpoint.lag_ms <= self.max_lag_ms
+
+        try:
+            endpoint.lag_ms = self._measure_lag(endpoint)
+        except PoolTimeout:
+            # Busy rather than unreachable; keep the last measurement
+            return endpoint.lag_ms <= self.max_lag_ms
+        except psycopg2.Error as e:
+            logger.warning(f"Reader {endpoint.host}:{endpoint.port} is unreachable: {str(e)}")
+            endpoint.unavailable_until = now + self.cooldown
+            return False
+        endpoint.lag_checked_at = now
+
+        if endpoint.lag_ms > self.max_lag_ms:
+            logger.warning(f"Reader {endpoint.host}:{endpoint.port} lags {endpoint.lag_ms:.0f} ms, "
+                           f"using other endpoints for {self.cooldown:.0f}s")
+            endpoint.unavailable_until = now + self.cooldown
+            return False
+        return True
+
+    def choose_endpoint(self, read_only: bool) -> _Endpoint:
+        """Pick the endpoint for a statement: the next usable reader, or the writer"""
+        if read_only and self.readers:
+            with self._lock:
+                start = self._next_reader
+                self._next_reader = (self._next_reader + 1) % len(self.readers)
+            for offset in range(len(self.readers)):
+                reader = self.readers[(start + offset) % len(self.readers)]
+                if self._is_usable(reader):
+                    return reader
+            logger.warning("No reader is usable, routing read-only statement to the writer")
+        return self.writer
+
+    @contextmanager
+    def connection(self, query: Optional[str] = None, read_only: Optional[bool] = None):
+        """
+        Borrow a connection for a statement.
+
+        Args:
+            query (str): Statement to route; read-only statements may use a reader
+            read_only (bool): Override the routing decision made from the statement
+
+        Yields:
+            connection: A pooled psycopg2 connection; it is rolled back when returned
+        """
+        if read_only is None:
+            read_only = query is not None and is_read_only(query)
+        endpoint = self.choose_endpoint(read_only)
+
+        try:
+            with self._connection(endpoint) as connection:
+                if endpoint is not self.writer:
+                    connection.set_session(readonly=True)
+                yield connection
+        except psycopg2.OperationalError as e:
+            # Errors without a SQLSTATE are connection failures rather than e.g. a statement timeout
+            if endpoint is not self.writer and e.pgcode is None and not isinstance(e, PoolTimeout):
+                endpoint.unavailable_until = time.monotonic() + self.cooldown
+            raise
+
+    def close(self):
+        """Close all pooled connections"""
+        for endpoint in [self.writer] + self.readers:
+            if endpoint.pool is not None:
+                endpoint.pool.closeall()
+                endpoint.pool = None
@@ -0,0 +1,196 @@
+"""
+Routing of model calls by question complexity and observed model performance.
+
+A question is classified as simple, moderate or complex from how much of the
+schema it touches (columns and tables it names), the joins its query needs and
+its length. Simple questions go to the fastest model with a tight max_tokens;
+when its output fails validation the call is escalated to the next, larger
+model. Each model's latency and success rate are tracked over a window of
+recent calls: a model whose success rate at a complexity level falls below the
+target, or whose p95 latency exceeds the budget, is skipped for that level
+until its record recovers.
+"""
+
+import re
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+LEVELS = ('simple', 'moderate', 'complex')
+
+JOIN_PATTERN = re.compile(r'\bjoin\b', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+class Complexity(NamedTuple):
+    """How demanding a question is, and the signals it was classified from"""
+    level: str
+    columns: int
+    joins: int
+    words: int
+
+class Route(NamedTuple):
+    """The model chosen for a call"""
+    model_id: str
+    max_tokens: int
+    level: str
+    escalated: bool = False
+
+def _words(text: str) -> List[str]:
+    # Plurals match their column: "conditions" names "Medical Condition"
+    return [word[:-1] if len(word) > 3 and word.endswith('s') else word
+            for word in WORD_PATTERN.findall(text.lower())]
+
+def classify(question: str, schema: Dict[str, Iterable[str]], sql: Optional[str] = None,
+             simple_max: tuple = (1, 0, 12), complex_min: tuple = (5, 2, 40)) -> Complexity:
+    """
+    Classify a question from the schema it touches, its joins and its length.
+
+    Args:
+        question (str): The user's question
+        schema (dict): Column names per table, e.g. the metadata from S3
+        sql (str, optional): The query for the question, when known; its JOINs are
+            counted instead of estimating them from the tables the question names
+        simple_max (tuple): Most columns, joins and words of a simple question
+        complex_min (tuple): Fewest columns, joins or words that make a question complex
+
+    Returns:
+        Complexity: The level and the signals it was classified from
+    """
+    words = _words(question)
+    vocabulary = set(words)
+    columns, tables = 0, 0
+    for table, table_columns in schema.items():
+        matched = sum(1 for column in table_columns if set(_words(column)) <= vocabulary)
+        columns += matched
+        tables += bool(matched) or set(_words(table)) <= vocabulary
+    joins = len(JOIN_PATTERN.findall(sql)) if sql else max(0, tables - 1)
+
+    signals = (columns, joins, len(words))
+    if any(value >= minimum for value, minimum in zip(signals, complex_min)):
+        level = 'complex'
+    elif all(value <= maximum for value, maximum in zip(signals, simple_max)):
+        level = 'simple'
+    else:
+        level = 'moderate'
+    return Complexity(level, *signals)
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class ModelRouter:
+    """
+    Chooses a model per call and learns from the outcomes recorded for it.
+
+    Args:
+        models (Sequence[str]): Model ids, fastest first; the last is the one escalated to in the end
+        max_tokens (dict): max_tokens per complexity level
+        start (dict): Index of the first model tried per complexity level
+        min_success_rate (float): Models below this success rate at a level are skipped for it
+        latency_budget (float, optional): Models whose p95 latency in seconds exceeds this are skipped
+        window (int): Recent calls per model the statistics are computed from
+        min_samples (int): Calls needed before a model's record is used to skip it
+        probe_interval (int): Every so many calls at a level go to its starting model even
+            when it is skipped, so that its record can recover
+    """
+
+    def __init__(self, models: Sequence[str], max_tokens: Optional[Dict[str, int]] = None,
+                 start: Optional[Dict[str, int]] = None, min_success_rate: float = 0.9,
+                 latency_budget: Optional[float] = None, window: int = 200, min_samples: int = 20,
+                 probe_interval: int = 20):
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = tuple(models)
+        self.max_tokens = dict(max_tokens or {'simple': 1000, 'moderate': 2000, 'complex': 4000})
+        self.start = dict(start or {'simple': 0, 'moderate': 0, 'complex': len(self.models) - 1})
+        self.min_success_rate = min_success_rate
+        self.latency_budget = latency_budget
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self._routed = {level: 0 for level in LEVELS}
+        self._latencies = {model: deque(maxlen=window) for model in self.models}
+        self._outcomes = {(model, level): deque(maxlen=window) for model in self.models for level in LEVELS}
+        self._escalations = 0
+        self._lock = threading.Lock()
+
+    def _eligible(self, model: str, level: str) -> bool:
+        outcomes = self._outcomes[model, level]
+        if len(outcomes) >= self.min_samples and sum(outcomes) / len(outcomes) < self.min_success_rate:
+            return False
+        latencies = self._latencies[model]
+        if self.latency_budget is not None and len(latencies) >= self.min_samples:
+            return _percentile(list(latencies), 0.95) <= self.latency_budget
+        return True
+
+    def route(self, complexity: Complexity) -> Route:
+        """The first eligible model from the level's starting model; the largest model if none is"""
+        level = complexity.level
+        candidates = self.models[self.start[level]:]
+        with self._lock:
+            self._routed[level] += 1
+            if self._routed[level] % self.probe_interval == 0:
+                model = candidates[0]
+            else:
+                model = next((m for m in candidates if self._eligible(m, level)), self.models[-1])
+        return Route(model, self.max_tokens[level], level)
+
+    def escalate(self, route: Route) -> Optional[Route]:
+        """The next larger model after a failed call, with the max_tokens of a complex question"""
+        index = self.models.index(route.model_id)
+        if index + 1 >= len(self.models):
+            return None
+        with self._lock:
+            self._escalations += 1
+        return Route(self.models[index + 1], max(route.max_tokens, self.max_tokens['complex']), route.level, True)
+
+    def record(self, route: Route, latency: float, success: bool):
+        """Record the latency and validation outcome of a routed call"""
+        with self._lock:
+            self._latencies[route.model_id].append(latency)
+            self._outcomes[route.model_id, route.level].append(bool(success))
+
+    def call(self, complexity: Complexity, call: Callable[[Route], Any],
+             validate: Callable[[Any], bool]) -> Tuple[Any, Route, bool]:
+        """
+        Call the routed model, escalating to larger models while validate rejects the result.
+
+        Args:
+            complexity (Complexity): The question's classification
+            call (Callable): call(route) invokes the model; exceptions are recorded as failures and raised
+            validate (Callable): validate(result) tells whether the result is usable
+
+        Returns:
+            Tuple: The last result, the route that produced it and whether it was valid
+        """
+        route = self.route(complexity)
+        while True:
+            start = time.monotonic()
+            try:
+                result = call(route)
+            except Exception:
+                self.record(route, time.monotonic() - start, False)
+                raise
+            valid = bool(validate(result))
+            self.record(route, time.monotonic() - start, valid)
+            escalated = None if valid else self.escalate(route)
+            if escalated is None:
+                return result, route, valid
+            route = escalated
+
+    def stats(self) -> dict:
+        """p50/p95 latency and success rate per model over its recent calls, and the number of escalations"""
+        with self._lock:
+            models = {}
+            for model in self.models:
+                latencies = list(self._latencies[model])
+                outcomes = [o for level in LEVELS for o in self._outcomes[model, level]]
+                models[model] = {
+                    'samples': len(latencies),
+                    'p50': _percentile(latencies, 0.5),
+                    'p95': _percentile(latencies, 0.95),
+                    'success_rate': sum(outcomes) / len(outcomes) if outcomes else None
+                }
+            return {'models': models, 'escalations': self._escalations}
@@ -0,0 +1,152 @@
+"""
+EXPLAIN-based cost guard for generated SQL.
+
+Before a generated query runs, its plan is estimated with EXPLAIN (FORMAT JSON)
+under a short statement timeout. Queries whose estimated cost exceeds the limit
+are rejected; queries that would return too many rows are wrapped in a LIMIT.
+Verdicts are cached by the normalized query text, literals included, so a
+repeated query is not planned again until the cache entry expires. Queries that
+differ only in their values are planned separately, since a filter value can
+change the estimated cost and row count by orders of magnitude.
+"""
+
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import psycopg2
+
+from sql_validator import normalize_sql, strip_sql
+
+logger = logging.getLogger(__name__)
+
+LIMIT_PATTERN = re.compile(r'\blimit\s+\d+\s*(offset\s+\d+\s*)?$|\bfetch\s+first\b', re.IGNORECASE)
+
+class Verdict(NamedTuple):
+    """Outcome of the cost check for one query"""
+    allowed: bool
+    message: str = ""
+    row_limit: Optional[int] = None
+    estimated_cost: float = 0.0
+    estimated_rows: float = 0.0
+
+class QueryCostGuard:
+    """
+    Rejects or limits queries from their estimated plan.
+
+    Args:
+        max_cost (float): Highest planner cost a query may have
+        max_rows (int): Queries estimated to return more rows are limited to this many
+        explain_timeout_ms (int): Statement timeout for the EXPLAIN itself
+        cache_size (int): Number of queries whose verdicts are kept
+        cache_ttl (float): Seconds a verdict is trusted, as statistics change over time
+    """
+
+    def __init__(self, max_cost: float = 1_000_000, max_rows: int = 10_000, explain_timeout_ms: int = 500,
+                 cache_size: int = 256, cache_ttl: float = 600):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.explain_timeout_ms = explain_timeout_ms
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: str) -> Optional[Verdict]:
+        with self._lock:
+            entry = self._verdicts.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._verdicts.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _store(self, key: str, verdict: Verdict):
+        with self._lock:
+            self._verdicts[key] = (time.monotonic() + self.cache_ttl, verdict)
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+
+    def explain(self, connection, query: str) -> dict:
+        """Estimated top-level plan node of a query"""
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (self.explain_timeout_ms,))
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query)
+            plan = cursor.fetchone()[0]
+        connection.rollback()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']
+
+    def evaluate(self, connection, query: str) -> Verdict:
+        """Plan a query and decide whether it may run, and with which row limit"""
+        try:
+            plan = self.explain(connection, query)
+            cost, rows = plan['Total Cost'], plan['Plan Rows']
+            needs_limit = rows > self.max_rows and not LIMIT_PATTERN.search(strip_sql(query))
+        except psycopg2.extensions.QueryCanceledError:
+            connection.rollback()
+            return Verdict(False, "This question is too complex to answer quickly. Please try a narrower question.")
+
+        # A LIMIT only helps an expensive query if its plan can stop early
+        limited = None
+        if cost > self.max_cost and needs_limit:
+            try:
+                limited = self.explain(connection, apply_row_limit(query, self.max_rows))
+            except psycopg2.Error as e:
+                # Without a plan for the limited query it is judged by its own cost
+                connection.rollback()
+                logger.warning(f"Could not plan the limited query: {str(e)}")
+
+        if cost > self.max_cost:
+            if limited is not None and limited['Total Cost'] <= self.max_cost:
+                return Verdict(True, row_limit=self.max_rows,
+                               estimated_cost=limited['Total Cost'], estimated_rows=limited['Plan Rows'])
+            logger.warning(f"Rejected query with estimated cost {cost:.0f} and {rows:.0f} rows")
+            return Verdict(False, "This question would scan too much data. Please add filters or ask about a "
+                                  "smaller group of patients.", estimated_cost=cost, estimated_rows=rows)
+
+        if needs_limit:
+            return Verdict(True, row_limit=self.max_rows, estimated_cost=cost, estimated_rows=rows)
+        return Verdict(True, estimated_cost=cost, estimated_rows=rows)
+
+    def check(self, connection, query: str) -> Verdict:
+        """
+        Get the verdict for a query, planning it only if it has no fresh verdict.
+
+        Args:
+            connection: Connection the query will run on; EXPLAIN runs in its own transaction
+            query (str): The generated SQL query
+
+        Returns:
+            Verdict: Whether the query may run and the row limit to apply
+        """
+        key = normalize_sql(query)
+        verdict = self._cached(key)
+        if verdict is None:
+            verdict = self.evaluate(connection, query)
+            self._store(key, verdict)
+        return verdict
+
+    def stats(self) -> dict:
+        """Plan cache hit and miss counts"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self._verdicts)
+            }
+
+def apply_row_limit(query: str, row_limit: int) -> str:
+    """Wrap a query so it returns at most row_limit rows, keeping its ordering"""
+    return f"SELECT * FROM ({strip_sql(query)}) AS limited_result LIMIT {int(row_limit)}"
@@ -0,0 +1,196 @@
+"""
+Query shapes and server-side prepared statements for generated SQL.
+
+Generated queries often differ only in their literals ("patients over 60" and
+"patients over 65"). Each query is split into a template with $n placeholders
+and a parameter vector; the template is PREPAREd once per connection and later
+queries of the same shape EXECUTE it with their parameters, skipping the parse
+step and, once PostgreSQL switches to a generic plan, planning as well.
+
+Only literals whose type PostgreSQL infers the same way as a placeholder's are
+extracted: numbers get an explicit cast matching the literal's own type, strings
+stay untyped. Literals are only extracted after comparison operators, commas,
+parentheses and keywords such as IN, LIKE or LIMIT; ORDER BY / GROUP BY
+positions and typed literals such as DATE '...' stay in the template. If a
+template still cannot be prepared, the query runs as generated.
+"""
+
+import weakref
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Tuple
+
+import psycopg2
+
+from sql_validator import join_tokens, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Tokens after which a literal is a value being compared or passed
+PARAMETER_CONTEXTS = {
+    '=', '<', '>', '<=', '>=', '<>', '!=', '(', ',', '+', '-', '*', '/',
+    'like', 'ilike', 'in', 'between', 'and', 'or', 'limit', 'offset'
+}
+# Clauses that end an ORDER BY / GROUP BY list
+CLAUSE_KEYWORDS = {'limit', 'offset', 'having', 'window', 'union', 'intersect', 'except', 'fetch', 'for'}
+
+INT4_MAX = 2 ** 31 - 1
+
+class QueryShape(NamedTuple):
+    """A query split into its template and the literal values bound to it"""
+    template: str
+    params: Tuple
+
+def _number_parameter(value: str):
+    """Placeholder cast and Python value matching the type PostgreSQL gives the literal"""
+    if any(c in value for c in '.eE'):
+        return 'numeric', value
+    number = int(value)
+    return ('integer' if number <= INT4_MAX else 'bigint'), number
+
+def parameterize(query: str) -> QueryShape:
+    """
+    Replace extractable literals with numbered placeholders.
+
+    Returns:
+        QueryShape: The template with $n placeholders and the parameter values in order
+    """
+    tokens = tokenize(query)
+    while tokens and tokens[-1].kind == 'semicolon':
+        tokens.pop()
+
+    parts: List[Tuple[str, int, int]] = []
+    params = []
+    depth = 0
+    positional_depth = None
+    previous = ''
+
+    for kind, value, start in tokens:
+        end = start + len(value)
+        lowered = value.lower() if kind == 'word' else value
+
+        # Track ORDER BY / GROUP BY lists, where a number is a column position
+        if lowered == 'by' and previous in ('order', 'group'):
+            positional_depth = depth
+        elif positional_depth is not None and (
+                lowered in CLAUSE_KEYWORDS or (lowered == ')' and depth == positional_depth)):
+            positional_depth = None
+        if lowered == '(':
+            depth += 1
+        elif lowered == ')':
+            depth -= 1
+
+        extractable = (kind in ('number', 'string') and previous in PARAMETER_CONTEXTS
+                       and positional_depth is None and not value.startswith(('E', 'e')))
+        if extractable and kind == 'number':
+            cast, param = _number_parameter(value)
+            params.append(param)
+            parts.append((f"${len(params)}::{cast}", start, end))
+        elif extractable:
+            params.append(value[1:-1].replace("''", "'"))
+            parts.append((f"${len(params)}", start, end))
+        else:
+            parts.append((value, start, end))
+        previous = lowered
+
+    return QueryShape(join_tokens(parts), tuple(params))
+
+class PreparedStatementCache:
+    """
+    Executes queries through per-connection prepared statements keyed by query shape.
+
+    Args:
+        max_statements (int): Prepared statements kept per connection; the least
+            recently used are deallocated
+    """
+
+    def __init__(self, max_statements: int = 100):
+        self.max_statements = max_statements
+        # Held weakly, so the statements of a connection the pool discards go with it
+        self._statements = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def statement_name(template: str) -> str:
+        return 'q_' + hashlib.sha1(template.encode('utf-8')).hexdigest()[:16]
+
+    def _registry(self, connection) -> OrderedDict:
+        backend_pid = connection.get_backend_pid()
+        with self._lock:
+            for closed in [c for c in self._statements.keys() if c.closed]:
+                del self._statements[closed]
+            entry = self._statements.get(connection)
+            # A new backend behind the same connection object has none of the statements
+            if entry is None or entry[0] != backend_pid:
+                entry = self._statements[connection] = (backend_pid, OrderedDict())
+            return entry[1]
+
+    def _prepare(self, cursor, registry: OrderedDict, name: str, template: str):
+        cursor.execute(f"PREPARE {name} AS {template}")
+        registry[name] = template
+        while len(registry) > self.max_statements:
+            evicted, _ = registry.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted}")
+
+    def execute(self, connection, query: str):
+        """
+        Execute a query through the prepared statement for its shape.
+
+        Args:
+            connection: psycopg2 connection the statement is prepared on
+            query (str): The SQL query with inline literals
+
+        Returns:
+            cursor: Cursor holding the results; the caller closes it
+        """
+        template, params = parameterize(query)
+        name = self.statement_name(template)
+        registry = self._registry(connection)
+        execute_sql = f"EXECUTE {name}" + (f" ({', '.join(['%s'] * len(params))})" if params else "")
+
+        cursor = connection.cursor()
+        try:
+            if name in registry:
+                registry.move_to_end(name)
+                with self._lock:
+                    self.hits += 1
+                try:
+                    cursor.execute(execute_sql, params)
+                    return cursor
+                except psycopg2.errors.InvalidSqlStatementName:
+                    # Deallocated on the server, e.g. by a DISCARD; prepare it again
+                    connection.rollback()
+                    registry.pop(name, None)
+
+            with self._lock:
+                self.misses += 1
+            try:
+                self._prepare(cursor, registry, name, template)
+            except psycopg2.Error as e:
+                # e.g. a placeholder whose type cannot be inferred; run the query as generated
+                logger.info(f"Could not prepare query shape, executing directly: {str(e).strip()}")
+                connection.rollback()
+                registry.pop(name, None)
+                cursor.execute(query)
+                return cursor
+            cursor.execute(execute_sql, params)
+            return cursor
+        except Exception:
+            cursor.close()
+            raise
+
+    def stats(self) -> dict:
+        """Prepare hit ratio across all connections"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'prepare_hit_ratio': self.hits / total if total else 0.0,
+                'connections': len(self._statements),
+                'statements': sum(len(registry) for _, registry in self._statements.values())
+            }
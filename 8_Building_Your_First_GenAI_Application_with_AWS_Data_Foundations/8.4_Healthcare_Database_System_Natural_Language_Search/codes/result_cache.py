@@ -0,0 +1,109 @@
+"""
+Arrow-backed query results kept per session.
+
+Rows are fetched from the cursor in batches and each batch is converted to
+typed Arrow columns (see result_types), so a result is held once in columnar
+form instead of as Python tuples plus a DataFrame. Results are kept per
+session, keyed by a hash of the normalized query: the UI renders one page at a
+time by slicing the cached table, and exports are written from the cache
+instead of running the query again.
+"""
+
+import io
+import hashlib
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from result_types import ColumnBuilder, to_pandas
+from sql_validator import normalize_sql
+
+EXPORT_FORMATS = {
+    'parquet': ('application/octet-stream', 'parquet'),
+    'csv': ('text/csv', 'csv'),
+}
+
+def result_key(query: str) -> str:
+    """Cache key of a query's result; queries differing only in formatting share it"""
+    return hashlib.sha1(normalize_sql(query).encode('utf-8')).hexdigest()[:16]
+
+def fetch_arrow(cursor, batch_size: int = 10_000) -> pa.Table:
+    """Fetch all rows of an executed cursor as an Arrow table, one chunk per fetch"""
+    names = [desc[0] for desc in cursor.description]
+    builders = [ColumnBuilder.from_description(desc) for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        # Much faster than transposing the batch with zip(*rows)
+        for i, builder in enumerate(builders):
+            builder.append(list(map(itemgetter(i), rows)))
+    return pa.Table.from_arrays([builder.finish() for builder in builders], names=names)
+
+class ResultCache:
+    """
+    The most recent query results of one session.
+
+    Args:
+        max_results (int): Results kept; the least recently used are dropped
+        max_bytes (int): Combined size of the kept results and their exports
+    """
+
+    def __init__(self, max_results: int = 5, max_bytes: int = 256 * 1024 * 1024):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self._results = OrderedDict()
+
+    def _size(self, entry: Dict) -> int:
+        return entry['table'].nbytes + sum(len(data) for data in entry['exports'].values())
+
+    def _evict(self):
+        while len(self._results) > 1 and (len(self._results) > self.max_results or
+                                          sum(self._size(e) for e in self._results.values()) > self.max_bytes):
+            self._results.popitem(last=False)
+
+    def put(self, key: str, table: pa.Table, **attrs):
+        """Keep a result, with attributes such as the row limit it was fetched with"""
+        self._results[key] = {'table': table, 'attrs': attrs, 'exports': {}}
+        self._results.move_to_end(key)
+        self._evict()
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        self._results.move_to_end(key)
+        return entry['table']
+
+    def attrs(self, key: str) -> Dict:
+        return self._results[key]['attrs']
+
+    def page(self, key: str, page: int, page_size: int) -> pd.DataFrame:
+        """One page of a cached result, converted to pandas on its own"""
+        return to_pandas(self._results[key]['table'].slice(page * page_size, page_size))
+
+    def export(self, key: str, export_format: str) -> bytes:
+        """A cached result as Parquet or CSV, written batch by batch and kept for later reruns"""
+        entry = self._results[key]
+        data = entry['exports'].get(export_format)
+        if data is None:
+            table = entry['table']
+            buffer = io.BytesIO()
+            if export_format == 'parquet':
+                with pq.ParquetWriter(buffer, table.schema) as writer:
+                    for batch in table.to_batches():
+                        writer.write_table(pa.Table.from_batches([batch], schema=table.schema))
+            elif export_format == 'csv':
+                with pa_csv.CSVWriter(buffer, table.schema) as writer:
+                    for batch in table.to_batches():
+                        writer.write_batch(batch)
+            else:
+                raise ValueError(f"Unsupported export format: {export_format}")
+            data = entry['exports'][export_format] = buffer.getvalue()
+            self._evict()
+        return data
@@ -0,0 +1,138 @@
+"""
+Typed result columns built from the PostgreSQL types in cursor.description.
+
+Each result column gets its Arrow type from the column's type OID instead of
+from inspecting the values: integers, floats, booleans, dates and timestamps
+are stored natively, NUMERIC becomes float64 (or int64 when it has no
+fractional digits), and text columns with few distinct values are dictionary
+encoded, which pandas turns into categoricals. Columns of other types fall back
+to inferring the type from their first batch with values.
+"""
+
+from typing import List, Optional, Union
+
+import pandas as pd
+import psycopg2.extensions
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# pg_type OIDs of the types given a fixed Arrow type
+ARROW_TYPES = {
+    16: pa.bool_(),                       # bool
+    20: pa.int64(),                       # int8
+    21: pa.int16(),                       # int2
+    23: pa.int32(),                       # int4
+    26: pa.int64(),                       # oid
+    700: pa.float32(),                    # float4
+    701: pa.float64(),                    # float8
+    1082: pa.date32(),                    # date
+    1114: pa.timestamp('us'),             # timestamp
+    1184: pa.timestamp('us', tz='UTC'),   # timestamptz
+}
+TEXT_OIDS = {19, 25, 1042, 1043}          # name, text, bpchar, varchar
+NUMERIC_OID = 1700
+
+# Numeric types with up to this many digits and no fractional part fit in an int64
+INT64_DIGITS = 18
+
+def _parse_numeric(value: Optional[str], cursor) -> Optional[Union[int, float]]:
+    """NUMERIC text as an int when it has no fractional digits, so NUMERIC(18,0) keeps int64 precision"""
+    if value is None:
+        return None
+    if '.' not in value and value[-1:].isdigit():
+        return int(value)
+    return float(value)
+
+# Parses NUMERIC values straight to int or float, skipping the Decimal objects psycopg2 creates by default
+NUMERIC_AS_NUMBER = psycopg2.extensions.new_type((NUMERIC_OID,), 'NUMERIC_AS_NUMBER', _parse_numeric)
+
+def register_numeric_as_number(connection):
+    """Return NUMERIC values as ints or floats on a connection, as they are stored as int64 or float64 anyway"""
+    psycopg2.extensions.register_type(NUMERIC_AS_NUMBER, connection)
+
+class ColumnBuilder:
+    """
+    Collects one result column, a fetched batch at a time, as Arrow chunks.
+
+    Args:
+        type_code (int): PostgreSQL type OID of the column
+        precision, scale (int): Declared precision and scale of a NUMERIC column, if any
+        categorical_max_values (int): Text columns with at most this many distinct
+            values, and fewer distinct values than half their rows, are dictionary encoded
+    """
+
+    def __init__(self, type_code: int, precision: Optional[int] = None, scale: Optional[int] = None,
+                 categorical_max_values: int = 1000):
+        self.type_code = type_code
+        self.categorical_max_values = categorical_max_values
+        self.chunks: List[pa.Array] = []
+        self.convert = None
+        self.inferred_type = None
+
+        if type_code == NUMERIC_OID:
+            if scale == 0 and precision is not None and precision <= INT64_DIGITS:
+                self.arrow_type, self.convert = pa.int64(), int
+            else:
+                self.arrow_type, self.convert = pa.float64(), float
+        elif type_code in TEXT_OIDS:
+            self.arrow_type = pa.string()
+        else:
+            self.arrow_type = ARROW_TYPES.get(type_code)
+
+    @classmethod
+    def from_description(cls, column, **kwargs) -> 'ColumnBuilder':
+        """Builder for an entry of cursor.description"""
+        precision = column[4] if len(column) > 4 else None
+        scale = column[5] if len(column) > 5 else None
+        return cls(column[1], precision, scale, **kwargs)
+
+    def append(self, values):
+        """Add the column's values from one fetched batch"""
+        try:
+            array = pa.array(values, type=self.arrow_type or self.inferred_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if self.convert is not None:
+                # Decimal values when NUMERIC_AS_NUMBER is not registered, which Arrow does not convert
+                # itself, or ints too large to be exact in a float64 column
+                convert = self.convert
+                array = pa.array([None if value is None else convert(value) for value in values],
+                                 type=self.arrow_type)
+            elif self.arrow_type is None:
+                array = pa.array(values)
+            else:
+                raise
+        if self.arrow_type is None and self.inferred_type is None and not pa.types.is_null(array.type):
+            self.inferred_type = array.type
+        self.chunks.append(array)
+
+    def finish(self) -> pa.ChunkedArray:
+        """The column as one chunked array; low-cardinality text is dictionary encoded"""
+        if self.arrow_type is None:
+            # A later batch that did not fit the inferred type widens the column
+            common = _common_type([chunk.type for chunk in self.chunks])
+            return pa.chunked_array([chunk.cast(common) for chunk in self.chunks], type=common)
+
+        column = pa.chunked_array(self.chunks, type=self.arrow_type)
+        if self.type_code in TEXT_OIDS and len(column) > 1:
+            distinct = pc.count_distinct(column).as_py()
+            if distinct <= self.categorical_max_values and distinct * 2 <= len(column):
+                return column.dictionary_encode()
+        return column
+
+def _common_type(types: List[pa.DataType]) -> pa.DataType:
+    """Type every chunk of a column can be cast to, when batches inferred different ones"""
+    types = [t for t in types if not pa.types.is_null(t)]
+    if not types:
+        return pa.null()
+    if all(t == types[0] for t in types):
+        return types[0]
+    if all(pa.types.is_decimal(t) for t in types):
+        # Keep the largest scale; the remaining digits are left for the integer part
+        return pa.decimal128(38, max(t.scale for t in types))
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t) for t in types):
+        return pa.float64()
+    return pa.string()
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """DataFrame of a result table, with dates as datetime64 and dictionary columns as categoricals"""
+    return table.to_pandas(date_as_object=False)
@@ -0,0 +1,264 @@
+"""
+Pre-aggregated rollups for common aggregate questions.
+
+Rollups are materialized views derived from the metadata.json schema: one per
+low-cardinality column (the dimension), holding the row count and the sum, count,
+min and max of every numeric column (the measures) per dimension value. They are
+described to the model as preferred sources for aggregate questions, and
+generated queries that aggregate the base table over at most one dimension are
+rewritten to read the matching rollup instead.
+
+Creating the views scans the base table, so ensure() is meant to run outside
+any request, e.g. in a background thread at startup; load() registers the views
+that already exist. The set of rollups is replaced as a whole, so queries can be
+rewritten while it is being built.
+
+The views are refreshed with REFRESH MATERIALIZED VIEW CONCURRENTLY on a
+schedule, so readers are never blocked; between refreshes they reflect the
+base table as of the last refresh.
+"""
+
+import re
+import time
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sql_validator import join_tokens, tokenize
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES = {'count', 'sum', 'avg', 'min', 'max'}
+IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+# Keywords and functions a rewritable query may contain besides SELECT ... FROM <table>.
+# Expressions over the dimension, such as an age band, aggregate the same way.
+ALLOWED_KEYWORDS = {
+    'select', 'from', 'where', 'and', 'or', 'not', 'in', 'is', 'null', 'like', 'ilike', 'between',
+    'group', 'by', 'order', 'asc', 'desc', 'nulls', 'first', 'last', 'limit', 'offset', 'having',
+    'as', 'case', 'when', 'then', 'else', 'end', 'round', 'floor', 'numeric', 'integer', 'bigint',
+    'float', 'text', 'true', 'false'
+}
+
+class Rollup(NamedTuple):
+    """A materialized aggregate of the base table over one dimension column"""
+    name: str
+    dimension: str
+    measures: tuple
+
+def _identifier(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Unsupported column name for rollups: {name}")
+    return name
+
+class RollupManager:
+    """
+    Defines, refreshes and rewrites queries to rollups of one table.
+
+    Args:
+        metadata (Dict): The metadata.json content, {table: {column: "string" | "bigint"}}
+        max_cardinality (int): Columns with more distinct values are not used as dimensions
+    """
+
+    def __init__(self, metadata: Dict, max_cardinality: int = 100):
+        self.table, columns = next(iter(metadata.items()))
+        self.table = _identifier(self.table.lower())
+        self.columns = {_identifier(name.lower()): kind for name, kind in columns.items()}
+        self.measures = tuple(name for name, kind in self.columns.items() if kind != 'string')
+        self.max_cardinality = max_cardinality
+        self.rollups: Dict[str, Rollup] = {}
+
+    def rollup_name(self, dimension: str) -> str:
+        return f"{self.table}_by_{dimension}"
+
+    def choose_dimensions(self, connection) -> List[str]:
+        """Columns with few distinct values according to the planner statistics"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_stats WHERE tablename = %s", (self.table,))
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(f"ANALYZE {self.table}")
+            cursor.execute("""
+                SELECT attname, n_distinct FROM pg_stats
+                WHERE tablename = %s AND schemaname = current_schema()
+            """, (self.table,))
+            stats = dict(cursor.fetchall())
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", (self.table,))
+            row_count = max(cursor.fetchone()[0], 1)
+
+        dimensions = []
+        for column in self.columns:
+            n_distinct = stats.get(column)
+            if n_distinct is None:
+                continue
+            # Negative values are a fraction of the row count
+            distinct = -n_distinct * row_count if n_distinct < 0 else n_distinct
+            if distinct <= self.max_cardinality:
+                dimensions.append(column)
+        return dimensions
+
+    def definition(self, rollup: Rollup) -> str:
+        aggregates = ["count(*) AS row_count"]
+        for measure in rollup.measures:
+            aggregates += [
+                f"sum({measure}) AS sum_{measure}",
+                f"count({measure}) AS count_{measure}",
+                f"min({measure}) AS min_{measure}",
+                f"max({measure}) AS max_{measure}",
+            ]
+        return (f"SELECT {rollup.dimension}, {', '.join(aggregates)} "
+                f"FROM {self.table} GROUP BY {rollup.dimension}")
+
+    def ensure(self, connection):
+        """Create the rollups that do not exist yet; needs a writer connection"""
+        dimensions = self.choose_dimensions(connection)
+        # Replaced as a whole once committed, as other threads read it while this runs
+        rollups = dict(self.rollups)
+        with connection.cursor() as cursor:
+            for dimension in dimensions:
+                rollup = Rollup(self.rollup_name(dimension), dimension,
+                                tuple(m for m in self.measures if m != dimension))
+                cursor.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {rollup.name} AS {self.definition(rollup)}")
+                # REFRESH ... CONCURRENTLY needs a unique index on plain columns
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {rollup.name}_key ON {rollup.name} ({dimension})")
+                rollups[dimension] = rollup
+        connection.commit()
+        self.rollups = rollups
+        logger.info(f"Rollups available: {', '.join(r.name for r in self.rollups.values()) or 'none'}")
+
+    def load(self, connection):
+        """Register the rollups that already exist, e.g. on a read replica"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT matviewname FROM pg_matviews WHERE matviewname LIKE %s",
+                           (f"{self.table}\\_by\\_%",))
+            existing = {row[0] for row in cursor.fetchall()}
+        rollups = dict(self.rollups)
+        for column in self.columns:
+            name = self.rollup_name(column)
+            if name in existing:
+                rollups[column] = Rollup(name, column, tuple(m for m in self.measures if m != column))
+        self.rollups = rollups
+
+    def refresh(self, connection):
+        """Refresh every rollup without blocking readers"""
+        # REFRESH ... CONCURRENTLY cannot run inside a transaction block
+        autocommit = connection.autocommit
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                for rollup in self.rollups.values():
+                    start = time.monotonic()
+                    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {rollup.name}")
+                    logger.info(f"Refreshed {rollup.name} in {time.monotonic() - start:.1f}s")
+        finally:
+            connection.autocommit = autocommit
+
+    def start_refresh_schedule(self, connection_factory, interval: float) -> threading.Thread:
+        """Refresh the rollups every interval seconds in a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    with connection_factory() as connection:
+                        self.refresh(connection)
+                except Exception as e:
+                    logger.error(f"Rollup refresh failed: {str(e)}")
+
+        thread = threading.Thread(target=run, name='rollup-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def describe_for_prompt(self) -> str:
+        """Rollup schema and usage rules for the text-to-SQL prompt"""
+        if not self.rollups:
+            return ""
+        lines = [
+            f"Pre-aggregated tables (prefer these over {self.table} for counts, sums, averages, "
+            f"minimums and maximums grouped by or filtered on a single column):"
+        ]
+        for rollup in self.rollups.values():
+            measures = ', '.join(f"sum_{m}, count_{m}, min_{m}, max_{m}" for m in rollup.measures)
+            lines.append(f"- {rollup.name}({rollup.dimension}, row_count, {measures})")
+        lines.append("Use SUM(row_count) for counts and SUM(sum_x) / SUM(count_x) for the average of x.")
+        return "\n".join(lines)
+
+    def rewrite(self, query: str) -> Optional[str]:
+        """
+        Redirect an aggregate query over the base table to a rollup.
+
+        Only single-table queries whose columns outside aggregates are one
+        dimension, and whose aggregates are COUNT(*) or COUNT/SUM/AVG/MIN/MAX of
+        a measure, are rewritten; anything else returns None.
+        """
+        if not self.rollups:
+            return None
+        tokens = tokenize(query)
+        while tokens and tokens[-1].kind == 'semicolon':
+            tokens.pop()
+        words = [value.lower() for kind, value, _ in tokens if kind == 'word']
+        if (not words or words[0] != 'select' or words.count('select') != 1 or words.count('from') != 1
+                or any(kind in ('semicolon', 'identifier', 'dollar', 'parameter', 'other') or value == '.'
+                       for kind, value, _ in tokens)):
+            return None
+        aliases = {tokens[i + 1].value.lower() for i in range(len(tokens) - 1)
+                   if tokens[i].value.lower() == 'as' and tokens[i + 1].kind == 'word'}
+        if aliases & set(self.columns):
+            return None
+
+        # (text, start, end) of the original span each part replaces
+        parts: List[Tuple[str, int, int]] = []
+        dimensions = set()
+        measures = set()
+        has_aggregate = False
+        i = 0
+        while i < len(tokens):
+            kind, value, start = tokens[i]
+            lowered = value.lower()
+
+            if kind == 'word' and lowered in AGGREGATES and i + 3 < len(tokens) and tokens[i + 1].value == '(' \
+                    and tokens[i + 3].value == ')':
+                argument = tokens[i + 2].value.lower()
+                replacement = self._aggregate(lowered, argument)
+                if replacement is None:
+                    return None
+                if argument != '*':
+                    measures.add(argument)
+                # Keep the column name PostgreSQL would have given the aggregate
+                is_select_item = (parts and parts[-1][0].lower() in ('select', ',')
+                                  and (i + 4 == len(tokens) or tokens[i + 4].value.lower() in (',', 'from')))
+                end = tokens[i + 3].start + 1
+                parts.append((f"{replacement} AS {lowered}" if is_select_item else replacement, start, end))
+                has_aggregate = True
+                i += 4
+                continue
+
+            if kind == 'word' and lowered not in aliases:
+                if lowered in self.columns:
+                    dimensions.add(lowered)
+                elif lowered == self.table:
+                    value = '{rollup}'
+                elif lowered not in ALLOWED_KEYWORDS:
+                    return None
+            parts.append((value, start, start + len(tokens[i].value)))
+            i += 1
+
+        if not has_aggregate or len(dimensions) > 1 or [text for text, _, _ in parts].count('{rollup}') != 1:
+            return None
+        # Without a dimension any rollup holding the measures answers the query
+        candidates = [self.rollups.get(d) for d in dimensions] if dimensions else list(self.rollups.values())
+        rollup = next((r for r in candidates if r is not None and measures.issubset(r.measures)), None)
+        if rollup is None:
+            return None
+        return join_tokens(parts).replace('{rollup}', rollup.name)
+
+    def _aggregate(self, function: str, argument: str) -> Optional[str]:
+        if argument == '*':
+            return "sum(row_count)::bigint" if function == 'count' else None
+        if argument not in self.measures:
+            return None
+        return {
+            'count': f"sum(count_{argument})::bigint",
+            'sum': f"sum(sum_{argument})",
+            'avg': f"(sum(sum_{argument})::numeric / NULLIF(sum(count_{argument}), 0))",
+            'min': f"min(min_{argument})",
+            'max': f"max(max_{argument})",
+        }[function]
@@ -0,0 +1,120 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+When several sessions, or a double-click, submit the same question at the same
+time, only the first runs the model call or database query; the others wait for
+it and receive the same result. Nothing is kept after the call finishes, so this
+deduplicates in-flight work only and never serves stale results.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class SingleFlightTimeout(Exception):
+    """Raised when a caller waited longer than its timeout for an in-flight call"""
+    pass
+
+class _Call:
+    """One in-flight execution and the outcome shared with its waiters"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+        self.abandoned = False
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and fans its result out to concurrent callers.
+
+    Exceptions raised by the call are raised to every waiting caller. If the call is
+    interrupted otherwise (e.g. its Streamlit script was stopped), a waiting caller
+    runs it instead.
+
+    Args:
+        name (str): Name used in logs and metrics
+        timeout (float): Default seconds a caller waits for an in-flight call
+    """
+
+    def __init__(self, name: str, timeout: float = 60):
+        self.name = name
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._metrics = {'calls': 0, 'executions': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Call fn, or wait for the identical call already in flight.
+
+        Args:
+            key (Hashable): Identifies identical requests
+            fn (Callable): Produces the result when no identical call is in flight
+            timeout (float, optional): Seconds to wait for an in-flight call, instead of the default
+
+        Returns:
+            Any: The result of fn, from this call or the one in flight
+
+        Raises:
+            SingleFlightTimeout: When the in-flight call did not finish in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._metrics['calls'] += 1
+                call = self._calls.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = self._calls[key] = _Call()
+                    self._metrics['executions'] += 1
+                else:
+                    call.waiters += 1
+                    self._metrics['coalesced'] += 1
+
+            if is_leader:
+                return self._run(key, call, fn)
+
+            if not call.done.wait(max(0.0, deadline - time.monotonic())):
+                with self._lock:
+                    self._metrics['timeouts'] += 1
+                logger.warning(f"{self.name}: gave up waiting for in-flight call after {timeout:g}s")
+                raise SingleFlightTimeout(f"{self.name} did not finish within {timeout:g}s")
+            if call.abandoned:
+                with self._lock:
+                    self._metrics['calls'] -= 1
+                    self._metrics['coalesced'] -= 1
+                continue  # The running call was interrupted; run it ourselves
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+    def _run(self, key: Hashable, call: _Call, fn: Callable[[], Any]) -> Any:
+        completed = False
+        try:
+            call.value = fn()
+            completed = True
+            return call.value
+        except Exception as e:
+            call.error = e
+            completed = True
+            with self._lock:
+                self._metrics['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.abandoned = not completed
+            if call.waiters:
+                logger.info(f"{self.name}: shared one call with {call.waiters} waiting callers")
+            call.done.set()
+
+    def metrics(self) -> Dict[str, int]:
+        """Counts of calls, executions, coalesced callers, timeouts and failed executions"""
+        with self._lock:
+            return dict(self._metrics, in_flight=len(self._calls))
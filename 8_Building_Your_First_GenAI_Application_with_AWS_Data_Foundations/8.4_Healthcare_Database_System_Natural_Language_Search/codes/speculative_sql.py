@@ -0,0 +1,188 @@
+"""
+Speculative text-to-SQL generation with first-valid-wins selection and repair.
+
+Several candidate queries are generated concurrently, each at a different
+temperature, and checked as they arrive (safety validation plus EXPLAIN). Once
+the first candidate passes, the others get a short grace period; the cheapest
+valid candidate is executed and the rest are cancelled. Calls that are already
+running cannot be interrupted, so their results are discarded instead.
+
+When no candidate is valid, or the chosen one fails when executed, the error is
+fed back to the model for a corrected query, up to max_repairs times.
+
+The model, the check and the execution are passed in as functions, so the same
+flow runs against Bedrock and PostgreSQL in the app and against stubs in
+benchmarks/speculative_sql_benchmark.py.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (failed query, error message) passed to the model when asking for a repair
+Feedback = Tuple[str, str]
+
+class Check(NamedTuple):
+    """Outcome of checking a candidate before it runs"""
+    valid: bool
+    message: str = ""
+    cost: float = 0.0
+
+class Candidate(NamedTuple):
+    """A generated query and its check"""
+    sql: Optional[str]
+    temperature: float
+    valid: bool
+    message: str = ""
+    cost: float = 0.0
+    latency: float = 0.0
+    error: Optional[Exception] = None
+
+class Outcome(NamedTuple):
+    """The answer to one question"""
+    success: bool
+    sql: Optional[str]
+    result: Any
+    error: Optional[Exception] = None
+    candidates: int = 0
+    repairs: int = 0
+    latency: float = 0.0
+
+class SpeculativeSQL:
+    """
+    Generates candidate queries concurrently and runs the first valid, cheapest one.
+
+    Args:
+        generate (Callable): generate(question, temperature, feedback) returns a query;
+            feedback is None or the failed query and its error
+        check (Callable): check(sql) returns a Check, e.g. from the safety validation and EXPLAIN
+        execute (Callable): execute(sql) returns the result or raises
+        temperatures (Sequence[float]): One candidate is generated per temperature
+        grace_period (float): Seconds to wait for cheaper candidates after the first valid one
+        max_repairs (int): Times a failed query is sent back to the model
+        repair_temperature (float): Temperature of repair requests
+        repairable_errors (tuple): Exceptions from check or execute whose message is fed back for a
+            repair; any other exception ends the question with an Outcome holding it
+        timeout (float): Seconds to wait for a round of candidates
+        max_workers (int): Threads generating candidates, shared by all questions
+    """
+
+    def __init__(self, generate: Callable[[str, float, Optional[Feedback]], str], check: Callable[[str], Check],
+                 execute: Callable[[str], Any], temperatures: Sequence[float] = (0.0, 0.4, 0.8),
+                 grace_period: float = 0.5, max_repairs: int = 2, repair_temperature: float = 0.0,
+                 repairable_errors: tuple = (Exception,), timeout: float = 60, max_workers: int = 16):
+        self.generate = generate
+        self.check = check
+        self.execute = execute
+        self.temperatures = tuple(temperatures)
+        self.grace_period = grace_period
+        self.max_repairs = max_repairs
+        self.repair_temperature = repair_temperature
+        self.repairable_errors = repairable_errors
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sql-candidate')
+        self._lock = threading.Lock()
+        self._stats = {'questions': 0, 'answered': 0, 'candidates': 0, 'valid_candidates': 0,
+                       'abandoned': 0, 'repairs': 0, 'answered_without_repair': 0}
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                self._stats[name] += count
+
+    def _candidate(self, question: str, temperature: float, feedback: Optional[Feedback]) -> Candidate:
+        """Generate and check one candidate; failures make an invalid candidate"""
+        start = time.monotonic()
+        sql = None
+        try:
+            sql = self.generate(question, temperature, feedback)
+            valid, message, cost = self.check(sql)
+        except self.repairable_errors as e:
+            valid, message, cost = False, str(e), 0.0
+        except Exception as e:
+            # Not about the query, e.g. no free database connection; kept out of repair prompts
+            return Candidate(sql, temperature, False, str(e), 0.0, time.monotonic() - start, e)
+        return Candidate(sql, temperature, valid, message, cost, time.monotonic() - start)
+
+    def choose(self, question: str, temperatures: Sequence[float],
+               feedback: Optional[Feedback] = None) -> Tuple[Optional[Candidate], List[Candidate]]:
+        """
+        Generate one candidate per temperature and pick the cheapest valid one.
+
+        Returns:
+            Tuple: The chosen candidate (None if none is valid) and all candidates that arrived
+        """
+        pending = {self._executor.submit(self._candidate, question, t, feedback) for t in temperatures}
+        arrived: List[Candidate] = []
+        deadline = time.monotonic() + self.timeout
+
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                candidate = future.result()
+                arrived.append(candidate)
+                if candidate.valid and deadline - time.monotonic() > self.grace_period:
+                    # First valid candidate: the others only get the grace period
+                    deadline = time.monotonic() + self.grace_period
+
+        # Candidates not started yet are cancelled; running ones finish and are discarded
+        for future in pending:
+            future.cancel()
+        valid = [c for c in arrived if c.valid]
+        self._count(candidates=len(arrived), valid_candidates=len(valid), abandoned=len(pending))
+        return (min(valid, key=lambda c: c.cost) if valid else None), arrived
+
+    def run(self, question: str) -> Outcome:
+        """
+        Answer a question: generate candidates, execute the chosen one and repair failures.
+
+        Returns:
+            Outcome: The executed query and its result, or the last error when all attempts failed
+        """
+        start = time.monotonic()
+        self._count(questions=1)
+        chosen, arrived = self.choose(question, self.temperatures)
+        generated, repairs = len(arrived), 0
+
+        while True:
+            if chosen is None:
+                # Repair from a candidate that came back with an error, e.g. from EXPLAIN
+                failed = next((c for c in arrived if c.sql and c.message and c.error is None), None)
+                if failed is None or repairs >= self.max_repairs:
+                    last = failed or next((c for c in arrived if c.error is not None), None) or \
+                        (arrived[0] if arrived else None)
+                    message = last.message if last else "No query could be generated in time for this question."
+                    return Outcome(False, last.sql if last else None, message, last.error if last else None,
+                                   generated, repairs, time.monotonic() - start)
+                feedback = (failed.sql, failed.message)
+            else:
+                try:
+                    result = self.execute(chosen.sql)
+                except self.repairable_errors as e:
+                    if repairs >= self.max_repairs:
+                        return Outcome(False, chosen.sql, str(e), e, generated, repairs, time.monotonic() - start)
+                    feedback = (chosen.sql, str(e).strip())
+                except Exception as e:
+                    # Not worth a repair, e.g. a lost connection or a rejected plan; the caller describes it
+                    return Outcome(False, chosen.sql, str(e), e, generated, repairs, time.monotonic() - start)
+                else:
+                    self._count(answered=1, answered_without_repair=int(repairs == 0))
+                    return Outcome(True, chosen.sql, result, None, generated, repairs, time.monotonic() - start)
+
+            repairs += 1
+            self._count(repairs=1)
+            logger.info(f"Asking the model to repair a failed query: {feedback[1]}")
+            chosen, arrived = self.choose(question, (self.repair_temperature,), feedback)
+            generated += len(arrived)
+
+    def stats(self) -> dict:
+        """Counts of questions, answers, arrived, valid and abandoned candidates, and repairs"""
+        with self._lock:
+            return dict(self._stats)
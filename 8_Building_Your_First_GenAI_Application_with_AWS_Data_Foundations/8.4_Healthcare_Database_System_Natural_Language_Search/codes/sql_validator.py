@@ -0,0 +1,197 @@
+"""
+Single-pass SQL safety validation for generated queries.
+
+The query is split into tokens by one compiled pattern, so keywords inside
+string literals and comments are never mistaken for statements. Quoted
+identifiers are checked by their unquoted, lowercased name, as "pg_sleep"(10)
+calls the same function as pg_sleep(10). The tokens give a fingerprint (the query shape with literals
+replaced) and the verdict is cached per fingerprint, so queries differing only
+in their values are classified once.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<whitespace>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')
+  | (?P<dollar>\$(?P<tag>[A-Za-z_]\w*|)\$.*?\$(?P=tag)\$)
+  | (?P<identifier>"(?:[^"]|"")*")
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+  | (?P<parameter>\$\d+|%s|%\(\w+\)s)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<semicolon>;)
+  | (?P<operator>::|(?:(?!--|/\*|%s|%\()[-+*/<>=~!@#%^&|`?])+|[^\s\w;])
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# PostgreSQL ends an operator before a trailing + or - unless it contains one of these
+SPECIAL_OPERATOR_CHARS = set('~!@#%^&|`?')
+
+# Statement types that only read
+READ_STATEMENTS = {'select', 'with', 'values', 'table'}
+
+# Keywords that write or change the schema or permissions. Other statements cannot
+# appear inside a single SELECT, so they are rejected by the statement type check.
+FORBIDDEN_KEYWORDS = {
+    'drop', 'truncate', 'delete', 'update', 'insert', 'create', 'alter', 'grant', 'revoke',
+    'exec', 'merge'
+}
+
+# Row locking clauses: FOR UPDATE, FOR NO KEY UPDATE, FOR SHARE, FOR KEY SHARE
+LOCKING_CLAUSES = {'share', 'key', 'no', 'update'}
+
+# Functions with side effects or access outside the database
+FORBIDDEN_FUNCTIONS = {
+    'pg_sleep', 'pg_sleep_for', 'pg_sleep_until', 'pg_terminate_backend', 'pg_cancel_backend',
+    'pg_read_file', 'pg_read_binary_file', 'pg_ls_dir', 'pg_stat_file', 'lo_import', 'lo_export',
+    'dblink', 'dblink_exec', 'set_config', 'pg_reload_conf', 'pg_advisory_lock', 'query_to_xml'
+}
+
+LITERAL_KINDS = {'string', 'dollar', 'number'}
+SKIPPED_KINDS = {'whitespace', 'comment'}
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+    start: int
+
+class Validation(NamedTuple):
+    """Verdict for a query, with its statement type and fingerprint"""
+    allowed: bool
+    message: str
+    statement_type: str
+    fingerprint: str
+
+def tokenize(query: str) -> List[Token]:
+    """Split a query into tokens, dropping whitespace and comments"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind, value, start = match.lastgroup, match.group(), match.start()
+        if kind in SKIPPED_KINDS:
+            continue
+        if kind == 'operator' and len(value) > 1 and value[-1] in '+-' and not SPECIAL_OPERATOR_CHARS & set(value):
+            # "=-1" is "=" followed by "-1", as PostgreSQL reads it
+            head = value.rstrip('+-') or value[0]
+            tokens.append(Token(kind, head, start))
+            tokens.extend(Token(kind, c, start + i) for i, c in enumerate(value[len(head):], len(head)))
+            continue
+        tokens.append(Token(kind, value, start))
+    return tokens
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+def join_tokens(parts: List[Tuple[str, int, int]]) -> str:
+    """
+    Join replacement texts for spans of the original query.
+
+    Each part is (text, start, end) of the span it replaces. Parts are separated by
+    a space only where the original had whitespace or a comment between them, or
+    where two words would otherwise run together, so operators such as ->> or @>
+    stay intact.
+    """
+    pieces = []
+    previous_end = None
+    for text, start, end in parts:
+        if pieces and text and (start > previous_end or (_is_word_char(pieces[-1][-1]) and _is_word_char(text[0]))):
+            pieces.append(' ')
+        pieces.append(text)
+        previous_end = end
+    return ''.join(pieces)
+
+def shape(tokens: List[Token]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Separate a token list into its shape and its literal values.
+
+    Returns:
+        Tuple: Normalized token values with literals replaced by '?', and the literals in order
+    """
+    normalized = []
+    literals = []
+    for kind, value, _ in tokens:
+        if kind in LITERAL_KINDS:
+            normalized.append('?')
+            literals.append(value)
+        elif kind == 'word':
+            normalized.append(value.lower())
+        else:
+            normalized.append(value)
+
+    # A trailing semicolon does not change the statement
+    while normalized and normalized[-1] == ';':
+        normalized.pop()
+    return tuple(normalized), tuple(literals)
+
+def normalize_sql(query: str) -> str:
+    """Query rebuilt from its tokens, without comments, redundant whitespace or trailing semicolons"""
+    tokens = tokenize(query)
+    while tokens and tokens[-1].kind == 'semicolon':
+        tokens.pop()
+    return ' '.join(token.value for token in tokens)
+
+def strip_sql(query: str) -> str:
+    """Original query text without comments or trailing semicolons, safe to embed in a larger statement"""
+    parts = []
+    for match in TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        # A comment still separates the tokens around it
+        parts.append((kind, ' ' if kind == 'comment' else match.group()))
+    while parts and parts[-1][0] in ('whitespace', 'comment', 'semicolon'):
+        parts.pop()
+    return ''.join(value for _, value in parts).strip()
+
+def fingerprint(query: str) -> str:
+    """Query shape with literals replaced, so queries differing only in values share it"""
+    return ' '.join(shape(tokenize(query))[0])
+
+def _statement_type(normalized: Tuple[str, ...]) -> str:
+    for value in normalized:
+        if value != '(':
+            return value
+    return ''
+
+@lru_cache(maxsize=1024)
+def _classify(normalized: Tuple[str, ...]) -> Tuple[bool, str, str]:
+    """Verdict for a query shape"""
+    if not normalized:
+        return False, "Invalid query format", ''
+
+    if ';' in normalized:
+        return False, "Only a single SELECT query is allowed per question.", 'multiple'
+
+    statement_type = _statement_type(normalized)
+    if statement_type not in READ_STATEMENTS:
+        return False, "Only SELECT queries are allowed. Please rephrase your question to retrieve information.", \
+            statement_type
+
+    for i, value in enumerate(normalized):
+        following = normalized[i + 1] if i + 1 < len(normalized) else ''
+        if value.startswith('"'):
+            # "PG_SLEEP"(10) must not slip past the name checks
+            value = value[1:-1].replace('""', '"').lower()
+        if value in FORBIDDEN_KEYWORDS:
+            return False, f"Sorry, {value} operations are not allowed for security reasons.", statement_type
+        if value == 'into':
+            # SELECT ... INTO creates a table
+            return False, "Sorry, create operations are not allowed for security reasons.", statement_type
+        if value == 'for' and following in LOCKING_CLAUSES:
+            return False, "Sorry, locking rows is not allowed for security reasons.", statement_type
+        if value in FORBIDDEN_FUNCTIONS and following == '(':
+            return False, f"Sorry, the function {value} is not allowed for security reasons.", statement_type
+
+    return True, "", statement_type
+
+@lru_cache(maxsize=256)
+def validate(query: str) -> Validation:
+    """
+    Check that a query is a single read-only statement.
+
+    Both the tokenization of recently seen query texts and the verdicts of
+    query shapes are cached.
+    """
+    normalized, _ = shape(tokenize(query))
+    allowed, message, statement_type = _classify(normalized)
+    return Validation(allowed, message, statement_type, ' '.join(normalized))